@@ -17,6 +17,7 @@ function App() {
   });
 
   const [savedConversations, setSavedConversations] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
 
   useEffect(() => {
@@ -29,13 +30,20 @@ function App() {
     }
   }, []);
 
-  const fetchConversations = async () => {
+  const SIDEBAR_PAGE_SIZE = 50;
+
+  // Fetches the first page, or the page after `cursor` to append to the list.
+  // The server sends an ETag, so unchanged pages are revalidated with a 304.
+  const fetchConversations = async (cursor?: string) => {
     try {
       const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-      const res = await fetch(`${API_URL}/api/conversations`);
+      const params = new URLSearchParams({ limit: String(SIDEBAR_PAGE_SIZE) });
+      if (cursor) params.set('after', cursor);
+      const res = await fetch(`${API_URL}/api/conversations?${params}`);
       if (res.ok) {
         const data = await res.json();
-        setSavedConversations(data);
+        setSavedConversations(prev => cursor ? [...prev, ...data] : data);
+        setNextCursor(res.headers.get('X-Next-Cursor'));
       }
     } catch (err) {
       console.error("Failed to fetch conversations", err);
@@ -176,6 +184,14 @@ function App() {
                 </div>
               ))
             )}
+            {nextCursor && (
+              <button
+                onClick={() => fetchConversations(nextCursor)}
+                className="w-full text-center p-2 text-xs text-blue-600 hover:bg-gray-100 rounded"
+              >
+                Load more
+              </button>
+            )}
           </div>
         </div>
       </aside>
@@ -233,7 +249,7 @@ function App() {
                 startNewSession();
                 fetchConversations(); // Refresh list
               }}
-              onAutoSave={fetchConversations}
+              onAutoSave={() => fetchConversations()}
             />
           )}
         </div>
@@ -25,12 +25,15 @@ export const Stage3Result: React.FC<Stage3ResultProps> = ({ state, setState, onR
     }
   }, []);
 
+  const [streamedAnswer, setStreamedAnswer] = useState('');
+
   const synthesize = async () => {
     setLoading(true);
     setError(null);
+    setStreamedAnswer('');
     try {
       const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-      const response = await fetch(`${API_URL}/api/synthesize`, {
+      const response = await fetch(`${API_URL}/api/synthesize/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -43,12 +46,46 @@ export const Stage3Result: React.FC<Stage3ResultProps> = ({ state, setState, onR
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Failed to synthesize response');
       }
 
-      const data: SynthesisResult = await response.json();
-      setState(prev => ({ ...prev, stage3Result: data }));
+      // Read server-sent events: "event: <name>\ndata: <json>\n\n"
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let data: SynthesisResult | null = null;
+
+      while (data === null) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+
+          const eventName = rawEvent.match(/^event: (.*)$/m)?.[1];
+          const payload = JSON.parse(rawEvent.match(/^data: (.*)$/m)?.[1] || '{}');
+
+          if (eventName === 'delta') {
+            setStreamedAnswer(prev => prev + payload.text);
+          } else if (eventName === 'error') {
+            throw new Error(payload.detail || 'Failed to synthesize response');
+          } else if (eventName === 'done') {
+            data = payload as SynthesisResult;
+          }
+        }
+      }
+
+      if (data === null) {
+        throw new Error('Synthesis stream ended unexpectedly');
+      }
+
+      const result: SynthesisResult = data;
+      setState(prev => ({ ...prev, stage3Result: result }));
       
       // Notify parent to refresh list
       if (onAutoSave) {
@@ -106,6 +143,11 @@ export const Stage3Result: React.FC<Stage3ResultProps> = ({ state, setState, onR
         <div className="animate-spin rounded-full h-16 w-16 border-b-2 border-blue-600 mb-4"></div>
         <h2 className="text-xl font-semibold text-gray-700">The Chairman is deliberating...</h2>
         <p className="text-gray-500 mt-2">Synthesizing insights from {state.selectedModels.length} models</p>
+        {streamedAnswer && (
+          <div className="prose prose-blue max-w-none text-gray-800 leading-relaxed mt-8 w-full bg-white p-8 rounded-lg border border-gray-200">
+            <ReactMarkdown remarkPlugins={[remarkGfm]}>{streamedAnswer}</ReactMarkdown>
+          </div>
+        )}
       </div>
     );
   }
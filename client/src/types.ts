@@ -12,11 +12,24 @@ export interface AggregateRanking {
   model: string;
   avg_rank: number;
   votes: number;
+  borda_score?: number | null;
+  copeland_score?: number | null;
+  kemeny_position?: number | null;
+  ci_low?: number | null;
+  ci_high?: number | null;
+}
+
+export interface RankingStatistics {
+  kendall_w: number | null;
+  kemeny_order: string[];
+  pairwise_wins: Record<string, Record<string, number>>;
+  reviewers: number;
 }
 
 export interface SynthesisResult {
   final_answer: string;
   aggregate_rankings: AggregateRanking[];
+  ranking_stats?: RankingStatistics | null;
 }
 
 export interface ConversationState {
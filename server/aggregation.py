@@ -0,0 +1,180 @@
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from settings import get_settings
+
+BOOTSTRAP_SAMPLES = get_settings().ranking_bootstrap_samples
+# Fixed seed: the same council must always produce the same intervals
+BOOTSTRAP_SEED = get_settings().ranking_bootstrap_seed
+
+def build_rank_matrix(n_candidates: int, reviews: Sequence[Sequence[Tuple[int, int]]]) -> np.ndarray:
+    """
+    reviewers x candidates matrix of ranks (1 = best) from per-review
+    (candidate_index, rank) pairs. Candidates a reviewer did not rank are NaN.
+    """
+    matrix = np.full((len(reviews), n_candidates), np.nan)
+    for row, pairs in enumerate(reviews):
+        for candidate, rank in pairs:
+            matrix[row, candidate] = rank
+    return matrix
+
+def pairwise_wins(matrix: np.ndarray) -> np.ndarray:
+    """
+    wins[i, j] = number of reviewers preferring candidate i over j. A ranked
+    candidate beats an unranked one; two unranked candidates are no preference.
+    """
+    filled = np.where(np.isnan(matrix), np.inf, matrix)
+    better = filled[:, :, None] < filled[:, None, :]
+    return better.sum(axis=0)
+
+def borda_scores(matrix: np.ndarray) -> np.ndarray:
+    """n_candidates - rank points per ballot; unranked candidates score 0."""
+    n_candidates = matrix.shape[1]
+    points = np.where(np.isnan(matrix), 0.0, n_candidates - matrix)
+    return points.sum(axis=0)
+
+def copeland_scores(wins: np.ndarray) -> np.ndarray:
+    """Pairwise contests won minus contests lost."""
+    return np.sign(wins - wins.T).sum(axis=1).astype(float)
+
+def kemeny_order(wins: np.ndarray, initial: Sequence[int]) -> List[int]:
+    """
+    Local-search Kemeny approximation: starting from `initial`, repeatedly
+    moves single candidates to the position that most increases agreement
+    with the pairwise majorities, until no move helps.
+    """
+    order = list(initial)
+    n = len(order)
+    margin = wins - wins.T # > 0 when the row candidate should come first
+    improved = True
+    while improved:
+        improved = False
+        for src in range(n):
+            candidate = order[src]
+            rest = order[:src] + order[src + 1:]
+            # gain[k]: agreement when inserting at k, relative to inserting at 0
+            gains = np.concatenate(([0], np.cumsum(margin[rest, candidate])))
+            best = int(np.argmax(gains))
+            if gains[best] > gains[src]:
+                order = rest[:best] + [candidate] + rest[best:]
+                improved = True
+                break
+    return order
+
+def bootstrap_mean_rank_ci(
+    matrix: np.ndarray,
+    samples: int = BOOTSTRAP_SAMPLES,
+    seed: int = BOOTSTRAP_SEED,
+    level: float = 0.95,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Percentile confidence interval of each candidate's mean rank, resampling
+    reviewers. Each resample is a vector of reviewer multiplicities, so all
+    resampled sums and vote counts come out of two matrix products.
+    """
+    n_reviewers = matrix.shape[0]
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(n_reviewers, np.full(n_reviewers, 1.0 / n_reviewers), size=samples).astype(float)
+    ranked = ~np.isnan(matrix)
+    sums = weights @ np.where(ranked, matrix, 0.0)
+    counts = weights @ ranked.astype(float)
+    alpha = (1 - level) / 2 * 100
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    if not np.isnan(means).any():
+        low, high = np.percentile(means, [alpha, 100 - alpha], axis=0)
+        return low, high
+    with warnings.catch_warnings():
+        # Resamples in which nobody ranked a candidate give NaN; ignore them
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        low = np.nanpercentile(means, alpha, axis=0)
+        high = np.nanpercentile(means, 100 - alpha, axis=0)
+    return low, high
+
+def _average_ranks(row: np.ndarray) -> np.ndarray:
+    """Complete a ballot: ties get their average rank, unranked share the remaining places."""
+    n = row.shape[0]
+    filled = np.where(np.isnan(row), np.inf, row)
+    order = np.argsort(filled, kind="stable")
+    sorted_values = filled[order]
+    ranks = np.empty(n)
+    start = 0
+    while start < n:
+        end = start
+        while end + 1 < n and sorted_values[end + 1] == sorted_values[start]:
+            end += 1
+        ranks[order[start:end + 1]] = (start + end) / 2 + 1
+        start = end + 1
+    return ranks
+
+def kendalls_w(matrix: np.ndarray) -> Optional[float]:
+    """Kendall's coefficient of concordance (0 = no agreement, 1 = identical ballots), tie-corrected."""
+    ballots = matrix[~np.all(np.isnan(matrix), axis=1)]
+    m, n = ballots.shape
+    if m < 2 or n < 2:
+        return None
+    ranks = np.vstack([_average_ranks(row) for row in ballots])
+    totals = ranks.sum(axis=0)
+    s = float(((totals - totals.mean()) ** 2).sum())
+    tie_correction = 0.0
+    for row in ranks:
+        _, counts = np.unique(row, return_counts=True)
+        tie_correction += float((counts ** 3 - counts).sum())
+    denominator = m ** 2 * (n ** 3 - n) - m * tie_correction
+    if denominator <= 0:
+        return None
+    return round(12 * s / denominator, 4)
+
+def aggregate(models: List[str], reviews: Sequence[Sequence[Tuple[int, int]]]) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    Full aggregation for one council. Returns (aggregate_rankings, ranking_stats):
+    per-model dicts sorted by mean rank, and council-level statistics (None
+    when there are no usable reviews).
+    """
+    matrix = build_rank_matrix(len(models), reviews)
+    # Reviews without a parseable FINAL RANKING carry no information
+    matrix = matrix[~np.all(np.isnan(matrix), axis=1)]
+    votes = (~np.isnan(matrix)).sum(axis=0)
+    ranked = np.flatnonzero(votes)
+    if len(models) == 0 or ranked.size == 0:
+        return [], None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean_rank = np.nanmean(matrix, axis=0)
+    borda = borda_scores(matrix)
+    wins = pairwise_wins(matrix)
+    copeland = copeland_scores(wins)
+    ci_low, ci_high = bootstrap_mean_rank_ci(matrix)
+
+    # Only candidates that received at least one vote take part in the consensus order
+    sub_wins = wins[np.ix_(ranked, ranked)]
+    borda_start = list(np.argsort(-borda[ranked], kind="stable"))
+    consensus = [int(ranked[i]) for i in kemeny_order(sub_wins, borda_start)]
+    kemeny_position = {candidate: position + 1 for position, candidate in enumerate(consensus)}
+
+    aggregate_rankings = []
+    for i in ranked:
+        aggregate_rankings.append({
+            "model": models[i],
+            "avg_rank": round(float(mean_rank[i]), 2),
+            "votes": int(votes[i]),
+            "borda_score": round(float(borda[i]), 2),
+            "copeland_score": float(copeland[i]),
+            "kemeny_position": kemeny_position[int(i)],
+            "ci_low": round(float(ci_low[i]), 2),
+            "ci_high": round(float(ci_high[i]), 2),
+        })
+    aggregate_rankings.sort(key=lambda x: x["avg_rank"])
+
+    ranking_stats = {
+        "kendall_w": kendalls_w(matrix[:, ranked]),
+        "kemeny_order": [models[i] for i in consensus],
+        "pairwise_wins": {
+            models[i]: {models[j]: int(wins[i, j]) for j in ranked if j != i}
+            for i in ranked
+        },
+        "reviewers": int(matrix.shape[0]),
+    }
+    return aggregate_rankings, ranking_stats
@@ -0,0 +1,356 @@
+"""
+Global model leaderboard across every stored council.
+
+Each saved conversation contributes per-model rank statistics and
+head-to-head counts (from its reviewers' parsed rankings) to a few small
+SQLite tables. Saving a conversation again first subtracts what it
+contributed before, and deleting it subtracts it for good, so the totals
+are always exact without re-reading other conversations. Bradley-Terry
+strengths (and Elo-scale ratings derived from them) are fitted from the
+head-to-head table when the leaderboard is read.
+
+    python analytics.py --rebuild
+"""
+import os
+import json
+import math
+import sqlite3
+import argparse
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from settings import get_settings
+from ranking_parser import label_for_index
+from utils import review_ranked_labels
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_conversations (
+    id TEXT PRIMARY KEY,
+    contribution TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS model_stats (
+    model TEXT PRIMARY KEY,
+    conversations INTEGER NOT NULL DEFAULT 0,
+    ballots INTEGER NOT NULL DEFAULT 0,
+    rank_sum REAL NOT NULL DEFAULT 0,
+    normalized_rank_sum REAL NOT NULL DEFAULT 0,
+    first_places INTEGER NOT NULL DEFAULT 0,
+    pair_wins INTEGER NOT NULL DEFAULT 0,
+    pair_losses INTEGER NOT NULL DEFAULT 0,
+    pair_ties INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS head_to_head (
+    model TEXT NOT NULL,
+    opponent TEXT NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (model, opponent)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS analytics_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+STAT_FIELDS = ("conversations", "ballots", "rank_sum", "normalized_rank_sum", "first_places", "pair_wins", "pair_losses", "pair_ties")
+
+ELO_BASE = 1500.0
+ELO_SCALE = 400.0 / math.log(10)
+# Virtual drawn game added to every played pair, so unbeaten models get a finite rating
+BT_PRIOR_GAMES = 1.0
+
+def conversation_contribution(messages: List[Dict]) -> Dict[str, Any]:
+    """
+    What one stored conversation adds to the leaderboard: per-model stat
+    deltas and (model, opponent) -> [wins, ties] head-to-head counts. Only
+    candidates a reviewer actually ranked are compared.
+    """
+    stats: Dict[str, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    pairs: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0])
+    for message in messages:
+        if message.get("role") != "assistant":
+            continue
+        models = [r.get("model") for r in message.get("stage1") or []]
+        label_to_model = {label_for_index(i): m for i, m in enumerate(models) if m}
+        for model in set(label_to_model.values()):
+            stats[model]["conversations"] += 1
+        for review in message.get("stage2") or []:
+            ballot = [(label_to_model[label], rank) for label, rank in review_ranked_labels(review) if label in label_to_model]
+            if not ballot:
+                continue
+            worst = max(len(models), max(rank for _, rank in ballot))
+            for model, rank in ballot:
+                entry = stats[model]
+                entry["ballots"] += 1
+                entry["rank_sum"] += rank
+                entry["normalized_rank_sum"] += (rank - 1) / (worst - 1) if worst > 1 else 0.0
+                if rank == 1:
+                    entry["first_places"] += 1
+            for i, (model, rank) in enumerate(ballot):
+                for opponent, opponent_rank in ballot[i + 1:]:
+                    if model == opponent:
+                        continue
+                    if rank == opponent_rank:
+                        pairs[(model, opponent)][1] += 1
+                        pairs[(opponent, model)][1] += 1
+                        stats[model]["pair_ties"] += 1
+                        stats[opponent]["pair_ties"] += 1
+                    else:
+                        winner, loser = (model, opponent) if rank < opponent_rank else (opponent, model)
+                        pairs[(winner, loser)][0] += 1
+                        stats[winner]["pair_wins"] += 1
+                        stats[loser]["pair_losses"] += 1
+    return {
+        "stats": {model: entry for model, entry in stats.items()},
+        "pairs": [[model, opponent, wins, ties] for (model, opponent), (wins, ties) in pairs.items()],
+    }
+
+def fit_bradley_terry(models: List[str], wins: Dict[Tuple[str, str], float], iterations: int = 500, tolerance: float = 1e-9) -> Dict[str, float]:
+    """
+    Bradley-Terry strengths by the MM algorithm (Hunter 2004), normalized to
+    a geometric mean of 1. `wins[(a, b)]` counts a beating b, ties as half a
+    win each.
+    """
+    games: Dict[Tuple[str, str], float] = defaultdict(float)
+    total_wins: Dict[str, float] = defaultdict(float)
+    for (a, b), count in wins.items():
+        games[(a, b)] += count
+        games[(b, a)] += count
+        total_wins[a] += count
+    for a, b in list(games):
+        if a < b:
+            games[(a, b)] += BT_PRIOR_GAMES
+            games[(b, a)] += BT_PRIOR_GAMES
+            total_wins[a] += BT_PRIOR_GAMES / 2
+            total_wins[b] += BT_PRIOR_GAMES / 2
+    opponents: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+    for (a, b), count in games.items():
+        opponents[a].append((b, count))
+
+    strength = {m: 1.0 for m in models}
+    for _ in range(iterations):
+        updated = {}
+        for m in models:
+            denominator = sum(count / (strength[m] + strength[o]) for o, count in opponents[m])
+            updated[m] = total_wins[m] / denominator if denominator > 0 else strength[m]
+        played = [v for m, v in updated.items() if opponents[m]]
+        scale = math.exp(sum(math.log(v) for v in played) / len(played)) if played else 1.0
+        updated = {m: v / scale for m, v in updated.items()}
+        change = max(abs(updated[m] - strength[m]) for m in models) if models else 0.0
+        strength = updated
+        if change < tolerance:
+            break
+    return strength
+
+class Leaderboard:
+    """
+    Incrementally maintained leaderboard in its own SQLite database (like
+    the search index, it works with any storage backend and can be rebuilt
+    from storage at any time, and a "complete" marker records that a full
+    rebuild has finished).
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _apply(self, conn: sqlite3.Connection, contribution: Dict[str, Any], sign: int):
+        assignments = ", ".join(f"{f} = {f} + excluded.{f}" for f in STAT_FIELDS)
+        conn.executemany(
+            f"""
+            INSERT INTO model_stats (model, {", ".join(STAT_FIELDS)}) VALUES (?, {", ".join("?" * len(STAT_FIELDS))})
+            ON CONFLICT (model) DO UPDATE SET {assignments}
+            """,
+            [(model, *(sign * entry[f] for f in STAT_FIELDS)) for model, entry in contribution["stats"].items()],
+        )
+        conn.executemany(
+            """
+            INSERT INTO head_to_head (model, opponent, wins, ties) VALUES (?, ?, ?, ?)
+            ON CONFLICT (model, opponent) DO UPDATE SET wins = wins + excluded.wins, ties = ties + excluded.ties
+            """,
+            [(model, opponent, sign * wins, sign * ties) for model, opponent, wins, ties in contribution["pairs"]],
+        )
+        if sign < 0:
+            # Models whose every conversation is gone drop off the board
+            conn.execute("DELETE FROM model_stats WHERE conversations <= 0")
+            conn.execute("DELETE FROM head_to_head WHERE wins <= 0 AND ties <= 0")
+
+    def _retract(self, conn: sqlite3.Connection, conversation_id: str):
+        row = conn.execute("SELECT contribution FROM analytics_conversations WHERE id = ?", (conversation_id,)).fetchone()
+        if row is not None:
+            self._apply(conn, json.loads(row["contribution"]), -1)
+            conn.execute("DELETE FROM analytics_conversations WHERE id = ?", (conversation_id,))
+
+    def record(self, conversation_id: str, messages: List[Dict]):
+        """Adds a conversation, replacing what an earlier save of it contributed."""
+        contribution = conversation_contribution(messages)
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._retract(conn, conversation_id)
+                self._apply(conn, contribution, 1)
+                conn.execute(
+                    "INSERT INTO analytics_conversations (id, contribution) VALUES (?, ?)",
+                    (conversation_id, json.dumps(contribution, separators=(",", ":"))),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def remove(self, conversation_id: str):
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._retract(conn, conversation_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM analytics_conversations")
+            conn.execute("DELETE FROM model_stats")
+            conn.execute("DELETE FROM head_to_head")
+            conn.execute("DELETE FROM analytics_meta WHERE key = 'complete'")
+            conn.execute("COMMIT")
+
+    def is_complete(self) -> bool:
+        """True once every stored conversation has been added by a finished rebuild."""
+        row = self._connect().execute("SELECT value FROM analytics_meta WHERE key = 'complete'").fetchone()
+        return row is not None
+
+    def mark_complete(self):
+        with self.lock:
+            self._connect().execute("INSERT OR REPLACE INTO analytics_meta (key, value) VALUES ('complete', '1')")
+
+    def leaderboard(self, min_ballots: int = 0, include_head_to_head: bool = True) -> Dict[str, Any]:
+        conn = self._connect()
+        # One read transaction, so stats and head-to-head come from the same state
+        conn.execute("BEGIN")
+        try:
+            stats = [dict(row) for row in conn.execute("SELECT * FROM model_stats")]
+            h2h = [dict(row) for row in conn.execute("SELECT model, opponent, wins, ties FROM head_to_head")]
+            conversations = conn.execute("SELECT COUNT(*) FROM analytics_conversations").fetchone()[0]
+        finally:
+            conn.execute("COMMIT")
+
+        models = [s["model"] for s in stats]
+        wins: Dict[Tuple[str, str], float] = defaultdict(float)
+        for row in h2h:
+            wins[(row["model"], row["opponent"])] += row["wins"] + row["ties"] / 2
+        strength = fit_bradley_terry(models, wins)
+
+        entries = []
+        for s in stats:
+            if s["ballots"] < min_ballots:
+                continue
+            contests = s["pair_wins"] + s["pair_losses"] + s["pair_ties"]
+            entries.append({
+                "model": s["model"],
+                "conversations": s["conversations"],
+                "ballots": s["ballots"],
+                "mean_rank": round(s["rank_sum"] / s["ballots"], 4) if s["ballots"] else None,
+                # 0 = always ranked first, 1 = always last, comparable across council sizes
+                "mean_normalized_rank": round(s["normalized_rank_sum"] / s["ballots"], 4) if s["ballots"] else None,
+                "first_place_rate": round(s["first_places"] / s["ballots"], 4) if s["ballots"] else None,
+                "win_rate": round((s["pair_wins"] + s["pair_ties"] / 2) / contests, 4) if contests else None,
+                "wins": s["pair_wins"],
+                "losses": s["pair_losses"],
+                "ties": s["pair_ties"],
+                "bt_strength": round(strength[s["model"]], 6),
+                "elo": round(ELO_BASE + ELO_SCALE * math.log(strength[s["model"]]), 1),
+            })
+        entries.sort(key=lambda e: (-e["elo"], e["model"]))
+        result: Dict[str, Any] = {"conversations": conversations, "models": entries}
+        if include_head_to_head:
+            listed = {e["model"] for e in entries}
+            matrix: Dict[str, Dict[str, Dict[str, int]]] = {m: {} for m in listed}
+            for row in h2h:
+                if row["model"] in listed and row["opponent"] in listed:
+                    matrix[row["model"]][row["opponent"]] = {"wins": row["wins"], "ties": row["ties"]}
+            result["head_to_head"] = matrix
+        return result
+
+_leaderboard: Optional[Leaderboard] = None
+
+def get_leaderboard() -> Leaderboard:
+    global _leaderboard
+    if _leaderboard is None:
+        _leaderboard = Leaderboard(get_settings().analytics_db_path)
+    return _leaderboard
+
+def rebuild(board: Optional[Leaderboard] = None, stop: Optional[threading.Event] = None) -> int:
+    """
+    Recomputes the leaderboard from every stored conversation. Setting
+    `stop` ends it after the current conversation without marking the
+    leaderboard complete.
+    """
+    import storage
+
+    board = board or get_leaderboard()
+    backend = storage.get_backend()
+    board.clear()
+    count = 0
+    for meta in backend.list_metadata():
+        if stop is not None and stop.is_set():
+            return count
+        # Held across load + record so a concurrent save from any worker
+        # can't be overwritten by an older copy
+        with storage.conversation_lock(meta["id"]), board.lock:
+            stored = backend.load(meta["id"])
+            if stored is None:
+                continue
+            board.record(stored["id"], stored.get("messages", []))
+        count += 1
+    board.mark_complete()
+    return count
+
+def backfill_if_needed(stop: Optional[threading.Event] = None) -> Optional[int]:
+    """
+    Fills the leaderboard from storage unless a previous rebuild finished
+    (first start after upgrading, or after a crash or stop mid-backfill).
+    `stop` is passed on to rebuild() so shutdown doesn't wait for it.
+    """
+    board = get_leaderboard()
+    if board.is_complete():
+        return None
+    count = rebuild(board, stop)
+    if not board.is_complete():
+        print(f"Leaderboard backfill stopped after {count} conversations; it starts over on the next start")
+    elif count:
+        print(f"Added {count} existing conversations to the leaderboard")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the model leaderboard")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from all stored conversations")
+    parser.add_argument("--min-ballots", type=int, default=0)
+    args = parser.parse_args()
+    if args.rebuild:
+        print(f"Rebuilt the leaderboard from {rebuild()} conversations into {get_leaderboard().db_path}")
+    print(json.dumps(get_leaderboard().leaderboard(args.min_ballots, include_head_to_head=False), indent=2))
@@ -0,0 +1,429 @@
+"""
+Batch councils: runs a JSONL file of SynthesisRequests through
+synthesize_answer with a bounded worker pool and an optional rate limit,
+saving every result to history and streaming one JSON line per request to
+an output file.
+
+The output file doubles as the checkpoint: a restarted batch skips every
+input line that already has a record there, so a crash or shutdown loses
+at most the requests that were in flight. `<output>.checkpoint` holds the
+input fingerprint (so an output is never resumed against another input),
+counters and status. Only the head of the input is fingerprinted and the
+checkpoint records how many bytes that was, so questions can be appended
+to an input and the batch resumed; changing what was there is refused.
+
+    python batch.py questions.jsonl results.jsonl --concurrency 8 --rate 2
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import argparse
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+from pydantic import ValidationError
+
+import storage
+from models import SynthesisRequest
+from persistence import build_conversation_state
+from settings import get_settings
+from services.gemini_service import synthesize_answer, UpstreamError
+from services.http_client import UpstreamBusyError
+from services.resilience import TokenBucket
+
+FINGERPRINT_BYTES = 64 * 1024
+CHECKPOINT_EVERY = 50
+# Input is read this much at a time, in a thread
+INPUT_READ_BYTES = 64 * 1024
+
+class BatchError(Exception):
+    pass
+
+def input_fingerprint(path: str, length: int = FINGERPRINT_BYTES) -> Tuple[str, int]:
+    """SHA-256 of the first `length` bytes of `path`, and how many bytes were hashed."""
+    with open(path, "rb") as f:
+        head = f.read(length)
+    return hashlib.sha256(head).hexdigest(), len(head)
+
+def read_output(path: str, retry_failed: bool) -> Set[int]:
+    """
+    Input line numbers already answered in `path`. A torn last line from a
+    crash is cut off. With `retry_failed`, lines whose last record is an
+    error count as not done (the record for a line that comes last wins).
+    """
+    if not os.path.exists(path):
+        return set()
+    last: Dict[int, bool] = {}
+    valid_size = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            valid_size += len(raw)
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                continue
+            last[record["line"]] = "error" not in record
+    if valid_size < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_size)
+    return {line for line, ok in last.items() if ok or not retry_failed}
+
+class BatchRunner:
+    def __init__(
+        self,
+        input_path: str,
+        output_path: str,
+        concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        save: bool = True,
+        retry_failed: bool = False,
+        busy_retries: int = 10,
+    ):
+        settings = get_settings()
+        self.input_path = input_path
+        self.output_path = output_path
+        self.checkpoint_path = output_path + ".checkpoint"
+        self.concurrency = max(1, concurrency or settings.batch_concurrency)
+        self.rate = settings.batch_rate if rate is None else rate
+        self.save = save
+        self.retry_failed = retry_failed
+        self.busy_retries = busy_retries
+        self.status = "pending"
+        self.counts = {"total": 0, "skipped": 0, "succeeded": 0, "failed": 0}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._since_checkpoint = 0
+        self._output = None
+        self._io_lock = asyncio.Lock()
+        self._fingerprint: Optional[str] = None
+        self._fingerprint_bytes = 0
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _checkpoint(self) -> Dict[str, Any]:
+        return {
+            "input": os.path.abspath(self.input_path),
+            "fingerprint": self._fingerprint,
+            "fingerprint_bytes": self._fingerprint_bytes,
+            "status": self.status,
+            "counts": dict(self.counts),
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "save": self.save,
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+
+    def _write_checkpoint(self, checkpoint: Optional[Dict[str, Any]] = None):
+        """Blocking; `checkpoint` is a snapshot taken on the event loop when called from a thread."""
+        checkpoint = checkpoint or self._checkpoint()
+        tmp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _append(self, data: str, checkpoint: Optional[Dict[str, Any]]):
+        self._output.write(data)
+        self._output.flush()
+        if checkpoint is not None:
+            os.fsync(self._output.fileno())
+            self._write_checkpoint(checkpoint)
+
+    def _close_output(self, checkpoint: Dict[str, Any]):
+        self._output.flush()
+        os.fsync(self._output.fileno())
+        self._output.close()
+        self._write_checkpoint(checkpoint)
+
+    async def _io(self, fn, *args):
+        """
+        Runs blocking file I/O in a thread, one call at a time. A cancelled
+        caller still waits for its call to finish, so the next one never
+        overlaps it.
+        """
+        async with self._io_lock:
+            call = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                await asyncio.gather(call, return_exceptions=True)
+                raise
+
+    async def _emit(self, record: Dict[str, Any]):
+        self._since_checkpoint += 1
+        checkpoint = None
+        if self._since_checkpoint >= CHECKPOINT_EVERY:
+            checkpoint = self._checkpoint()
+            self._since_checkpoint = 0
+        await self._io(self._append, json.dumps(record) + "\n", checkpoint)
+
+    def _conversation_id(self, request: SynthesisRequest, line: int) -> str:
+        # Stable per input line, so a retried line overwrites its own conversation
+        return request.id or str(uuid.uuid5(uuid.NAMESPACE_URL, f"llm-council-batch:{self._fingerprint}:{line}"))
+
+    async def _process(self, line: int, raw: str) -> Dict[str, Any]:
+        try:
+            request = SynthesisRequest(**json.loads(raw))
+        except (ValueError, ValidationError) as e:
+            return {"line": line, "error": f"Invalid request: {e}", "status": 400}
+        request.id = self._conversation_id(request, line)
+
+        for attempt in range(self.busy_retries + 1):
+            try:
+                result = await synthesize_answer(request)
+                break
+            except UpstreamBusyError as e:
+                # Interactive traffic has the upstream slots; wait our turn
+                if attempt == self.busy_retries:
+                    return {"line": line, "id": request.id, "error": str(e), "status": 503}
+                await asyncio.sleep(e.retry_after)
+            except UpstreamError as e:
+                return {"line": line, "id": request.id, "error": str(e), "status": e.http_status}
+            except Exception as e:
+                print(f"Batch line {line} failed: {e}")
+                return {"line": line, "id": request.id, "error": str(e), "status": 500}
+
+        if self.save:
+            try:
+                await asyncio.to_thread(storage.save_conversation, build_conversation_state(request, result))
+            except Exception as e:
+                print(f"Batch line {line}: failed to save conversation {request.id}: {e}")
+                return {"line": line, "id": request.id, "error": f"Answered but not saved: {e}", "status": 500}
+        return {"line": line, "id": request.id, "question": request.question, "result": result.dict()}
+
+    async def _worker(self, queue: asyncio.Queue, bucket: TokenBucket):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                line, raw = item
+                await bucket.acquire()
+                record = await self._process(line, raw)
+                self.counts["failed" if "error" in record else "succeeded"] += 1
+                await self._emit(record)
+            finally:
+                queue.task_done()
+
+    async def run(self) -> Dict[str, Any]:
+        """Runs (or resumes) the batch to completion. Cancelling the task stops it; run() again resumes."""
+        checkpoint = await asyncio.to_thread(self._load_checkpoint)
+        # A resumed input is hashed over exactly the prefix the first run hashed,
+        # which stays the same when lines are appended to a small input
+        length = checkpoint.get("fingerprint_bytes", FINGERPRINT_BYTES) if checkpoint.get("fingerprint") else FINGERPRINT_BYTES
+        self._fingerprint, self._fingerprint_bytes = await asyncio.to_thread(input_fingerprint, self.input_path, length)
+        if checkpoint.get("fingerprint") not in (None, self._fingerprint):
+            raise BatchError(f"{self.output_path} belongs to a different input; use a new output path")
+        done = await asyncio.to_thread(read_output, self.output_path, self.retry_failed)
+        self.counts = {"total": 0, "skipped": 0, "succeeded": 0, "failed": 0}
+
+        self.status = "running"
+        self.started_at = time.time()
+        self.finished_at = None
+        self._since_checkpoint = 0
+        self._output = await asyncio.to_thread(open, self.output_path, "a", encoding="utf-8")
+        await self._io(self._write_checkpoint, self._checkpoint())
+        bucket = TokenBucket(self.rate, burst=self.concurrency)
+        # Bounded, so a huge input is read as the workers make progress
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue, bucket)) for _ in range(self.concurrency)]
+        try:
+            with open(self.input_path, "r", encoding="utf-8") as f:
+                line = 0
+                while True:
+                    chunk = await asyncio.to_thread(f.readlines, INPUT_READ_BYTES)
+                    if not chunk:
+                        break
+                    for raw in chunk:
+                        line += 1
+                        if not raw.strip():
+                            continue
+                        self.counts["total"] += 1
+                        if line in done:
+                            self.counts["skipped"] += 1
+                            continue
+                        await queue.put((line, raw))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            self.status = "completed"
+        except asyncio.CancelledError:
+            self.status = "interrupted"
+            raise
+        except BaseException:
+            self.status = "failed"
+            raise
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.finished_at = time.time()
+            await self._io(self._close_output, self._checkpoint())
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.counts["succeeded"] + self.counts["failed"]
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "status": self.status,
+            **self.counts,
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "elapsed_seconds": round(elapsed, 3),
+            "per_second": round(finished / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+class BatchManager:
+    """
+    Batches submitted over HTTP, one directory each under BATCH_DIR
+    (input.jsonl, output.jsonl, output.jsonl.checkpoint). Batches still
+    marked running (server stopped or crashed) resume on start().
+    """
+
+    def __init__(self, batch_dir: str):
+        self.batch_dir = batch_dir
+        self._runners: Dict[str, BatchRunner] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _paths(self, batch_id: str):
+        directory = os.path.join(self.batch_dir, batch_id)
+        return os.path.join(directory, "input.jsonl"), os.path.join(directory, "output.jsonl")
+
+    def _launch(self, batch_id: str, runner: BatchRunner):
+        self._runners[batch_id] = runner
+
+        async def run():
+            try:
+                await runner.run()
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                print(f"Batch {batch_id} failed: {e}")
+
+        self._tasks[batch_id] = asyncio.create_task(run())
+
+    async def start(self):
+        if not os.path.isdir(self.batch_dir):
+            return
+        for batch_id in sorted(os.listdir(self.batch_dir)):
+            input_path, output_path = self._paths(batch_id)
+            checkpoint = BatchRunner(input_path, output_path)._load_checkpoint()
+            if os.path.exists(input_path) and checkpoint.get("status") in ("running", "interrupted"):
+                print(f"Resuming batch {batch_id}")
+                runner = BatchRunner(
+                    input_path,
+                    output_path,
+                    concurrency=checkpoint.get("concurrency"),
+                    rate=checkpoint.get("rate"),
+                    save=checkpoint.get("save", True),
+                )
+                self._launch(batch_id, runner)
+
+    async def stop(self):
+        """Interrupts running batches; their checkpoints let start() pick them up again."""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._runners.clear()
+
+    def input_path(self, batch_id: str) -> str:
+        input_path, _ = self._paths(batch_id)
+        os.makedirs(os.path.dirname(input_path), exist_ok=True)
+        return input_path
+
+    def submit(self, batch_id: str, concurrency: Optional[int], rate: Optional[float], save: bool) -> Dict[str, Any]:
+        input_path, output_path = self._paths(batch_id)
+        runner = BatchRunner(input_path, output_path, concurrency=concurrency, rate=rate, save=save)
+        self._launch(batch_id, runner)
+        return self.get(batch_id)
+
+    def get(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            uuid.UUID(batch_id)
+        except ValueError:
+            # Ids become directory names; never resolve anything else
+            return None
+        runner = self._runners.get(batch_id)
+        if runner is not None:
+            return {"id": batch_id, **runner.stats()}
+        input_path, output_path = self._paths(batch_id)
+        if not os.path.exists(input_path):
+            return None
+        # Finished in an earlier process: report the last checkpoint
+        checkpoint = BatchRunner(input_path, output_path)._load_checkpoint()
+        return {"id": batch_id, "status": checkpoint.get("status", "pending"), **checkpoint.get("counts", {})}
+
+    def list(self):
+        if not os.path.isdir(self.batch_dir):
+            return []
+        batches = [self.get(batch_id) for batch_id in sorted(os.listdir(self.batch_dir))]
+        return [batch for batch in batches if batch is not None]
+
+    def output_path(self, batch_id: str) -> str:
+        return self._paths(batch_id)[1]
+
+    async def cancel(self, batch_id: str) -> bool:
+        task = self._tasks.get(batch_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        runner = self._runners[batch_id]
+        runner.status = "cancelled"
+        await asyncio.to_thread(runner._write_checkpoint)
+        return True
+
+batch_manager = BatchManager(get_settings().batch_dir)
+
+async def _main(args):
+    from services import http_client
+
+    runner = BatchRunner(
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        save=not args.no_save,
+        retry_failed=args.retry_failed,
+    )
+
+    async def report():
+        while True:
+            await asyncio.sleep(args.progress)
+            print(json.dumps(runner.stats()))
+
+    reporter = asyncio.create_task(report())
+    try:
+        return await runner.run()
+    finally:
+        reporter.cancel()
+        await http_client.close_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of SynthesisRequests through the council chairman")
+    parser.add_argument("input", help="JSONL file, one SynthesisRequest per line")
+    parser.add_argument("output", help="JSONL results; re-running with the same output resumes")
+    parser.add_argument("--concurrency", type=int, help="parallel requests (default BATCH_CONCURRENCY)")
+    parser.add_argument("--rate", type=float, help="max requests started per second, 0 = unlimited (default BATCH_RATE)")
+    parser.add_argument("--no-save", action="store_true", help="don't add results to conversation history")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run lines whose last attempt failed")
+    parser.add_argument("--progress", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    try:
+        print(json.dumps(asyncio.run(_main(args))))
+    except BatchError as e:
+        parser.exit(1, f"{e}\n")
+    except KeyboardInterrupt:
+        parser.exit(130, "Interrupted; run the same command again to resume\n")
@@ -0,0 +1,46 @@
+"""
+Microbenchmark for utils.calculate_ranking_report / aggregation.aggregate
+across council sizes.
+
+    python benchmarks/bench_aggregation.py [--repeat 20]
+"""
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranking_parser import label_for_index
+from utils import calculate_ranking_report
+
+def make_council(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    stage1 = [{"model": f"model-{i}", "response": "..."} for i in range(size)]
+    stage2 = []
+    for reviewer in range(size):
+        order = list(range(size))
+        rng.shuffle(order)
+        ranking = "\n".join(f"{pos + 1}. {label_for_index(i)}" for pos, i in enumerate(order))
+        stage2.append({"model": f"model-{reviewer}", "review": f"Looks fine.\n\nFINAL RANKING:\n{ranking}"})
+    return stage1, stage2
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for size in (3, 6, 12, 26, 60):
+        stage1, stage2 = make_council(size)
+        seconds = timeit.timeit(lambda: calculate_ranking_report(stage1, stage2), number=args.repeat)
+        results.append({
+            "council_size": size,
+            "ms_per_council": round(seconds / args.repeat * 1000, 3),
+        })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
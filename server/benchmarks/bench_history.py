@@ -0,0 +1,130 @@
+"""
+Microbenchmarks over synthetic histories of 1k, 10k and 100k conversations:
+utils.calculate_aggregate_rankings on stored councils, storage.get_conversation
+(uncached, and cached over a small working set), storage.list_conversations and the first and a deep page of
+storage.list_conversations_page. Reports p50/p95/p99 as JSON for
+benchmarks/compare.py.
+
+    python benchmarks/bench_history.py [--sizes 1000 10000 100000] [--backends sqlite segment]
+        [--reads 500] [--list-repeat 5] [--output run.json]
+
+Histories are written straight to the backend (no search index or
+leaderboard updates), cycling through a pool of distinct councils.
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import summarize, time_calls, write_report
+from bench_storage_format import make_state
+
+import storage
+from conversation_cache import conversation_cache
+from utils import calculate_aggregate_rankings
+from sqlite_storage import SqliteBackend
+from segment_storage import SegmentBackend
+
+TEMPLATES = 200
+HOT_SET = 20
+
+def create_backend(kind: str, directory: str):
+    if kind == "sqlite":
+        return SqliteBackend(os.path.join(directory, "conversations.db"))
+    return SegmentBackend(os.path.join(directory, "conversations.seg"))
+
+def populate(backend, size: int, templates, rng: random.Random):
+    started_at = datetime(2024, 1, 1)
+    for i in range(size):
+        title, messages = templates[i % len(templates)]
+        created_at = (started_at + timedelta(seconds=i * 37 + rng.randint(0, 36))).isoformat()
+        backend.write(f"conv-{i:07d}", title, messages, created_at)
+
+def bench_history(kind: str, size: int, templates, args, rng: random.Random):
+    prefix = f"{kind}/{size}"
+    with tempfile.TemporaryDirectory() as directory:
+        backend = create_backend(kind, directory)
+        populate(backend, size, templates, rng)
+        storage.set_backend(backend)
+        ids = [f"conv-{rng.randrange(size):07d}" for _ in range(args.reads)]
+        # Warm up: the first read pays for the lazy NumPy import
+        storage.get_conversation(ids[0])
+
+        # Every read decodes and re-materializes: the cache is off
+        max_entries, conversation_cache.max_entries = conversation_cache.max_entries, 0
+        results = [summarize(f"get_conversation@{prefix}", time_calls(lambda i: storage.get_conversation(ids[i]), args.reads),
+                             operation="get_conversation", backend=kind, history=size)]
+        conversation_cache.max_entries = max_entries
+
+        # The same few conversations read again and again, as the sidebar does
+        hot = ids[:HOT_SET]
+        for conversation_id in hot:
+            storage.get_conversation(conversation_id)
+        results.append(summarize(f"get_conversation_cached@{prefix}",
+                                 time_calls(lambda i: storage.get_conversation(hot[i % len(hot)]), args.reads),
+                                 operation="get_conversation_cached", backend=kind, history=size))
+
+        # The councils as calculate_aggregate_rankings sees them when a conversation is read
+        councils = []
+        for conversation_id in ids:
+            assistant = backend.load(conversation_id)["messages"][1]
+            stage1 = [{"model": r["model"], "response": r["response"]} for r in assistant["stage1"]]
+            councils.append((stage1, assistant["stage2"]))
+        results.append(summarize(
+            f"calculate_aggregate_rankings@{prefix}",
+            time_calls(lambda i: calculate_aggregate_rankings(*councils[i]), args.reads),
+            operation="calculate_aggregate_rankings", backend=kind, history=size,
+        ))
+
+        results.append(summarize(f"list_conversations@{prefix}",
+                                 time_calls(lambda i: storage.list_conversations(), args.list_repeat),
+                                 operation="list_conversations", backend=kind, history=size))
+
+        first_page = lambda i: storage.list_conversations_page(50)
+        results.append(summarize(f"list_page_first@{prefix}", time_calls(first_page, args.reads),
+                                 operation="list_page_first", backend=kind, history=size))
+
+        # A cursor about nine tenths of the way down the history
+        deep = storage.list_conversations_page(50)
+        for _ in range(min(size // 50 - 1, 9 * size // 500)):
+            deep = storage.list_conversations_page(50, after=deep["next_cursor"])
+        cursor = deep["next_cursor"]
+        deep_page = lambda i: storage.list_conversations_page(50, after=cursor)
+        results.append(summarize(f"list_page_deep@{prefix}", time_calls(deep_page, args.reads),
+                                 operation="list_page_deep", backend=kind, history=size))
+
+        if hasattr(backend, "close"):
+            backend.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", choices=["sqlite", "segment"], default=["sqlite"])
+    parser.add_argument("--reads", type=int, default=500, help="samples per get/page/aggregation benchmark")
+    parser.add_argument("--list-repeat", type=int, default=5, help="samples of the full listing")
+    parser.add_argument("--response-words", type=int, default=150, help="words per stage 1 answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    templates = [
+        storage.to_stored_messages(make_state(rng, i, response_words=args.response_words))
+        for i in range(TEMPLATES)
+    ]
+    results = []
+    for kind in args.backends:
+        for size in args.sizes:
+            print(f"{kind}: {size} conversations", file=sys.stderr)
+            results.extend(bench_history(kind, size, templates, args, rng))
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report("bench_history", config, results, args.output)
+
+if __name__ == "__main__":
+    main()
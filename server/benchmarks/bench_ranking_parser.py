@@ -0,0 +1,58 @@
+"""
+Microbenchmark: legacy per-line ranking parser vs. ranking_parser.
+
+    python benchmarks/bench_ranking_parser.py [--iterations 2000]
+"""
+import os
+import re
+import sys
+import json
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranking_parser import parse_ranking, label_for_index
+
+def legacy_parse_ranking(text):
+    # The implementation utils.parse_ranking_from_text used before ranking_parser
+    match = re.search(r"FINAL RANKING:(.*)", text, re.DOTALL | re.IGNORECASE)
+    parsed_ranking = []
+    if match:
+        ranking_lines = match.group(1).strip().split('\n')
+        for line in ranking_lines:
+            line = line.strip()
+            rank_match = re.match(r"(\d+)\.\s*(Response [A-Z])", line, re.IGNORECASE)
+            if rank_match:
+                parsed_ranking.append(rank_match.group(2).title())
+    return parsed_ranking
+
+def make_review(candidates: int, body_paragraphs: int) -> str:
+    paragraph = ("Response B covers the main points but the explanation of the edge cases is thin, "
+                 "while Response A is thorough and cites sources.\n")
+    body = paragraph * body_paragraphs
+    ranking = "\n".join(f"{i + 1}. {label_for_index(i)}" for i in range(candidates))
+    # Reviewers often keep commenting after the ranking block
+    return f"{body}\nFINAL RANKING:\n{ranking}\n\n{paragraph * (body_paragraphs // 4)}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = []
+    for candidates, paragraphs in ((6, 20), (6, 200), (26, 200), (40, 1000)):
+        review = make_review(candidates, paragraphs)
+        legacy = timeit.timeit(lambda: legacy_parse_ranking(review), number=args.iterations)
+        current = timeit.timeit(lambda: parse_ranking(review), number=args.iterations)
+        results.append({
+            "candidates": candidates,
+            "review_bytes": len(review),
+            "legacy_us": round(legacy / args.iterations * 1e6, 2),
+            "ranking_parser_us": round(current / args.iterations * 1e6, 2),
+            "speedup": round(legacy / current, 2),
+        })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+CPU per request and bytes on the wire for large conversation and synthesis
+responses: FastAPI's stock path (response_model validation, jsonable_encoder,
+json.dumps) against FastJSONResponse (orjson when installed), and with gzip
+and brotli from CompressionMiddleware. Requests are ASGI calls made
+in-process, so the numbers are routing + serialization + compression only.
+
+    python benchmarks/bench_responses.py [--requests 300] [--response-words 6000] [--output run.json]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import summarize, write_report
+from bench_storage_format import make_state
+
+from fastapi import FastAPI
+
+import storage
+import middleware
+import responses
+from middleware import CompressionMiddleware
+from models import SynthesisResponse
+from responses import FastJSONResponse
+from sqlite_storage import SqliteBackend
+
+def build_apps(synthesis: SynthesisResponse):
+    """Two apps with the conversation and synthesis routes of main.py, before and after."""
+    stock = FastAPI()
+
+    @stock.get("/conversation/{conversation_id}", response_model=Dict[str, Any])
+    async def stock_conversation(conversation_id: str):
+        return storage.get_conversation(conversation_id)
+
+    @stock.get("/synthesis", response_model=SynthesisResponse)
+    async def stock_synthesis():
+        return synthesis
+
+    fast = FastAPI(default_response_class=FastJSONResponse)
+
+    @fast.get("/conversation/{conversation_id}", response_model=Dict[str, Any])
+    async def fast_conversation(conversation_id: str):
+        return FastJSONResponse(storage.get_conversation(conversation_id))
+
+    @fast.get("/synthesis", response_model=SynthesisResponse)
+    async def fast_synthesis():
+        return FastJSONResponse(synthesis.dict())
+
+    return stock, fast
+
+async def call(app, path: str, accept_encoding: str) -> int:
+    """One GET through the ASGI app. Returns the response body bytes sent."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())], "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80), "state": {},
+    }
+    sent = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return sent
+
+async def measure(name: str, app, path: str, accept_encoding: str, requests: int) -> Dict[str, Any]:
+    for _ in range(5):
+        await call(app, path, accept_encoding)
+    latencies = []
+    cpu_started = time.process_time()
+    for _ in range(requests):
+        started = time.perf_counter()
+        size = await call(app, path, accept_encoding)
+        latencies.append(time.perf_counter() - started)
+    cpu_ms = (time.process_time() - cpu_started) / requests * 1000
+    return summarize(name, latencies, cpu_ms_per_request=round(cpu_ms, 4), response_bytes=size)
+
+async def run(args, conversation_id: str, synthesis: SynthesisResponse):
+    stock, fast = build_apps(synthesis)
+    variants = [("stock", stock, "identity"), ("fast", fast, "identity")]
+    variants.append(("fast+gzip", CompressionMiddleware(fast, gzip_level=args.gzip_level), "gzip"))
+    if middleware.brotli is not None:
+        variants.append(("fast+br", CompressionMiddleware(fast, brotli_quality=args.brotli_quality), "br"))
+
+    results = []
+    for payload, path in (("conversation", f"/conversation/{conversation_id}"), ("synthesis", "/synthesis")):
+        for variant, app, accept_encoding in variants:
+            result = await measure(f"{payload}/{variant}", app, path, accept_encoding, args.requests)
+            print(f"{result['name']}: {result['cpu_ms_per_request']} ms CPU, {result['response_bytes']} bytes",
+                  file=sys.stderr)
+            results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--council", type=int, default=5)
+    parser.add_argument("--response-words", type=int, default=6000, help="words per stage 1 answer")
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--brotli-quality", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    state = make_state(random.Random(args.seed), 0, council=args.council, response_words=args.response_words)
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["SEARCH_INDEX_PATH"] = os.path.join(directory, "search.db")
+        os.environ["ANALYTICS_DB_PATH"] = os.path.join(directory, "analytics.db")
+        from settings import reload_settings
+        reload_settings()
+        storage.set_backend(SqliteBackend(os.path.join(directory, "conversations.db")))
+        storage.save_conversation(state)
+        # Served from the conversation cache after the first read, so storage stays out of the numbers
+        conversation = storage.get_conversation(state["id"])
+        synthesis = SynthesisResponse(**conversation["data"]["stage3Result"])
+        synthesis.final_answer = " ".join(r["response"] for r in state["stage1Responses"])
+        results = asyncio.run(run(args, state["id"], synthesis))
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    config.update({"orjson": responses.orjson is not None, "brotli": middleware.brotli is not None})
+    write_report("bench_responses", config, results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Search latency over a synthetic history of 100k conversations: fills a
+SearchIndex with a Zipf-distributed vocabulary, then times
+SearchIndex.search for common, rare, multi-word, prefix and model-filtered
+queries. Reports p50/p95/p99 as JSON for benchmarks/compare.py.
+
+    python benchmarks/bench_search.py [--conversations 100000] [--reads 200] [--rank-window 1000]
+        [--index-path search.db] [--max-p95-ms 100] [--output run.json]
+
+Building the index takes a few minutes; pass --index-path to keep it and
+reuse it on later runs. Exits 1 when any query's p95 exceeds --max-p95-ms.
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import summarize, time_calls, write_report
+
+from search_index import SearchIndex
+
+VOCABULARY = 20000
+MODELS = [f"provider/model-{i}" for i in range(12)]
+
+def make_words(rng: random.Random):
+    words = [f"{''.join(rng.choices('bcdfghklmnprstvz', k=3))}{'aeiou'[i % 5]}{i}" for i in range(VOCABULARY)]
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+    return words, cum_weights
+
+def make_messages(rng: random.Random, words, cum_weights):
+    text = lambda k: " ".join(rng.choices(words, cum_weights=cum_weights, k=k))
+    council = rng.sample(MODELS, 3)
+    return [
+        {"role": "user", "content": text(12)},
+        {
+            "role": "assistant",
+            "stage1": [{"model": m, "response": text(80)} for m in council],
+            "stage2": [{"model": m, "ranking": text(30)} for m in council[:2]],
+            "stage3": {"model": "chairman", "response": text(60)},
+        },
+    ]
+
+def populate(index: SearchIndex, size: int, rng: random.Random, words, cum_weights):
+    for i in range(size):
+        messages = make_messages(rng, words, cum_weights)
+        index.index(f"conv-{i:07d}", messages[0]["content"][:60], f"2024-01-01T00:00:{i:07d}", messages)
+        if i and i % 10000 == 0:
+            print(f"indexed {i}", file=sys.stderr)
+    index.optimize()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=100000)
+    parser.add_argument("--reads", type=int, default=200, help="samples per query")
+    parser.add_argument("--index-path", help="keep the index here and reuse it when it already holds the history")
+    parser.add_argument("--rank-window", type=int, default=1000, help="SEARCH_RANK_WINDOW (0 ranks every match)")
+    parser.add_argument("--max-p95-ms", type=float, default=100.0, help="0 disables the check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words, cum_weights = make_words(rng)
+    with tempfile.TemporaryDirectory() as directory:
+        index = SearchIndex(args.index_path or os.path.join(directory, "search_index.db"), rank_window=args.rank_window)
+        if index.count() != args.conversations:
+            index.clear()
+            populate(index, args.conversations, rng, words, cum_weights)
+
+        queries = {
+            "common_word": (words[0], None),
+            "mid_word": (words[200], None),
+            "rare_word": (words[15000], None),
+            "two_words": (f"{words[3]} {words[40]}", None),
+            "prefix": (words[5][:3], None),
+            "common_word_by_model": (words[0], MODELS[0]),
+            "rare_word_by_model": (words[15000], MODELS[0]),
+            "no_match": ("zzzzzz", None),
+        }
+        results = []
+        for name, (q, model) in queries.items():
+            hits = len(index.search(q, model=model))
+            latencies = time_calls(lambda i: index.search(q, model=model), args.reads)
+            results.append(summarize(f"{name}@{args.conversations}", latencies, query=q, model=model, hits=hits))
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "index_path")}
+    write_report("bench_search", config, results, args.output)
+
+    slow = [r["name"] for r in results if args.max_p95_ms and r["p95_ms"] > args.max_p95_ms]
+    if slow:
+        print(f"FAIL: p95 above {args.max_p95_ms}ms: {', '.join(slow)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Cold start benchmark: each run is a fresh interpreter that imports main.py
+and then serves its first request (GET /api/stats) in-process.
+
+    python benchmarks/bench_startup.py [--runs 5] [--max-import-ms 800] [--max-first-request-ms 1500]
+
+Exits non-zero when a median exceeds its limit, or when a module that must
+stay off the startup path (numpy, the Gemini SDKs) was imported, so it
+can gate CI. tests/test_startup.py runs the same checks in the test suite.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ("numpy", "google.generativeai", "google.genai")
+
+_PROBE = r"""
+import sys, time, json
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+eager = [m for m in {lazy!r} if m in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/api/stats")
+    first_request = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (first_request - started) * 1000,
+    "eager_modules": eager,
+}}))
+"""
+
+def run_once() -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Keep the probe away from real data, pending batches and the network
+        env = {
+            **os.environ,
+            "SYNTHESIS_CACHE_ENABLED": "false",
+            "STORAGE_BACKEND": "sqlite",
+            "STORAGE_DB_PATH": os.path.join(data_dir, "conversations.db"),
+            "STORAGE_SEGMENT_PATH": os.path.join(data_dir, "conversations.seg"),
+            "SEARCH_INDEX_PATH": os.path.join(data_dir, "search_index.db"),
+            "ANALYTICS_DB_PATH": os.path.join(data_dir, "analytics.db"),
+            "BATCH_DIR": os.path.join(data_dir, "batches"),
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(lazy=LAZY_MODULES)],
+            cwd=SERVER_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure(runs: int) -> dict:
+    results = [run_once() for _ in range(runs)]
+    return {
+        "runs": runs,
+        "import_ms_median": round(statistics.median(r["import_ms"] for r in results), 1),
+        "import_ms_min": round(min(r["import_ms"] for r in results), 1),
+        "first_request_ms_median": round(statistics.median(r["first_request_ms"] for r in results), 1),
+        "eager_modules": sorted({m for r in results for m in r["eager_modules"]}),
+    }
+
+def failures(result: dict, max_import_ms: float = None, max_first_request_ms: float = None) -> list:
+    found = []
+    if result["eager_modules"]:
+        found.append(f"imported at startup: {', '.join(result['eager_modules'])}")
+    if max_import_ms and result["import_ms_median"] > max_import_ms:
+        found.append(f"import {result['import_ms_median']}ms > {max_import_ms}ms")
+    if max_first_request_ms and result["first_request_ms_median"] > max_first_request_ms:
+        found.append(f"first request {result['first_request_ms_median']}ms > {max_first_request_ms}ms")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-first-request-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(json.dumps(result, indent=2))
+
+    found = failures(result, args.max_import_ms, args.max_first_request_ms)
+    if found:
+        print("FAIL: " + "; ".join(found), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
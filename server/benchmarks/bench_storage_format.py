@@ -0,0 +1,118 @@
+"""
+Compares the JSON file, SQLite and segment storage backends: bytes on disk,
+save cost, raw load latency and full get_conversation latency, over the
+same synthetic conversations.
+
+    python benchmarks/bench_storage_format.py [--conversations 2000] [--reads 2000] [--compression auto zlib none]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from conversation_cache import conversation_cache
+from json_storage import JsonFileBackend
+from sqlite_storage import SqliteBackend
+from segment_storage import SegmentBackend, default_codec, CODEC_MSGPACK
+from ranking_parser import label_for_index
+
+WORDS = ("the model answer response council ranking evidence because however therefore analysis "
+         "example approach result performance latency memory request token context summary detail").split()
+
+def make_state(rng: random.Random, index: int, council: int = 5, response_words: int = 600):
+    models = [f"provider/model-{i}" for i in range(council)]
+    stage1 = [{"model": m, "response": " ".join(rng.choices(WORDS, k=response_words))} for m in models]
+    stage2 = []
+    for m in models:
+        order = list(range(council))
+        rng.shuffle(order)
+        ranking = "\n".join(f"{pos + 1}. {label_for_index(i)}" for pos, i in enumerate(order))
+        stage2.append({"model": m, "review": " ".join(rng.choices(WORDS, k=120)) + f"\n\nFINAL RANKING:\n{ranking}"})
+    return {
+        "id": f"conv-{index:06d}",
+        "question": f"Question {index}: " + " ".join(rng.choices(WORDS, k=12)),
+        "stage1Responses": stage1,
+        "stage2Reviews": stage2,
+        "stage3Result": {"final_answer": " ".join(rng.choices(WORDS, k=400))},
+    }
+
+def disk_bytes(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run(name, backend, footprint, states, reads, rng):
+    storage.set_backend(backend)
+    started = time.perf_counter()
+    for state in states:
+        storage.save_conversation(state)
+    save_ms = (time.perf_counter() - started) / len(states) * 1000
+
+    ids = [rng.choice(states)["id"] for _ in range(reads)]
+    load_us, get_us = [], []
+    for conversation_id in ids:
+        started = time.perf_counter()
+        backend.load(conversation_id)
+        load_us.append((time.perf_counter() - started) * 1e6)
+        started = time.perf_counter()
+        storage.get_conversation(conversation_id)
+        get_us.append((time.perf_counter() - started) * 1e6)
+    return {
+        "backend": name,
+        "disk_bytes": disk_bytes(footprint),
+        "save_ms_per_conversation": round(save_ms, 3),
+        "load_us_p50": round(percentile(load_us, 0.5), 1),
+        "load_us_p95": round(percentile(load_us, 0.95), 1),
+        "get_conversation_us_p50": round(percentile(get_us, 0.5), 1),
+        "get_conversation_us_p95": round(percentile(get_us, 0.95), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compression", nargs="+", default=["auto", "none"], help="segment variants to run")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    states = [make_state(rng, i) for i in range(args.conversations)]
+    with tempfile.TemporaryDirectory() as tmp:
+        # The search index is not what is being compared here
+        os.environ["SEARCH_INDEX_PATH"] = os.path.join(tmp, "search.db")
+        from settings import reload_settings
+        reload_settings()
+        # Compare decoding, not the read cache in front of it
+        conversation_cache.max_entries = 0
+
+        json_dir = os.path.join(tmp, "json")
+        db_path = os.path.join(tmp, "sqlite", "conversations.db")
+        results = [
+            run("json", JsonFileBackend(json_dir), json_dir, states, args.reads, rng),
+            run("sqlite", SqliteBackend(db_path), os.path.dirname(db_path), states, args.reads, rng),
+        ]
+        for compression in args.compression:
+            segment_dir = os.path.join(tmp, f"segment-{compression}")
+            backend = SegmentBackend(os.path.join(segment_dir, "conversations.seg"), default_codec(compression))
+            results.append(run(f"segment-{compression}", backend, segment_dir, states, args.reads, rng))
+    print(json.dumps({
+        "conversations": args.conversations,
+        "segment_payload": "msgpack" if default_codec() & CODEC_MSGPACK else "json",
+        "results": results,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares two JSON reports from load_test.py or bench_history.py, result by
+result (matched on "name"), and flags latency or throughput regressions.
+
+    python benchmarks/compare.py baseline.json candidate.json [--metric p95_ms] [--threshold 10]
+
+Exits 1 when any matched result regressed by more than `threshold` percent
+on the chosen latency metric, or lost that much throughput, so it can gate CI.
+"""
+import sys
+import json
+import argparse
+
+LATENCY_METRICS = ("mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+def load(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return report, {result["name"]: result for result in report["results"]}
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before * 100
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", choices=LATENCY_METRICS, default="p95_ms")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    args = parser.parse_args()
+
+    baseline_report, baseline = load(args.baseline)
+    candidate_report, candidate = load(args.candidate)
+    if baseline_report["benchmark"] != candidate_report["benchmark"]:
+        parser.exit(2, f"Reports are from different benchmarks: {baseline_report['benchmark']} vs {candidate_report['benchmark']}\n")
+
+    print(f"{'result':<48} {args.metric:>22} {'change':>8} {'throughput/s':>24} {'change':>8}")
+    regressions = []
+    for name in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[name], candidate[name]
+        latency_change = change(before.get(args.metric), after.get(args.metric))
+        throughput_change = change(before.get("throughput_per_s"), after.get("throughput_per_s"))
+        regressed = (latency_change is not None and latency_change > args.threshold) or \
+            (throughput_change is not None and throughput_change < -args.threshold)
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<48} {before.get(args.metric, '-'):>10} -> {after.get(args.metric, '-'):<9}"
+            f"{'' if latency_change is None else f'{latency_change:+.1f}%':>8} "
+            f"{before.get('throughput_per_s', '-'):>10} -> {after.get('throughput_per_s', '-'):<11}"
+            f"{'' if throughput_change is None else f'{throughput_change:+.1f}%':>8}"
+            f"{'  REGRESSED' if regressed else ''}"
+        )
+    for name in sorted(baseline.keys() - candidate.keys()):
+        print(f"{name:<48} only in baseline")
+    for name in sorted(candidate.keys() - baseline.keys()):
+        print(f"{name:<48} only in candidate")
+
+    print(json.dumps({
+        "baseline_commit": baseline_report["environment"].get("commit"),
+        "candidate_commit": candidate_report["environment"].get("commit"),
+        "metric": args.metric,
+        "threshold_percent": args.threshold,
+        "regressions": regressions,
+    }))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Shared pieces of the benchmark scripts that write comparable JSON reports
+(load_test.py, bench_history.py; compared with compare.py).
+
+A report is {"benchmark", "environment", "config", "results": [...]}, and
+every result has a unique "name" plus latency percentiles in milliseconds
+and, where it makes sense, a throughput in operations per second.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from typing import Any, Dict, List, Optional
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of `samples` (q in 0..1)."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def summarize(name: str, latencies: List[float], elapsed: Optional[float] = None, errors: int = 0, **extra) -> Dict[str, Any]:
+    """
+    One result row from per-operation latencies in seconds. `elapsed` is the
+    wall time of the whole run, for throughput under concurrency; without it
+    throughput is the sequential rate 1 / mean latency.
+    """
+    result: Dict[str, Any] = {"name": name, "count": len(latencies), "errors": errors}
+    if latencies:
+        total = elapsed if elapsed is not None else sum(latencies)
+        result.update({
+            "throughput_per_s": round(len(latencies) / total, 2) if total > 0 else None,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 4),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 4),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+            "max_ms": round(max(latencies) * 1000, 4),
+        })
+    result.update(extra)
+    return result
+
+def time_calls(fn, repeat: int) -> List[float]:
+    """Latency in seconds of each of `repeat` calls of fn(i)."""
+    latencies = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+def write_report(benchmark: str, config: Dict[str, Any], results: List[Dict[str, Any]], output: Optional[str]):
+    """Prints the report, and also writes it to `output` when given."""
+    report = {"benchmark": benchmark, "environment": environment(), "config": config, "results": results}
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    sys.stdout.write(text + "\n")
@@ -0,0 +1,209 @@
+"""
+End-to-end load test: starts mock_server.py as a fake Gemini streaming
+endpoint and main.py against it (both under uvicorn, on free local ports,
+with throwaway data directories), then drives the API at each concurrency
+level and reports throughput and p50/p95/p99 latency as JSON.
+
+    python benchmarks/load_test.py [--concurrency 1 8 32] [--requests 200]
+        [--scenarios synthesize save list get delete] [--seed-conversations 500]
+        [--mock-latency 0.2] [--mock-chunks 20] [--mock-chunk-interval 0.02]
+        [--storage-backend sqlite] [--output run.json]
+
+Compare two runs with benchmarks/compare.py. Pass --url to load an app that
+is already running instead (it must point at a fake upstream itself).
+"""
+import os
+import sys
+import time
+import socket
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import SERVER_DIR, summarize, write_report
+
+SCENARIOS = ("synthesize", "save", "list", "get", "delete")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(module: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+def wait_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} during startup")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+def conversation_state(rng: random.Random, conversation_id: str, council: int = 4) -> Dict:
+    models = [f"bench/model-{i}" for i in range(council)]
+    labels = [f"Response {chr(65 + i)}" for i in range(council)]
+    reviews = []
+    for model in models:
+        order = rng.sample(labels, council)
+        ranking = "\n".join(f"{pos + 1}. {label}" for pos, label in enumerate(order))
+        reviews.append({"model": model, "review": f"Solid answers overall.\n\nFINAL RANKING:\n{ranking}"})
+    return {
+        "id": conversation_id,
+        "question": f"Benchmark question {conversation_id}",
+        "stage1Responses": [{"model": m, "response": f"Answer from {m}. " * 40} for m in models],
+        "stage2Reviews": reviews,
+        "stage3Result": {"final_answer": "The council concludes. " * 60},
+    }
+
+def synthesis_request(rng: random.Random, index: int, council: int = 4) -> Dict:
+    state = conversation_state(rng, f"synth-{index}", council)
+    return {
+        # A distinct question per request, so the synthesis cache never answers
+        "question": f"Benchmark synthesis {index} {rng.random()}",
+        "stage1_responses": state["stage1Responses"],
+        "stage2_reviews": state["stage2Reviews"],
+    }
+
+async def drive(concurrency: int, requests: int, call: Callable[[int], Awaitable[httpx.Response]]):
+    """Runs call(0..requests-1) on `concurrency` workers. Returns (latencies, errors, elapsed)."""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await call(index)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latency = time.perf_counter() - started
+            if failed:
+                errors += 1
+            else:
+                latencies.append(latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+async def run_scenarios(base_url: str, args) -> List[Dict]:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4, max_keepalive_connections=max(args.concurrency) + 4)
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        seeded = [f"seed-{i}" for i in range(args.seed_conversations)]
+        if seeded:
+            _, errors, elapsed = await drive(16, len(seeded), lambda i: client.post(
+                "/api/conversations", json={"title": "seed", "question": "seed", "data": conversation_state(rng, seeded[i])}
+            ))
+            print(f"Seeded {len(seeded) - errors} conversations in {elapsed:.1f}s", file=sys.stderr)
+
+        for concurrency in args.concurrency:
+            saved = [f"save-c{concurrency}-{i}" for i in range(args.requests)]
+            calls = {
+                "synthesize": lambda i: client.post("/api/synthesize", json=synthesis_request(rng, i)),
+                "save": lambda i: client.post(
+                    "/api/conversations", json={"title": "bench", "question": "bench", "data": conversation_state(rng, saved[i])}
+                ),
+                "list": lambda i: client.get("/api/conversations", params={"limit": 50}),
+                "get": lambda i: client.get(f"/api/conversations/{rng.choice(seeded or saved)}"),
+                # Deletes what the save scenario created at this level
+                "delete": lambda i: client.delete(f"/api/conversations/{saved[i]}"),
+            }
+            for scenario in args.scenarios:
+                requests = args.synthesize_requests if scenario == "synthesize" else args.requests
+                latencies, errors, elapsed = await drive(concurrency, requests, calls[scenario])
+                result = summarize(f"{scenario}@c{concurrency}", latencies, elapsed, errors,
+                                   scenario=scenario, concurrency=concurrency)
+                print(f"{result['name']}: {result.get('throughput_per_s')} req/s, p95 {result.get('p95_ms')} ms, "
+                      f"{errors} errors", file=sys.stderr)
+                results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API against a simulated upstream")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per storage scenario and level")
+    parser.add_argument("--synthesize-requests", type=int, default=50, help="requests per synthesize level")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed-conversations", type=int, default=500, help="history saved before measuring")
+    parser.add_argument("--mock-latency", type=float, default=0.2, help="seconds to the first upstream chunk")
+    parser.add_argument("--mock-chunks", type=int, default=20)
+    parser.add_argument("--mock-chunk-interval", type=float, default=0.02)
+    # The JSON backend's directory is fixed under server/data, so it is not offered here
+    parser.add_argument("--storage-backend", default="sqlite", choices=["sqlite", "segment"])
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="benchmark an already running app instead of starting one")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    processes = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        try:
+            base_url = args.url
+            if base_url is None:
+                mock_port, app_port = free_port(), free_port()
+                mock_env = {
+                    **os.environ,
+                    "MOCK_LATENCY": str(args.mock_latency),
+                    "MOCK_CHUNKS": str(args.mock_chunks),
+                    "MOCK_CHUNK_INTERVAL": str(args.mock_chunk_interval),
+                    "MOCK_SEED": str(args.seed),
+                }
+                processes.append(start_server("mock_server", mock_port, mock_env))
+                wait_ready(f"http://127.0.0.1:{mock_port}/health", processes[-1])
+
+                app_env = {
+                    **os.environ,
+                    "CHAIRMAN_PROVIDER": "gemini",
+                    "GEMINI_CUSTOM_KEY": "benchmark",
+                    "GEMINI_CUSTOM_ENDPOINT": f"http://127.0.0.1:{mock_port}/v1beta/models/mock:streamGenerateContent",
+                    "SYNTHESIS_CACHE_ENABLED": "false",
+                    "STORAGE_BACKEND": args.storage_backend,
+                    "STORAGE_DB_PATH": os.path.join(data_dir, "conversations.db"),
+                    "STORAGE_SEGMENT_PATH": os.path.join(data_dir, "conversations.seg"),
+                    "SEARCH_INDEX_PATH": os.path.join(data_dir, "search_index.db"),
+                    "ANALYTICS_DB_PATH": os.path.join(data_dir, "analytics.db"),
+                    "BATCH_DIR": os.path.join(data_dir, "batches"),
+                }
+                processes.append(start_server("main", app_port, app_env))
+                base_url = f"http://127.0.0.1:{app_port}"
+            wait_ready(f"{base_url}/", processes[-1] if processes else None)
+            results = asyncio.run(run_scenarios(base_url, args))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+    write_report("load_test", config, results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from settings import get_settings
+
+def approximate_size(value: Any) -> int:
+    """Rough bytes held by a JSON-like value: string lengths plus a small cost per item."""
+    if isinstance(value, str):
+        return len(value) + 16
+    if isinstance(value, dict):
+        return 64 + sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(approximate_size(v) for v in value)
+    return 16
+
+class ConversationCache:
+    """
+    LRU of fully materialized get_conversation() responses, bounded by entry
+    count and approximate bytes. Each entry remembers the backend revision
+    it was built from (version, or file mtime for JSON files), and a read
+    only counts as a hit while the backend still reports that revision, so
+    writes by other processes or edits outside the app are never served
+    stale. Cached responses are shared and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Hashable, int, Dict]]" = OrderedDict() # id -> (revision, size, response)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "invalidations": 0,
+            "evictions": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, conversation_id: str, revision: Hashable) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[0] != revision:
+                self._drop(conversation_id)
+                self._stats["stale"] += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self._stats["hits"] += 1
+            return entry[2]
+
+    def put(self, conversation_id: str, revision: Hashable, response: Dict):
+        if not self.enabled:
+            return
+        size = approximate_size(response)
+        if size > self.max_bytes:
+            return # Never let one huge conversation flush the whole cache
+        with self._lock:
+            if conversation_id in self._entries:
+                self._drop(conversation_id)
+            self._entries[conversation_id] = (revision, size, response)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, conversation_id: str):
+        with self._lock:
+            if conversation_id in self._entries:
+                self._drop(conversation_id)
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, conversation_id: str):
+        _, size, _ = self._entries.pop(conversation_id)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["stale"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+_settings = get_settings()
+conversation_cache = ConversationCache(
+    max_entries=_settings.conversation_cache_max_entries,
+    max_bytes=_settings.conversation_cache_max_bytes,
+)
@@ -0,0 +1,284 @@
+"""
+Background synthesis jobs: the chairman call runs in an in-process worker
+pool instead of inside the HTTP request, so a reloaded tab or a proxy
+timeout no longer throws the answer away. The answer text is kept as it
+streams in; clients poll or attach to the event stream from any character
+offset and pick up where they left off. Finished answers are saved to
+conversation history like /api/synthesize does.
+
+Jobs live in memory: they survive client disconnects, not a server restart.
+"""
+import time
+import uuid
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from models import SynthesisRequest, SynthesisResponse
+from persistence import persistence_queue, build_conversation_state
+from settings import get_settings
+from synthesis_cache import synthesis_cache
+from services.gemini_service import (
+    build_prompt,
+    compute_ranking_report,
+    stream_final_answer,
+    synthesis_cache_key,
+    UpstreamError,
+)
+from services.http_client import upstream_slot, UpstreamBusyError
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# A job that finds every upstream slot taken waits and tries again this often
+BUSY_RETRIES = 5
+
+class SynthesisJob:
+    def __init__(self, request: SynthesisRequest, cache_key: str):
+        self.id = str(uuid.uuid4())
+        self.request = request
+        self.cache_key = cache_key
+        self.status = QUEUED
+        self.text = ""
+        self.result: Optional[SynthesisResponse] = None
+        self.error: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        aggregate_rankings, ranking_stats = compute_ranking_report(request)
+        self.rankings = {
+            "aggregate_rankings": [r.dict() for r in aggregate_rankings],
+            "ranking_stats": ranking_stats.dict() if ranking_stats else None,
+        }
+        self._aggregate_rankings = aggregate_rankings
+        self._ranking_stats = ranking_stats
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def _notify(self):
+        # Wake everyone waiting on the old event, later waiters get a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def append(self, delta: str):
+        self.text += delta
+        self._notify()
+
+    def finish(self, status: str, error: Optional[Dict[str, Any]] = None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self._notify()
+
+    async def wait(self, offset: int, timeout: float) -> bool:
+        """Waits until there is text past `offset` or the job finished. False on timeout."""
+        changed = self._changed
+        if len(self.text) > offset or self.finished:
+            return True
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def snapshot(self, offset: int = 0) -> Dict[str, Any]:
+        """Job state with the answer text from character `offset` on."""
+        offset = max(0, min(offset, len(self.text)))
+        return {
+            "id": self.id,
+            "conversation_id": self.request.id,
+            "status": self.status,
+            "offset": offset,
+            "text": self.text[offset:],
+            "next_offset": len(self.text),
+            "rankings": self.rankings,
+            "result": self.result.dict() if self.result is not None else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobManager:
+    """
+    Runs SynthesisJobs on `workers` worker tasks fed by a bounded queue.
+    Submitting an identical council while its job is still unfinished
+    returns that job instead of starting another chairman call.
+    """
+
+    def __init__(self, workers: int, queue_size: int, ttl: float):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self._jobs: Dict[str, SynthesisJob] = {}
+        self._active: Dict[str, SynthesisJob] = {} # cache key -> unfinished job
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._stats = {"submitted": 0, "deduplicated": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+
+    @property
+    def running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancels queued and running jobs; clients see them as cancelled."""
+        for job in list(self._jobs.values()):
+            if not job.finished:
+                self._cancel(job, "Server shut down")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def submit(self, request: SynthesisRequest) -> SynthesisJob:
+        """Queues a synthesis. Raises UpstreamBusyError when the queue is full."""
+        self._expire()
+        cache_key = synthesis_cache_key(request)
+        existing = self._active.get(cache_key)
+        if existing is not None and (request.id is None or request.id == existing.request.id):
+            self._stats["deduplicated"] += 1
+            return existing
+        if self._queue is None:
+            raise RuntimeError("Job manager is not running")
+        if request.id is None:
+            # Fixed now, so the job can report where its result is saved
+            request = request.copy(update={"id": str(uuid.uuid4())})
+        job = SynthesisJob(request, cache_key)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise UpstreamBusyError(retry_after=get_settings().upstream_retry_after)
+        self._jobs[job.id] = job
+        self._active[cache_key] = job
+        self._stats["submitted"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[SynthesisJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        self._expire()
+        jobs = sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+        return [{k: v for k, v in job.snapshot(len(job.text)).items() if k != "text"} for job in jobs]
+
+    async def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        task = job.task
+        self._cancel(job, "Cancelled")
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    def _cancel(self, job: SynthesisJob, reason: str):
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        self._finish(job, CANCELLED, {"detail": reason})
+
+    def _finish(self, job: SynthesisJob, status: str, error: Optional[Dict[str, Any]] = None):
+        if job.finished:
+            return
+        if self._active.get(job.cache_key) is job:
+            del self._active[job.cache_key]
+        self._stats[status] += 1
+        job.finish(status, error)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:
+                    continue # cancelled while queued
+                job.task = asyncio.create_task(self._execute(job))
+                # A cancelled job must not take its worker down with it
+                await asyncio.gather(job.task, return_exceptions=True)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: SynthesisJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        prompt_text = build_prompt(job.request)
+
+        async def generate() -> str:
+            async with upstream_slot():
+                async for delta in stream_final_answer(prompt_text):
+                    job.append(delta)
+            return job.text
+
+        try:
+            for attempt in range(BUSY_RETRIES + 1):
+                try:
+                    # Identical councils share the cache and any in-flight call
+                    final_answer = await synthesis_cache.get_or_compute(job.cache_key, generate)
+                    break
+                except UpstreamBusyError as e:
+                    if attempt == BUSY_RETRIES:
+                        raise
+                    await asyncio.sleep(e.retry_after)
+        except UpstreamError as e:
+            self._finish(job, FAILED, {"detail": str(e), "status": e.http_status, "retry_after": e.retry_after})
+            return
+        except UpstreamBusyError as e:
+            self._finish(job, FAILED, {"detail": str(e), "status": 503, "retry_after": e.retry_after})
+            return
+        except asyncio.CancelledError:
+            self._finish(job, CANCELLED, {"detail": "Cancelled"})
+            raise
+        except Exception as e:
+            print(f"Synthesis job {job.id} failed: {e}")
+            self._finish(job, FAILED, {"detail": str(e), "status": 500})
+            return
+
+        if not job.text:
+            # Answered from the cache or by another caller's call: no deltas were seen
+            job.append(final_answer)
+        job.result = SynthesisResponse(
+            final_answer=final_answer,
+            aggregate_rankings=job._aggregate_rankings,
+            ranking_stats=job._ranking_stats,
+        )
+        try:
+            await persistence_queue.submit(build_conversation_state(job.request, job.result))
+        except Exception as e:
+            print(f"Failed to queue auto-save for job {job.id}: {e}")
+        self._finish(job, SUCCEEDED)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {QUEUED: 0, RUNNING: 0}
+        for job in self._jobs.values():
+            if job.status in counts:
+                counts[job.status] += 1
+        return {
+            **self._stats,
+            **counts,
+            "retained": len(self._jobs),
+            "workers": self.workers,
+        }
+
+_settings = get_settings()
+job_manager = JobManager(
+    workers=_settings.synthesis_job_workers,
+    queue_size=_settings.synthesis_job_queue_size,
+    ttl=_settings.synthesis_job_ttl,
+)
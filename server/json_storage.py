@@ -0,0 +1,126 @@
+import os
+import json
+from typing import List, Dict, Optional, Tuple
+
+from storage_concurrency import FileLock, atomic_write, check_version
+
+class JsonFileBackend:
+    """
+    Original storage layout: one pretty-printed JSON document per
+    conversation in `data_dir/<id>.json`. Writers of the same conversation
+    are serialized by a lock file in `data_dir/.locks`, so several worker
+    processes can share the directory.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+
+    def ensure_data_dir(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def _path(self, conversation_id: str) -> str:
+        return os.path.join(self.data_dir, f"{conversation_id}.json")
+
+    def _lock(self, conversation_id: str) -> FileLock:
+        return FileLock(os.path.join(self.data_dir, ".locks", f"{conversation_id}.lock"))
+
+    def _read(self, filepath: str) -> Optional[Dict]:
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_metadata(self) -> List[Dict]:
+        self.ensure_data_dir()
+        conversations = []
+        for filename in os.listdir(self.data_dir):
+            if filename.endswith(".json"):
+                try:
+                    data = self._read(os.path.join(self.data_dir, filename))
+                    if data is None:
+                        continue # Deleted since listdir()
+                    conversations.append({
+                        "id": data.get("id"),
+                        "title": data.get("title", "Untitled"),
+                        "created_at": data.get("created_at"),
+                    })
+                except Exception as e:
+                    print(f"Error loading {filename}: {e}")
+
+        # Sort by created_at desc
+        conversations.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+        return conversations
+
+    def list_page(self, limit: Optional[int], after: Optional[Tuple[str, str]], title_prefix: Optional[str]) -> List[Dict]:
+        # No index here: filter the full listing in memory
+        conversations = self.list_metadata()
+        conversations.sort(key=lambda x: (x.get("created_at") or "", x.get("id") or ""), reverse=True)
+        if after is not None:
+            conversations = [c for c in conversations if ((c.get("created_at") or ""), (c.get("id") or "")) < after]
+        if title_prefix:
+            prefix = title_prefix.lower()
+            conversations = [c for c in conversations if (c.get("title") or "").lower().startswith(prefix)]
+        if limit is not None:
+            conversations = conversations[:limit]
+        return conversations
+
+    def load(self, conversation_id: str) -> Optional[Dict]:
+        self.ensure_data_dir()
+        # Files are replaced atomically, so no lock is needed to read one
+        stored_data = self._read(self._path(conversation_id))
+        if stored_data is not None:
+            stored_data.setdefault("version", 1)
+        return stored_data
+
+    def revision(self, conversation_id: str) -> Optional[Tuple[int, int]]:
+        """Cheap change token: (mtime, size) of the file, so edits made outside the app count too."""
+        try:
+            stat = os.stat(self._path(conversation_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def write(self, conversation_id: str, title: str, messages: List[Dict], created_at: str,
+              expected_version: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Stores the document, keeping an existing created_at. With
+        `expected_version` the write only happens if the stored version
+        still matches. Returns the effective created_at and the new version.
+        """
+        self.ensure_data_dir()
+        filepath = self._path(conversation_id)
+
+        with self._lock(conversation_id):
+            version = 0
+            try:
+                existing_data = self._read(filepath)
+            except Exception:
+                existing_data = None # Overwrite an unreadable file
+            if existing_data is not None:
+                created_at = existing_data.get("created_at", created_at)
+                version = existing_data.get("version", 1)
+            check_version(conversation_id, version, expected_version)
+
+            stored_data = {
+                "id": conversation_id,
+                "created_at": created_at,
+                "title": title,
+                "version": version + 1,
+                "messages": messages
+            }
+            atomic_write(filepath, json.dumps(stored_data, indent=4).encode("utf-8"))
+        return created_at, version + 1
+
+    def delete(self, conversation_id: str) -> bool:
+        self.ensure_data_dir()
+        filepath = self._path(conversation_id)
+        with self._lock(conversation_id):
+            try:
+                os.remove(filepath)
+                return True
+            except FileNotFoundError:
+                return False
+            except Exception as e:
+                print(f"Error deleting conversation {conversation_id}: {e}")
+                return False
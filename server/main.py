@@ -1,11 +1,67 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from typing import List, Dict, Any, Optional
+import os
+import uuid
+import shutil
+import threading
 import storage
-from models import SynthesisRequest, SynthesisResponse, ConversationCreate, Conversation
-from services.gemini_service import synthesize_answer
+from storage_concurrency import VersionConflictError
+import search_index
+import analytics
+from batch import batch_manager
+from jobs import job_manager
+from models import SynthesisRequest, SynthesisResponse, ConversationCreate, Conversation, CouncilRunRequest, CouncilRunResponse
+from services.gemini_service import (
+    synthesize_answer,
+    build_prompt,
+    compute_ranking_report,
+    stream_final_answer,
+    synthesis_cache_key,
+    UpstreamError,
+)
+from synthesis_cache import synthesis_cache
+from conversation_cache import conversation_cache
+from persistence import persistence_queue, build_conversation_state
+from services import http_client
+from services.council_service import run_council
+from services.llm_providers import ProviderError
+from services.prompt_builder import prompt_stats
+from services.chairman_providers import chairman_stats
+import metrics
+from middleware import MetricsMiddleware, CompressionMiddleware
+from responses import FastJSONResponse, GuardedStreamingResponse, dumps
+from settings import get_settings
+from services.http_client import UpstreamBusyError
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client for the whole app lifetime
+    await http_client.start_client()
+    await persistence_queue.start()
+    await job_manager.start()
+    stop_backfills = threading.Event()
+    backfills = [
+        asyncio.create_task(asyncio.to_thread(search_index.backfill_if_needed, stop_backfills)),
+        asyncio.create_task(asyncio.to_thread(analytics.backfill_if_needed, stop_backfills)),
+    ]
+    await batch_manager.start()
+    yield
+    # An unfinished backfill stays unmarked and runs again on the next start
+    stop_backfills.set()
+    await asyncio.gather(*backfills, return_exceptions=True)
+    # Interrupted batches resume from their checkpoint on the next start
+    await batch_manager.stop()
+    await job_manager.stop()
+    # Flush queued auto-saves before shutting down
+    await persistence_queue.stop()
+    await http_client.close_client()
 
-app = FastAPI(title="LLM Council API")
+app = FastAPI(title="LLM Council API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,57 +69,504 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+_settings = get_settings()
+if _settings.response_compression:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=_settings.response_compression_min_size,
+        gzip_level=_settings.response_gzip_level,
+        brotli_quality=_settings.response_brotli_quality,
+    )
+# Outermost, so CORS and error handling are part of the measured latency
+# and response sizes are the compressed bytes on the wire
+app.add_middleware(MetricsMiddleware)
+
+CACHE_ENTRIES = metrics.gauge("llm_council_synthesis_cache_entries", "Answers held in the in-memory synthesis cache.")
+CACHE_LOOKUPS = metrics.gauge("llm_council_synthesis_cache_lookups", "Synthesis cache lookups since start, by result.", ("result",))
+CONVERSATION_CACHE_BYTES = metrics.gauge("llm_council_conversation_cache_bytes", "Approximate memory held by the conversation read cache.")
+CONVERSATION_CACHE_LOOKUPS = metrics.gauge("llm_council_conversation_cache_lookups", "Conversation cache lookups since start, by result.", ("result",))
+PERSISTENCE_DEPTH = metrics.gauge("llm_council_persistence_queue_depth", "Conversations waiting to be written.")
+
+def collect_component_metrics():
+    cache = synthesis_cache.stats()
+    CACHE_ENTRIES.set(cache["entries"])
+    for result in ("memory_hits", "disk_hits", "misses"):
+        CACHE_LOOKUPS.labels(result).set(cache[result])
+    conversations = conversation_cache.stats()
+    CONVERSATION_CACHE_BYTES.set(conversations["bytes"])
+    for result in ("hits", "misses", "stale"):
+        CONVERSATION_CACHE_LOOKUPS.labels(result).set(conversations[result])
+    PERSISTENCE_DEPTH.set(persistence_queue.stats()["depth"])
+
+metrics.REGISTRY.add_collector(collect_component_metrics)
+
+@app.exception_handler(UpstreamBusyError)
+async def upstream_busy_handler(request: Request, exc: UpstreamBusyError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    # 502 bad upstream answer, 503 unavailable/circuit open, 504 timed out
+    headers = {}
+    if exc.retry_after is not None:
+        headers["Retry-After"] = str(max(1, round(exc.retry_after)))
+    return JSONResponse(status_code=exc.http_status, content={"detail": str(exc)}, headers=headers)
+
+@app.exception_handler(VersionConflictError)
+async def version_conflict_handler(request: Request, exc: VersionConflictError):
+    headers = {"ETag": conversation_etag(exc.current)} if exc.current else {}
+    return JSONResponse(status_code=412, content={"detail": str(exc)}, headers=headers)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to LLM Council API"}
 
+async def auto_save_conversation(request: SynthesisRequest, result: SynthesisResponse):
+    conversation_state = build_conversation_state(request, result)
+
+    # Written in the background so the response isn't held up by disk I/O
+    try:
+        await persistence_queue.submit(conversation_state)
+    except Exception as e:
+        print(f"Failed to queue auto-save: {e}")
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+def upstream_error_event(exc: UpstreamError) -> str:
+    # Headers are already sent, so the status travels in the event instead
+    return sse_event("error", {"detail": str(exc), "status": exc.http_status, "retry_after": exc.retry_after})
+
 @app.post("/api/synthesize", response_model=SynthesisResponse)
 async def synthesize(request: SynthesisRequest):
     # 1. Generate Synthesis
     result = await synthesize_answer(request)
     
     # 2. Auto-Save Conversation
-    # Construct the full conversation state to save
-    conversation_state = {
-        "id": request.id,
-        "question": request.question,
-        "selectedModels": [r.model for r in request.stage1_responses],
-        "stage1Responses": [r.dict() for r in request.stage1_responses],
-        "stage2Reviews": [r.dict() for r in request.stage2_reviews],
-        "stage3Result": result.dict(),
-        "currentStage": 3
-    }
-    
+    await auto_save_conversation(request, result)
+
+    return FastJSONResponse(result.dict())
+
+@app.post("/api/synthesize/stream")
+async def synthesize_stream(request: SynthesisRequest):
+    """
+    Server-sent events variant of /api/synthesize. Emits `rankings` first
+    (computed locally), then one `delta` per upstream text chunk, then `done`
+    with the full SynthesisResponse, or `error` if the chairman call fails.
+    """
+    cache_key = synthesis_cache_key(request)
+    cached_answer = await synthesis_cache.lookup(cache_key)
+    inflight, producer = None, False
+    if cached_answer is None:
+        # Joins an identical in-flight synthesis or registers this one, with no await in between
+        inflight, producer = synthesis_cache.begin(cache_key)
+
+    slot = None
+    if producer:
+        # Admission happens before the response starts so we can still answer 503
+        try:
+            slot = await http_client.acquire_slot()
+        except BaseException as e:
+            synthesis_cache.abort(cache_key, inflight, e)
+            raise
+
+    def release():
+        if slot is not None:
+            slot.release()
+        if producer:
+            # The stream never got to produce an answer; let waiters retry
+            synthesis_cache.abort(cache_key, inflight, asyncio.CancelledError())
+
+    async def event_stream():
+        aggregate_rankings, ranking_stats = compute_ranking_report(request)
+        yield sse_event("rankings", {
+            "aggregate_rankings": [r.dict() for r in aggregate_rankings],
+            "ranking_stats": ranking_stats.dict() if ranking_stats else None
+        })
+
+        if cached_answer is not None:
+            final_answer = cached_answer
+            yield sse_event("delta", {"text": final_answer})
+        elif not producer:
+            # An identical council is already being synthesized, reuse its answer
+            try:
+                final_answer = await asyncio.shield(inflight)
+            except UpstreamError as e:
+                yield upstream_error_event(e)
+                return
+            except UpstreamBusyError as e:
+                yield sse_event("error", {"detail": str(e), "status": 503, "retry_after": e.retry_after})
+                return
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                yield sse_event("error", {"detail": "Synthesis was interrupted, please retry", "status": 503})
+                return
+            yield sse_event("delta", {"text": final_answer})
+        else:
+            final_answer = ""
+            try:
+                async for delta in stream_final_answer(build_prompt(request)):
+                    final_answer += delta
+                    yield sse_event("delta", {"text": delta})
+            except UpstreamError as e:
+                synthesis_cache.abort(cache_key, inflight, e)
+                yield upstream_error_event(e)
+                return
+            except BaseException as e:
+                synthesis_cache.abort(cache_key, inflight, e)
+                raise
+            finally:
+                slot.release()
+            await synthesis_cache.complete(cache_key, inflight, final_answer)
+
+        result = SynthesisResponse(
+            final_answer=final_answer,
+            aggregate_rankings=aggregate_rankings,
+            ranking_stats=ranking_stats
+        )
+        await auto_save_conversation(request, result)
+        yield sse_event("done", result.dict())
+
+    return GuardedStreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also frees the slot and the in-flight entry if the client disconnects before streaming starts
+        on_close=release,
+    )
+
+@app.post("/api/synthesize/jobs", status_code=202)
+async def create_synthesis_job(request: SynthesisRequest, response: Response):
+    """
+    Starts a synthesis in the background and returns its job right away.
+    Submitting the same council again while it is unfinished returns the
+    same job. 503 with Retry-After when too many jobs are waiting.
+    """
+    job = job_manager.submit(request)
+    response.headers["Location"] = f"/api/synthesize/jobs/{job.id}"
+    return job.snapshot()
+
+@app.get("/api/synthesize/jobs")
+def list_synthesis_jobs():
+    return job_manager.list()
+
+@app.get("/api/synthesize/jobs/{job_id}")
+async def get_synthesis_job(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    wait: float = Query(0, ge=0, le=60),
+):
+    """
+    Job state with the answer text from `offset` on; pass the returned
+    `next_offset` as the next `offset`. With `wait`, answers as soon as new
+    text arrives or the job finishes, or after `wait` seconds (long poll).
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait:
+        await job.wait(offset, wait)
+    return job.snapshot(offset)
+
+JOB_KEEPALIVE_SECONDS = 15
+
+@app.get("/api/synthesize/jobs/{job_id}/events")
+async def stream_synthesis_job(job_id: str, request: Request, offset: Optional[int] = Query(None, ge=0)):
+    """
+    Attaches to a job as server-sent events: `rankings`, then one `delta` per
+    chunk of answer text, then `done`, `error` or `cancelled`. Each delta's
+    event id is the text offset after it, so a reconnecting EventSource
+    (Last-Event-ID) or an explicit `offset` resumes without gaps or repeats.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if offset is None:
+        last_event_id = request.headers.get("last-event-id", "")
+        offset = int(last_event_id) if last_event_id.isdigit() else 0
+
+    async def event_stream():
+        position = min(offset, len(job.text))
+        yield sse_event("rankings", job.rankings)
+        while True:
+            if len(job.text) > position:
+                delta = job.text[position:]
+                position += len(delta)
+                yield f"id: {position}\n" + sse_event("delta", {"text": delta})
+                continue
+            if job.finished:
+                break
+            if not await job.wait(position, JOB_KEEPALIVE_SECONDS):
+                # Comment line, keeps idle proxies from closing the stream
+                yield ": keepalive\n\n"
+
+        if job.status == "succeeded":
+            yield sse_event("done", job.result.dict())
+        elif job.status == "failed":
+            yield sse_event("error", job.error)
+        else:
+            yield sse_event("cancelled", job.error or {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.delete("/api/synthesize/jobs/{job_id}")
+async def cancel_synthesis_job(job_id: str):
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="No unfinished job with this id")
+    return job_manager.get(job_id).snapshot()
+
+@app.post("/api/council/run", response_model=CouncilRunResponse)
+async def council_run(request: CouncilRunRequest):
+    """
+    Runs a whole council on the server: every model answers concurrently,
+    the members that answered review each other, then the chairman
+    synthesizes. Members that fail or time out are listed in `failures`.
+    """
+    if not request.models:
+        raise HTTPException(status_code=400, detail="At least one council model is required")
     try:
-        storage.save_conversation(conversation_state)
-        print("Auto-saved conversation successfully.")
-    except Exception as e:
-        print(f"Failed to auto-save conversation: {e}")
+        run = await run_council(request)
+    except ProviderError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    synthesis_request = SynthesisRequest(
+        id=run.id,
+        question=run.question,
+        stage1_responses=run.stage1_responses,
+        stage2_reviews=run.stage2_reviews,
+    )
+    await auto_save_conversation(synthesis_request, run.result)
+    return FastJSONResponse(run.dict())
+
+UPLOAD_FLUSH_BYTES = 1024 * 1024
+
+async def spool_upload(request: Request, path: str) -> int:
+    """
+    Streams the request body to `path`, so large datasets are never held in
+    memory. Disk writes happen in a thread, about a megabyte at a time, and
+    never block the event loop. Returns the bytes written.
+    """
+    f = await asyncio.to_thread(open, path, "wb")
+    written = 0
+    try:
+        pending = bytearray()
+        async for chunk in request.stream():
+            pending += chunk
+            if len(pending) >= UPLOAD_FLUSH_BYTES:
+                await asyncio.to_thread(f.write, bytes(pending))
+                written += len(pending)
+                pending.clear()
+        if pending:
+            await asyncio.to_thread(f.write, bytes(pending))
+            written += len(pending)
+    finally:
+        await asyncio.to_thread(f.close)
+    return written
+
+@app.post("/api/batches", status_code=202)
+async def create_batch(
+    request: Request,
+    concurrency: Optional[int] = Query(None, ge=1, le=64),
+    rate: Optional[float] = Query(None, ge=0),
+    save: bool = True,
+):
+    """
+    Starts a batch from a JSONL request body (one SynthesisRequest per line).
+    Poll GET /api/batches/{id}; results are at /api/batches/{id}/results.
+    """
+    batch_id = str(uuid.uuid4())
+    input_path = await asyncio.to_thread(batch_manager.input_path, batch_id)
+    try:
+        written = await spool_upload(request, input_path)
+        if written == 0:
+            raise HTTPException(status_code=400, detail="Empty batch")
+    except BaseException:
+        # Nothing half-uploaded is left for start() or the listing to find
+        await asyncio.to_thread(shutil.rmtree, os.path.dirname(input_path), True)
+        raise
+    return batch_manager.submit(batch_id, concurrency, rate, save)
+
+@app.get("/api/batches")
+def list_batches():
+    return batch_manager.list()
+
+@app.get("/api/batches/{batch_id}")
+def get_batch(batch_id: str):
+    batch = batch_manager.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+@app.get("/api/batches/{batch_id}/results")
+def get_batch_results(batch_id: str):
+    """Results so far as JSONL, in completion order; each line carries its input `line` number."""
+    if batch_manager.get(batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    output_path = batch_manager.output_path(batch_id)
+    if not os.path.exists(output_path):
+        return Response(content=b"", media_type="application/x-ndjson")
+    return FileResponse(output_path, media_type="application/x-ndjson")
 
-    return result
+@app.delete("/api/batches/{batch_id}")
+async def cancel_batch(batch_id: str):
+    if not await batch_manager.cancel(batch_id):
+        raise HTTPException(status_code=404, detail="No running batch with this id")
+    return batch_manager.get(batch_id)
+
+@app.get("/api/analytics/leaderboard")
+async def get_leaderboard(
+    min_ballots: int = Query(0, ge=0),
+    head_to_head: bool = True,
+):
+    """
+    Models across all stored councils, best Elo first: mean rank, first-place
+    and pairwise win rates, Bradley-Terry strength, and optionally the
+    head-to-head matrix (row model's wins and ties against each column).
+    """
+    await persistence_queue.drain()
+    return await asyncio.to_thread(analytics.get_leaderboard().leaderboard, min_ballots, head_to_head)
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/stats")
+def get_stats():
+    return {
+        "synthesis_cache": synthesis_cache.stats(),
+        "conversation_cache": conversation_cache.stats(),
+        "persistence": persistence_queue.stats(),
+        "prompt": prompt_stats.stats(),
+        "upstream": chairman_stats(),
+        "jobs": job_manager.stats(),
+    }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def conversation_etag(version: int) -> str:
+    return f'"v{version}"'
+
+def parse_if_match(if_match: str) -> Optional[int]:
+    """The version named by an If-Match header; None for `*`. Raises ValueError for anything we did not issue."""
+    if_match = if_match.strip()
+    if if_match == "*":
+        return None
+    if not (if_match.startswith('"v') and if_match.endswith('"')):
+        raise ValueError(f"Unrecognized If-Match value: {if_match}")
+    return int(if_match[2:-1])
 
 @app.get("/api/conversations", response_model=List[Dict[str, Any]])
-def get_conversations():
-    return storage.list_conversations()
+async def get_conversations(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = None,
+    prefix: Optional[str] = None,
+):
+    """
+    One page of conversation metadata, newest first. The cursor for the next
+    page is returned in the X-Next-Cursor header; an unchanged page answers
+    304 to a matching If-None-Match.
+    """
+    # Make sure just-finished syntheses show up in the list
+    await persistence_queue.drain()
+    try:
+        page = await asyncio.to_thread(storage.list_conversations_page, limit, after, prefix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    digest = hashlib.sha1(dumps([page["items"], page["next_cursor"]], sort_keys=True)).hexdigest()
+    etag = f'W/"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if page["next_cursor"]:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return FastJSONResponse(page["items"], headers=headers)
 
 @app.post("/api/conversations", response_model=Dict[str, Any])
-def create_conversation(conversation: ConversationCreate):
+async def create_conversation(conversation: ConversationCreate, request: Request):
+    """
+    Creates or replaces a conversation. Send the ETag from a previous GET as
+    If-Match to update only if nobody saved it in between (412 otherwise);
+    `If-Match: *` requires the conversation to exist, `If-None-Match: *`
+    requires that it does not.
+    """
+    # A queued auto-save must not land on top of this write or move the version under If-Match
+    conversation_id = conversation.data.get("id")
+    if conversation_id and persistence_queue.is_pending(conversation_id):
+        await persistence_queue.drain()
+
+    expected_version = None
+    if_match = request.headers.get("if-match")
+    if_none_match = request.headers.get("if-none-match")
+    if if_match:
+        try:
+            expected_version = parse_if_match(if_match)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if expected_version is None:
+            existing = conversation_id and await asyncio.to_thread(storage.get_conversation, conversation_id)
+            if not existing:
+                raise HTTPException(status_code=412, detail="Conversation does not exist")
+            expected_version = existing["version"]
+    elif if_none_match and if_none_match.strip() == "*":
+        expected_version = 0
+
     # The frontend sends 'data' which is the ConversationState
     # We pass this directly to storage.save_conversation
-    return storage.save_conversation(conversation.data)
+    saved = await asyncio.to_thread(storage.save_conversation, conversation.data, expected_version)
+    return FastJSONResponse(saved, headers={"ETag": conversation_etag(saved["version"])})
+
+@app.get("/api/conversations/search", response_model=List[Dict[str, Any]])
+async def search_conversations(
+    q: str = Query(..., min_length=1, max_length=500),
+    model: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+):
+    """
+    Full-text search over saved conversations (title, question, responses,
+    reviews and final answer), best match first. Snippets are HTML-escaped
+    with hits wrapped in <mark>; `model` keeps conversations that model
+    answered or reviewed in.
+    """
+    await persistence_queue.drain()
+    return FastJSONResponse(await asyncio.to_thread(storage.search_conversations, q, model, limit, offset))
 
 @app.get("/api/conversations/{conversation_id}", response_model=Dict[str, Any])
-def get_conversation(conversation_id: str):
-    conversation = storage.get_conversation(conversation_id)
+async def get_conversation(conversation_id: str):
+    if persistence_queue.is_pending(conversation_id):
+        await persistence_queue.drain()
+    conversation = await asyncio.to_thread(storage.get_conversation, conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation
+    # Clients echo this back as If-Match when they save their edits
+    return FastJSONResponse(conversation, headers={"ETag": conversation_etag(conversation["version"])})
 
 @app.delete("/api/conversations/{conversation_id}")
-def delete_conversation(conversation_id: str):
-    success = storage.delete_conversation(conversation_id)
+async def delete_conversation(conversation_id: str):
+    # A queued auto-save must not resurrect the conversation after deletion
+    if persistence_queue.is_pending(conversation_id):
+        await persistence_queue.drain()
+    success = await asyncio.to_thread(storage.delete_conversation, conversation_id)
     if not success:
         raise HTTPException(status_code=404, detail="Conversation not found or could not be deleted")
     return {"message": "Conversation deleted successfully"}
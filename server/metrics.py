@@ -0,0 +1,192 @@
+"""
+Small in-process Prometheus registry (counters, gauges, histograms with
+labels) rendered in the text exposition format by GET /metrics. Kept
+dependency-free so instrumentation costs nothing at import time; values are
+per process, like prometheus_client without multiprocess mode.
+"""
+import math
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+TOKEN_BUCKETS = (500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            # Unlabelled metrics are exported (as 0) before their first use
+            self._children[()] = self._new_child()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def render(self, name, labelnames, key) -> List[str]:
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = staticmethod(_Value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _new_child = staticmethod(_Value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, key) -> List[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [math.inf], counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], None]):
+        """`collect` runs before every scrape, to copy values owned elsewhere into gauges."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, tuple(labelnames)))
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, tuple(labelnames)))
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, tuple(labelnames), buckets))
+
+# HTTP layer
+HTTP_REQUESTS = counter("llm_council_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = histogram("llm_council_http_request_duration_seconds", "Time until the last response byte, by route.", ("method", "route"))
+HTTP_IN_FLIGHT = gauge("llm_council_http_requests_in_flight", "Requests currently being served, by route.", ("route",))
+HTTP_REQUEST_BYTES = histogram("llm_council_http_request_size_bytes", "Request body sizes, by route.", ("route",), SIZE_BUCKETS)
+HTTP_RESPONSE_BYTES = histogram("llm_council_http_response_size_bytes", "Response body sizes, by route.", ("route",), SIZE_BUCKETS)
+
+# Synthesis pipeline
+STAGE_LATENCY = histogram("llm_council_stage_duration_seconds", "Duration of pipeline stages (see tracing.span).", ("stage",))
+PROMPT_TOKENS = histogram("llm_council_chairman_prompt_tokens", "Estimated tokens per chairman prompt.", (), TOKEN_BUCKETS)
+UPSTREAM_IN_FLIGHT = gauge("llm_council_upstream_requests_in_flight", "Chairman calls currently streaming.")
+UPSTREAM_RESULTS = counter("llm_council_upstream_requests_total", "Chairman calls by outcome.", ("outcome",))
+ANSWER_BYTES = histogram("llm_council_chairman_answer_size_bytes", "Size of synthesized answers.", (), SIZE_BUCKETS)
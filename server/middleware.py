@@ -0,0 +1,185 @@
+import time
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+
+from metrics import HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, HTTP_REQUEST_BYTES, HTTP_RESPONSE_BYTES
+from tracing import request_span
+
+# Brotli is optional; without it clients get gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def route_template(scope) -> str:
+    """The matched route's path template ("/api/conversations/{conversation_id}"), keeping label cardinality bounded."""
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route request counts, latency (until
+    the last body byte, so streams are measured in full), in-flight requests
+    and request/response body sizes, inside an OpenTelemetry server span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        state = {"status": 500, "request_bytes": 0, "response_bytes": 0}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["request_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            with request_span(method, route):
+                await self.app(scope, counting_receive, counting_send)
+        finally:
+            in_flight.dec()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, state["status"]).inc()
+            HTTP_REQUEST_BYTES.labels(route).observe(state["request_bytes"])
+            HTTP_RESPONSE_BYTES.labels(route).observe(state["response_bytes"])
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" or "gzip" from an Accept-Encoding header, honouring q-values; None for identity."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        offered[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    # On equal q, brotli wins: smaller output at a similar cost
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        quality = offered.get(encoding, offered.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._brotli = None
+            # wbits 31: zlib stream with a gzip header and trailer
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli is not None else self._gzip.compress(data)
+
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self._brotli is not None else self._gzip.flush()
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing response bodies of at least
+    `minimum_size` bytes with brotli or gzip, whichever the client prefers.
+    Event streams pass through untouched, since compressors buffer and would
+    hold back deltas, as do responses that already have a Content-Encoding.
+    Streamed (multi-part) bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def compressing_send(message):
+            if message["type"] == "http.response.start":
+                # Held back until the first body part shows whether to compress
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                if not state["passthrough"] and state["compressor"] is None:
+                    # e.g. http.response.pathsend: nothing to compress
+                    state["passthrough"] = True
+                    await send(state["start"])
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            compressor = state["compressor"]
+            if compressor is None:
+                start = state["start"]
+                headers = MutableHeaders(raw=start["headers"])
+                skip = (
+                    "content-encoding" in headers
+                    or headers.get("content-type", "").startswith("text/event-stream")
+                    or start["status"] < 200 or start["status"] in (204, 304)
+                    or (not more_body and len(body) < self.minimum_size)
+                )
+                if skip:
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = state["compressor"] = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+
+            if more_body:
+                chunk = compressor.compress(body)
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.compress(body) + compressor.finish()})
+
+        await self.app(scope, receive, compressing_send)
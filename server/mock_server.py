@@ -0,0 +1,125 @@
+"""
+Deterministic stand-in for the chairman and council model APIs, for local
+runs, benchmarks and load tests without a real model:
+
+    uvicorn mock_server:app --port 8001
+
+    GEMINI_CUSTOM_ENDPOINT=http://localhost:8001/v1beta/models/mock:streamGenerateContent
+    CHAIRMAN_OPENAI_BASE=http://localhost:8001/v1   (CHAIRMAN_PROVIDER=openai)
+    COUNCIL_API_BASE=http://localhost:8001/v1       (COUNCIL_PROVIDER=openai)
+
+Latency, chunk cadence and error rate come from MOCK_* environment variables
+and can be overridden per request with the same names as query parameters
+(e.g. ?error_rate=0.5). Output, delays and failures depend only on the
+prompt and MOCK_SEED, so a run can be replayed exactly.
+"""
+import os
+import json
+import random
+import asyncio
+import hashlib
+from typing import AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from services.llm_providers import MockProvider
+
+app = FastAPI(title="LLM Council mock model server")
+
+_WORDS = (
+    "the council agrees that answer evidence response model ranking reasoning "
+    "consensus detail accurate summary point view however therefore overall"
+).split()
+
+def _settings(request: Request) -> Dict[str, float]:
+    def value(name: str, default: str) -> float:
+        return float(request.query_params.get(name, os.getenv(f"MOCK_{name.upper()}", default)))
+    return {
+        "latency": value("latency", "0.2"), # time to first chunk
+        "chunk_interval": value("chunk_interval", "0.02"),
+        "chunks": value("chunks", "20"),
+        "chunk_words": value("chunk_words", "8"),
+        "error_rate": value("error_rate", "0"),
+        "error_status": value("error_status", "503"),
+        "seed": value("seed", "0"),
+    }
+
+def _rng(prompt: str, seed: float) -> random.Random:
+    digest = hashlib.sha256(f"{seed}:{prompt}".encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+def _answer_chunks(rng: random.Random, settings: Dict[str, float]) -> List[str]:
+    chunks = []
+    for i in range(int(settings["chunks"])):
+        words = [rng.choice(_WORDS) for _ in range(int(settings["chunk_words"]))]
+        chunks.append(("" if i == 0 else " ") + " ".join(words))
+    return chunks
+
+def _error(settings: Dict[str, float]) -> JSONResponse:
+    status = int(settings["error_status"])
+    headers = {"Retry-After": "1"} if status in (429, 503) else None
+    return JSONResponse(status_code=status, content={"error": {"code": status, "message": "Simulated upstream error"}}, headers=headers)
+
+async def _paced(chunks: List[str], settings: Dict[str, float], encode) -> AsyncIterator[bytes]:
+    await asyncio.sleep(settings["latency"])
+    for i, chunk in enumerate(chunks):
+        if i:
+            await asyncio.sleep(settings["chunk_interval"])
+        yield encode(i, chunk)
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.post("/v1beta/models/{model_action}")
+async def gemini_generate(model_action: str, request: Request):
+    """streamGenerateContent: one JSON array, each element sent as its own chunk."""
+    body = await request.json()
+    prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+    settings = _settings(request)
+    rng = _rng(prompt, settings["seed"])
+    if rng.random() < settings["error_rate"]:
+        return _error(settings)
+    chunks = _answer_chunks(rng, settings)
+
+    def encode(i: int, text: str) -> bytes:
+        chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+        prefix = "[" if i == 0 else ",\r\n"
+        suffix = "]" if i == len(chunks) - 1 else ""
+        return (prefix + json.dumps(chunk) + suffix).encode("utf-8")
+
+    return StreamingResponse(_paced(chunks, settings, encode), media_type="application/json")
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """OpenAI-compatible; SSE when `stream` is set, otherwise one JSON completion."""
+    body = await request.json()
+    model = body.get("model", "mock")
+    prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+    settings = _settings(request)
+    rng = _rng(prompt, settings["seed"])
+    if rng.random() < settings["error_rate"]:
+        return _error(settings)
+
+    if not body.get("stream"):
+        await asyncio.sleep(settings["latency"])
+        # Same texts as the in-process council mock, including FINAL RANKING for review prompts
+        content = await MockProvider(latency=0, jitter=0, seed=int(settings["seed"])).complete(model, prompt)
+        return {
+            "id": "mock-completion",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        }
+
+    chunks = _answer_chunks(rng, settings)
+
+    def encode(i: int, text: str) -> bytes:
+        chunk = {"object": "chat.completion.chunk", "model": model, "choices": [{"index": 0, "delta": {"content": text}}]}
+        event = f"data: {json.dumps(chunk)}\n\n"
+        if i == len(chunks) - 1:
+            event += "data: [DONE]\n\n"
+        return event.encode("utf-8")
+
+    return StreamingResponse(_paced(chunks, settings, encode), media_type="text/event-stream")
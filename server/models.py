@@ -20,10 +20,42 @@ class AggregateRanking(BaseModel):
     model: str
     avg_rank: float
     votes: int
+    borda_score: Optional[float] = None
+    copeland_score: Optional[float] = None
+    kemeny_position: Optional[int] = None
+    ci_low: Optional[float] = None # 95% bootstrap interval of avg_rank
+    ci_high: Optional[float] = None
+
+class RankingStatistics(BaseModel):
+    kendall_w: Optional[float] = None # inter-reviewer agreement, 0..1
+    kemeny_order: List[str] = []
+    pairwise_wins: Dict[str, Dict[str, int]] = {}
+    reviewers: int = 0
 
 class SynthesisResponse(BaseModel):
     final_answer: str
     aggregate_rankings: List[AggregateRanking]
+    ranking_stats: Optional[RankingStatistics] = None
+
+class CouncilRunRequest(BaseModel):
+    id: Optional[str] = None
+    question: str
+    models: List[str]
+
+class MemberFailure(BaseModel):
+    model: str
+    stage: int
+    error: str
+
+class CouncilRunResponse(BaseModel):
+    id: Optional[str] = None
+    question: str
+    stage1_responses: List[Stage1Response]
+    stage2_reviews: List[Stage2Review]
+    result: SynthesisResponse
+    failures: List[MemberFailure] = []
+    skipped_reviewers: List[str] = [] # still reviewing when stage 2 quorum was reached
+    timings: Dict[str, float] = {}
 
 class ConversationCreate(BaseModel):
     title: str
@@ -0,0 +1,128 @@
+import os
+import uuid
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+import storage
+from settings import get_settings
+
+def build_conversation_state(request, result) -> Dict:
+    """Frontend ConversationState for a finished synthesis (SynthesisRequest + SynthesisResponse)."""
+    return {
+        "id": request.id,
+        "question": request.question,
+        "selectedModels": [r.model for r in request.stage1_responses],
+        "stage1Responses": [r.dict() for r in request.stage1_responses],
+        "stage2Reviews": [r.dict() for r in request.stage2_reviews],
+        "stage3Result": result.dict(),
+        "currentStage": 3
+    }
+
+class PersistenceQueue:
+    """
+    Write-behind queue for conversation auto-saves. Request handlers hand off
+    the frontend state and return immediately; a single background worker
+    writes it with storage.save_conversation in a thread. Several updates to
+    the same conversation id that are still waiting are coalesced so only the
+    latest state is written. The queue is bounded: when it is full, submit()
+    waits for room, which pushes back on the callers.
+    """
+
+    def __init__(self, maxsize: int, save_fn: Callable[[Dict], Any] = None):
+        self.maxsize = maxsize
+        self._save_fn = save_fn or storage.save_conversation
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[str, Dict] = {} # id -> latest state waiting to be written
+        self._worker: Optional[asyncio.Task] = None
+        self._writing: Optional[str] = None
+        self._stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "written": 0,
+            "failed": 0,
+        }
+        self._last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything queued, then stops the worker."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def submit(self, frontend_state: Dict) -> str:
+        """Queues a save and returns the conversation id."""
+        if not frontend_state.get("id"):
+            # Coalescing needs a stable key, so assign the id up front
+            frontend_state = {**frontend_state, "id": str(uuid.uuid4())}
+        conv_id = frontend_state["id"]
+
+        if not self.running:
+            # Outside the app lifespan (scripts, tests): write through
+            await asyncio.to_thread(self._write, frontend_state)
+            return conv_id
+
+        if conv_id in self._pending:
+            self._pending[conv_id] = frontend_state
+            self._stats["coalesced"] += 1
+            return conv_id
+
+        self._pending[conv_id] = frontend_state
+        self._stats["enqueued"] += 1
+        await self._queue.put(conv_id)
+        return conv_id
+
+    def is_pending(self, conv_id: str) -> bool:
+        return conv_id in self._pending or conv_id == self._writing
+
+    async def drain(self):
+        """Waits until every write queued so far has been attempted."""
+        if self.running:
+            await self._queue.join()
+
+    def _write(self, frontend_state: Dict):
+        try:
+            self._save_fn(frontend_state)
+            self._stats["written"] += 1
+        except Exception as e:
+            self._stats["failed"] += 1
+            self._last_error = f"{frontend_state.get('id')}: {e}"
+            print(f"Failed to persist conversation {frontend_state.get('id')}: {e}")
+
+    async def _run(self):
+        while True:
+            conv_id = await self._queue.get()
+            try:
+                frontend_state = self._pending.pop(conv_id, None)
+                if frontend_state is not None:
+                    self._writing = conv_id
+                    await asyncio.to_thread(self._write, frontend_state)
+            finally:
+                self._writing = None
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_depth": self.maxsize,
+            "running": self.running,
+            "last_error": self._last_error,
+        }
+
+persistence_queue = PersistenceQueue(maxsize=get_settings().persistence_queue_size)
@@ -0,0 +1,78 @@
+import re
+from typing import List, Tuple
+
+# "FINAL RANKING:" header; everything after the first occurrence is scanned.
+# The prompt asks for this exact spelling, so a plain str.find() is tried
+# before the much slower case-insensitive regex search.
+_FINAL_RANKING = "FINAL RANKING:"
+_FINAL_RANKING_RE = re.compile(re.escape(_FINAL_RANKING), re.IGNORECASE)
+
+# One ranking line: "1. Response A", "2. **Response AB**", or a tie such as
+# "3. Response C = Response D" / "3. Response C, Response D" / "3. Response C and Response D"
+_LABEL = r"Response[ \t]+[A-Z]{1,3}\b"
+_TIE_SEPARATOR = r"[ \t]*(?:=|,|/|&|\band\b|\btied with\b)[ \t]*[*_]*"
+_RANK_LINE_RE = re.compile(
+    rf"(\d+)\.[ \t]*[*_]*({_LABEL}(?:{_TIE_SEPARATOR}{_LABEL})*)",
+    re.IGNORECASE,
+)
+_LABEL_RE = re.compile(r"Response[ \t]+([A-Z]{1,3})\b", re.IGNORECASE)
+
+def label_for_index(index: int) -> str:
+    """0 -> "Response A", 25 -> "Response Z", 26 -> "Response AA", ..."""
+    letters = ""
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return f"Response {letters}"
+
+def parse_ranking_groups(text: str) -> List[List[str]]:
+    """
+    Returns the FINAL RANKING as ordered groups of labels; tied labels share
+    a group. A label that was already ranked is ignored if repeated.
+    """
+    start = text.find(_FINAL_RANKING)
+    if start >= 0:
+        start += len(_FINAL_RANKING)
+    else:
+        header = _FINAL_RANKING_RE.search(text)
+        if header is None:
+            return []
+        start = header.end()
+
+    groups = []
+    seen = set()
+    for line in text[start:].split("\n"):
+        line = line.lstrip(" \t")
+        # Cheap filter: only numbered lines can be ranking entries
+        if not line[:1].isdigit():
+            continue
+        line_match = _RANK_LINE_RE.match(line)
+        if line_match is None:
+            continue
+        group = []
+        for letters in _LABEL_RE.findall(line_match.group(2)):
+            label = f"Response {letters.upper()}"
+            if label not in seen:
+                seen.add(label)
+                group.append(label)
+        if group:
+            groups.append(group)
+    return groups
+
+def parse_ranked_labels(text: str) -> List[Tuple[str, int]]:
+    """
+    Flattens the ranking into (label, rank) pairs using standard competition
+    ranking, so "1. A = B / 2. C" gives A=1, B=1, C=3.
+    """
+    ranked = []
+    position = 1
+    for group in parse_ranking_groups(text):
+        for label in group:
+            ranked.append((label, position))
+        position += len(group)
+    return ranked
+
+def parse_ranking(text: str) -> List[str]:
+    """Labels in ranked order, e.g. ["Response C", "Response A", "Response B"]."""
+    return [label for group in parse_ranking_groups(text) for label in group]
@@ -0,0 +1,49 @@
+import json
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Several times faster than the json module on large conversation payloads;
+# the standard library is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(content: Any, sort_keys: bool = False) -> bytes:
+    """Compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(content, option=option)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with dumps(). Returning one from a route also
+    skips FastAPI's response_model validation and jsonable_encoder pass,
+    which for a plain dict only copies it; the route's response_model then
+    only documents the shape.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class GuardedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls `on_close` however the response ended.
+    A background task is skipped when the client disconnects, and a body
+    generator that never started has no finally to run, so resources taken
+    before the response starts need this. `on_close` must be idempotent.
+    """
+
+    def __init__(self, content: Any, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
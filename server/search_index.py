@@ -0,0 +1,303 @@
+import os
+import re
+import html
+import sqlite3
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+
+from settings import get_settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+    title, question, responses, reviews, final_answer,
+    tokenize = 'porter unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+);
+CREATE TABLE IF NOT EXISTS search_doc_models (
+    model TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    PRIMARY KEY (model, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_search_doc_models_doc ON search_doc_models (doc);
+CREATE TABLE IF NOT EXISTS search_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# bm25 column weights: title, question, responses, reviews, final_answer
+_BM25_WEIGHTS = "10.0, 6.0, 1.0, 0.5, 3.0"
+# Private-use markers around hits; the snippet is HTML-escaped before they become <mark>
+_HIT_START = "\ue000"
+_HIT_END = "\ue001"
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+def build_match_query(q: str) -> Optional[str]:
+    """
+    Turns free text into a safe FTS5 query: every word must match (AND), the
+    last one as a prefix so results update while typing. FTS5 operators in
+    the input are treated as plain words.
+    """
+    terms = _TERM_RE.findall(q)
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    # One-letter prefixes match most of the vocabulary; the prefix indexes start at two
+    if len(terms[-1]) > 1:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+def document_fields(messages: List[Dict]) -> Dict[str, Any]:
+    """Searchable text of a stored conversation, split by stage."""
+    fields = {"question": [], "responses": [], "reviews": [], "final_answer": [], "models": set()}
+    for message in messages:
+        if message.get("role") == "user":
+            fields["question"].append(message.get("content") or "")
+            continue
+        for r in message.get("stage1") or []:
+            fields["responses"].append(r.get("response") or "")
+            fields["models"].add(r.get("model"))
+        for r in message.get("stage2") or []:
+            fields["reviews"].append(r.get("ranking") or "")
+            fields["models"].add(r.get("model"))
+        stage3 = message.get("stage3")
+        if stage3:
+            fields["final_answer"].append(stage3.get("response") or "")
+    return {
+        "question": "\n".join(fields["question"]),
+        "responses": "\n\n".join(fields["responses"]),
+        "reviews": "\n\n".join(fields["reviews"]),
+        "final_answer": "\n".join(fields["final_answer"]),
+        "models": sorted(m for m in fields["models"] if m),
+    }
+
+class SearchIndex:
+    """
+    SQLite FTS5 index over saved conversations, kept in its own database so
+    it works with either storage backend and can be dropped and rebuilt at
+    any time. Writes are serialized by `lock`, which rebuilds also hold while
+    re-reading a conversation so they never index a stale copy. A
+    "complete" marker is only committed once a full rebuild has finished,
+    so an interrupted or never-run backfill is retried on the next start.
+    """
+
+    def __init__(self, db_path: str, rank_window: int = 1000):
+        self.db_path = db_path
+        self.rank_window = rank_window
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _remove(self, conn: sqlite3.Connection, conversation_id: str):
+        row = conn.execute("SELECT rowid FROM search_docs WHERE id = ?", (conversation_id,)).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM search_fts WHERE rowid = ?", (row["rowid"],))
+        conn.execute("DELETE FROM search_doc_models WHERE doc = ?", (row["rowid"],))
+        conn.execute("DELETE FROM search_docs WHERE rowid = ?", (row["rowid"],))
+
+    def index(self, conversation_id: str, title: str, created_at: str, messages: List[Dict]):
+        """Adds or replaces one conversation."""
+        fields = document_fields(messages)
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._remove(conn, conversation_id)
+                cursor = conn.execute(
+                    "INSERT INTO search_docs (id, title, created_at) VALUES (?, ?, ?)",
+                    (conversation_id, title, created_at),
+                )
+                doc = cursor.lastrowid
+                conn.execute(
+                    "INSERT INTO search_fts (rowid, title, question, responses, reviews, final_answer) VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc, title, fields["question"], fields["responses"], fields["reviews"], fields["final_answer"]),
+                )
+                conn.executemany(
+                    "INSERT INTO search_doc_models (model, doc) VALUES (?, ?)",
+                    [(model, doc) for model in fields["models"]],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def remove(self, conversation_id: str):
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._remove(conn, conversation_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM search_fts")
+            conn.execute("DELETE FROM search_doc_models")
+            conn.execute("DELETE FROM search_docs")
+            conn.execute("DELETE FROM search_meta WHERE key = 'complete'")
+            conn.execute("COMMIT")
+
+    def is_complete(self) -> bool:
+        """True once every stored conversation has been indexed by a finished rebuild."""
+        row = self._connect().execute("SELECT value FROM search_meta WHERE key = 'complete'").fetchone()
+        return row is not None
+
+    def mark_complete(self):
+        with self.lock:
+            self._connect().execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('complete', '1')")
+
+    def optimize(self):
+        """Merges FTS5 segments; worth running after a bulk rebuild."""
+        self._connect().execute("INSERT INTO search_fts (search_fts) VALUES ('optimize')")
+
+    def search(self, q: str, model: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """
+        Best matches first (bm25 with title and question weighted up), each
+        with an HTML-safe snippet of the best matching column in which hits
+        are wrapped in <mark>. A query matching more than `rank_window`
+        conversations is ranked among its most recently saved matches only,
+        since FTS5 has to score every candidate it ranks.
+        """
+        match = build_match_query(q)
+        if match is None:
+            return []
+        # Checked per FTS row; `rowid IN (...)` would be handed to FTS5 as a
+        # constraint that re-runs the MATCH for every listed document
+        model_filter = (
+            "AND EXISTS (SELECT 1 FROM search_doc_models m WHERE m.model = :model AND m.doc = search_fts.rowid)"
+            if model else ""
+        )
+        params = {"match": match, "model": model, "limit": limit, "offset": offset, "floor": 0}
+        conn = self._connect()
+        if self.rank_window > 0:
+            # Walking the matches newest first stops after rank_window of them
+            row = conn.execute(
+                f"SELECT rowid FROM search_fts WHERE search_fts MATCH :match {model_filter} "
+                "ORDER BY rowid DESC LIMIT 1 OFFSET :skip",
+                {**params, "skip": self.rank_window - 1},
+            ).fetchone()
+            if row is not None:
+                params["floor"] = row[0]
+        # ORDER BY rank is sorted inside FTS5, which keeps each hit's positions,
+        # so snippets come cheap; metadata is only joined for the page
+        query = f"""
+            WITH page AS MATERIALIZED (
+                SELECT rowid AS doc, rank AS score,
+                       snippet(search_fts, -1, char(57344), char(57345), '…', 16) AS snippet
+                FROM search_fts
+                WHERE search_fts MATCH :match AND rank MATCH 'bm25({_BM25_WEIGHTS})'
+                  AND rowid >= :floor {model_filter}
+                ORDER BY rank LIMIT :limit OFFSET :offset
+            )
+            SELECT d.id, d.title, d.created_at, page.score, page.snippet
+            FROM page
+            JOIN search_docs d ON d.rowid = page.doc
+            ORDER BY page.score
+        """
+        rows = conn.execute(query, params).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "created_at": row["created_at"],
+                "score": round(-row["score"], 4), # bm25() is lower-is-better
+                "snippet": html.escape(row["snippet"]).replace(_HIT_START, "<mark>").replace(_HIT_END, "</mark>"),
+            }
+            for row in rows
+        ]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+
+_index: Optional[SearchIndex] = None
+
+def get_index() -> SearchIndex:
+    global _index
+    if _index is None:
+        settings = get_settings()
+        _index = SearchIndex(settings.search_index_path, rank_window=settings.search_rank_window)
+    return _index
+
+def rebuild(index: Optional[SearchIndex] = None, stop: Optional[threading.Event] = None) -> int:
+    """
+    Re-indexes every stored conversation from the active storage backend.
+    Setting `stop` ends it after the current conversation without marking
+    the index complete.
+    """
+    import storage
+
+    index = index or get_index()
+    backend = storage.get_backend()
+    index.clear()
+    count = 0
+    for meta in backend.list_metadata():
+        if stop is not None and stop.is_set():
+            return count
+        # Held across load + index so a concurrent save from any worker
+        # can't be overwritten by an older copy
+        with storage.conversation_lock(meta["id"]), index.lock:
+            stored = backend.load(meta["id"])
+            if stored is None:
+                continue
+            index.index(stored["id"], stored.get("title", "Untitled"), stored.get("created_at", ""), stored.get("messages", []))
+        count += 1
+    index.optimize()
+    index.mark_complete()
+    return count
+
+def backfill_if_needed(stop: Optional[threading.Event] = None) -> Optional[int]:
+    """
+    Fills the index from storage unless a previous rebuild finished (first
+    start after upgrading, or after a crash or stop mid-backfill). `stop`
+    is passed on to rebuild() so shutdown doesn't wait for it.
+    """
+    index = get_index()
+    if index.is_complete():
+        return None
+    count = rebuild(index, stop)
+    if not index.is_complete():
+        print(f"Search backfill stopped after {count} conversations; it starts over on the next start")
+    elif count:
+        print(f"Indexed {count} existing conversations for search")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the conversation search index")
+    parser.add_argument("--rebuild", action="store_true", help="re-index all stored conversations")
+    parser.add_argument("--query", help="run a search and print the results")
+    parser.add_argument("--model", help="only conversations this model took part in")
+    args = parser.parse_args()
+    if args.rebuild:
+        print(f"Indexed {rebuild()} conversations into {get_index().db_path}")
+    if args.query:
+        for hit in get_index().search(args.query, model=args.model):
+            print(f"{hit['score']:>8}  {hit['id']}  {hit['title']}\n          {hit['snippet']}")
@@ -0,0 +1,457 @@
+import os
+import json
+import mmap
+import zlib
+import uuid
+import struct
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from settings import get_settings
+from storage_concurrency import FileLock, check_version, fsync_dir
+
+# Optional codecs; records say which codec wrote them, so files stay readable
+# wherever the same packages are installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FILE_MAGIC = b"LLMCSEG1"
+# generation token, written once; a compaction starts a new generation
+FILE_HEADER = struct.Struct("<8s16s")
+# op, codec, id length, meta length, payload length, crc32 of id + meta + payload
+RECORD_HEADER = struct.Struct("<BBHHII")
+
+OP_PUT = 1
+OP_DELETE = 2
+
+CODEC_MSGPACK = 0x01
+CODEC_ZLIB = 0x02
+CODEC_ZSTD = 0x04
+
+# Persist the offset index after this many appends, so a restart only re-scans the tail
+SNAPSHOT_EVERY = 500
+# Compact once dead records are over half the file and the file is worth the rewrite
+COMPACT_MIN_BYTES = 64 * 1024 * 1024
+COMPACT_DEAD_RATIO = 0.5
+
+class SegmentCorruptError(Exception):
+    pass
+
+COMPRESSION = {"zstd": CODEC_ZSTD, "zlib": CODEC_ZLIB, "none": 0}
+
+def default_codec(compression: str = "auto") -> int:
+    """msgpack when installed, else minified JSON; `compression` is auto (zstd, else zlib), zstd, zlib or none."""
+    codec = CODEC_MSGPACK if msgpack is not None else 0
+    if compression == "auto":
+        compression = "zstd" if zstandard is not None else "zlib"
+    if compression not in COMPRESSION:
+        raise ValueError(f"Unknown segment compression: {compression}")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package")
+    return codec | COMPRESSION[compression]
+
+def encode_messages(messages: List[Dict], codec: int) -> bytes:
+    if codec & CODEC_MSGPACK:
+        raw = msgpack.packb(messages, use_bin_type=True)
+    else:
+        raw = json.dumps(messages, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if codec & CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    if codec & CODEC_ZLIB:
+        return zlib.compress(raw, 6)
+    return raw
+
+def decode_messages(payload, codec: int) -> List[Dict]:
+    """`payload` may be a memoryview straight into the mapped segment."""
+    if codec & CODEC_ZSTD:
+        if zstandard is None:
+            raise SegmentCorruptError("record is zstd-compressed but zstandard is not installed")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec & CODEC_ZLIB:
+        payload = zlib.decompress(payload)
+    if codec & CODEC_MSGPACK:
+        if msgpack is None:
+            raise SegmentCorruptError("record is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(bytes(payload))
+
+class SegmentBackend:
+    """
+    Append-only segment file: every save appends a compressed record and
+    every delete a tombstone. An in-memory offset index (id -> record
+    position plus title/created_at) answers listings without touching
+    payloads, and load() decodes a single record from a memory map. The
+    index is snapshotted next to the segment (`.idx`) so opening only
+    re-scans records appended since the last snapshot; compact() rewrites
+    the live records once superseded ones pile up.
+
+    Several processes may share one segment: appends, compaction and tail
+    truncation happen under a lock file (`.lock`), and each process picks
+    up the others' records by re-scanning the tail whenever the file has
+    grown, or reloading when a compaction replaced it.
+    """
+
+    def __init__(self, path: str, codec: Optional[int] = None):
+        self.path = path
+        self.index_path = path + ".idx"
+        # Present from creation until the JSON import has finished
+        self.import_marker_path = path + ".importing"
+        self.codec = default_codec(get_settings().storage_segment_compression) if codec is None else codec
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path + ".lock")
+        self._map: Optional[mmap.mmap] = None
+        self._sorted: Optional[List[Dict]] = None
+        self._fd: Optional[int] = None
+        self._open()
+
+    # Opening and scanning
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, self._file_lock:
+            self.created = not os.path.exists(self.path)
+            if self.created:
+                # Before the segment itself, so a crash can't leave a segment without it
+                open(self.import_marker_path, "wb").close()
+                fsync_dir(os.path.dirname(self.path) or ".")
+                with open(self.path, "wb") as f:
+                    f.write(FILE_HEADER.pack(FILE_MAGIC, uuid.uuid4().bytes))
+            self._load()
+
+    def _load(self):
+        """(Re)builds the index for the file currently at `path`. Needs both locks."""
+        with open(self.path, "rb") as f:
+            magic, generation = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            inode = os.fstat(f.fileno()).st_ino
+        if magic != FILE_MAGIC:
+            raise SegmentCorruptError(f"{self.path} is not a conversation segment")
+        self.generation = generation
+        self._inode = inode
+        # id -> (offset, record length, codec, title, created_at, version)
+        self._entries: Dict[str, Tuple[int, int, int, str, str, int]] = {}
+        self._dead_bytes = 0
+        self._since_snapshot = 0
+        self._map = None
+        self._sorted = None
+        scanned_from = self._load_snapshot()
+        self._size = self._scan(scanned_from)
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        if self._since_snapshot:
+            self._write_snapshot()
+
+    def _sync(self):
+        """Catches up with records other processes appended. Needs both locks."""
+        stat = os.stat(self.path)
+        if stat.st_ino != self._inode:
+            self._load() # compacted by another process
+        elif stat.st_size > self._size:
+            self._size = self._scan(self._size)
+
+    def _refresh(self):
+        """Lock-free check before reads; only takes the locks when the file changed."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size != self._size:
+            with self._lock, self._file_lock:
+                self._sync()
+
+    def _load_snapshot(self) -> int:
+        """Restores the index from `.idx` if it belongs to this generation. Returns the offset to scan from."""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot["generation"] != self.generation.hex() or snapshot["size"] > os.path.getsize(self.path):
+                raise ValueError("stale index snapshot")
+        except (OSError, ValueError, KeyError):
+            return FILE_HEADER.size
+        # Snapshots from before versioning have no version column
+        self._entries = {e[0]: tuple(e[1:7]) if len(e) > 6 else (*e[1:6], 1) for e in snapshot["entries"]}
+        self._dead_bytes = snapshot["dead_bytes"]
+        return snapshot["size"]
+
+    def _scan(self, offset: int) -> int:
+        """
+        Replays records from `offset` into the index. A torn record at the
+        tail (crashed mid-append) is cut off, which is only safe under the
+        file lock. Returns the valid file size.
+        """
+        size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while offset < size:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                op, codec, id_len, meta_len, payload_len, crc = RECORD_HEADER.unpack(header)
+                body = f.read(id_len + meta_len + payload_len)
+                if op not in (OP_PUT, OP_DELETE) or len(body) < id_len + meta_len + payload_len or zlib.crc32(body) != crc:
+                    break
+                conversation_id = body[:id_len].decode("utf-8")
+                record_len = RECORD_HEADER.size + len(body)
+                self._apply(op, conversation_id, offset, record_len, codec, body[id_len:id_len + meta_len])
+                offset += record_len
+                self._since_snapshot += 1
+        if offset < size:
+            print(f"Truncating {size - offset} bytes of incomplete records from {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        return offset
+
+    def _apply(self, op: int, conversation_id: str, offset: int, record_len: int, codec: int, meta: bytes):
+        previous = self._entries.pop(conversation_id, None)
+        if previous is not None:
+            self._dead_bytes += previous[1]
+        if op == OP_PUT:
+            title, created_at, *rest = json.loads(meta)
+            version = rest[0] if rest else 1
+            self._entries[conversation_id] = (offset, record_len, codec, title, created_at, version)
+        else:
+            self._dead_bytes += record_len
+        self._sorted = None
+
+    def _write_snapshot(self):
+        snapshot = {
+            "generation": self.generation.hex(),
+            "size": self._size,
+            "dead_bytes": self._dead_bytes,
+            "entries": [[conversation_id, *entry] for conversation_id, entry in self._entries.items()],
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+        self._since_snapshot = 0
+
+    # Reads
+
+    def _view(self, offset: int, length: int) -> memoryview:
+        mapped = self._map
+        if mapped is None or offset + length > len(mapped):
+            with self._lock:
+                mapped = self._map
+                if mapped is None or offset + length > len(mapped):
+                    # The old map stays valid for readers still holding it
+                    with open(self.path, "rb") as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._map = mapped
+        return memoryview(mapped)[offset:offset + length]
+
+    def _sorted_metadata(self) -> List[Dict]:
+        listing = self._sorted
+        if listing is None:
+            listing = [
+                {"id": conversation_id, "title": entry[3], "created_at": entry[4]}
+                for conversation_id, entry in list(self._entries.items())
+            ]
+            listing.sort(key=lambda x: (x["created_at"] or "", x["id"]), reverse=True)
+            self._sorted = listing
+        return listing
+
+    def list_metadata(self) -> List[Dict]:
+        self._refresh()
+        return [dict(item) for item in self._sorted_metadata()]
+
+    def list_page(self, limit: Optional[int], after: Optional[Tuple[str, str]], title_prefix: Optional[str]) -> List[Dict]:
+        self._refresh()
+        page = []
+        prefix = title_prefix.lower() if title_prefix else None
+        for item in self._sorted_metadata():
+            if after is not None and (item["created_at"] or "", item["id"]) >= after:
+                continue
+            if prefix and not (item["title"] or "").lower().startswith(prefix):
+                continue
+            page.append(dict(item))
+            if limit is not None and len(page) >= limit:
+                break
+        return page
+
+    def load(self, conversation_id: str) -> Optional[Dict]:
+        self._refresh()
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return None
+        offset, record_len, codec, title, created_at, version = entry
+        record = self._view(offset, record_len)
+        _, _, id_len, meta_len, payload_len, crc = RECORD_HEADER.unpack(record[:RECORD_HEADER.size])
+        body = record[RECORD_HEADER.size:]
+        if zlib.crc32(body) != crc:
+            raise SegmentCorruptError(f"Checksum mismatch for conversation {conversation_id}")
+        return {
+            "id": conversation_id,
+            "created_at": created_at,
+            "title": title,
+            "version": version,
+            "messages": decode_messages(body[id_len + meta_len:], codec),
+        }
+
+    def revision(self, conversation_id: str) -> Optional[Tuple[bytes, int]]:
+        """Cheap change token: the record's position; every write appends a new record."""
+        self._refresh()
+        entry = self._entries.get(conversation_id)
+        return (self.generation, entry[0]) if entry is not None else None
+
+    # Writes
+
+    def _append(self, op: int, conversation_id: str, meta: bytes, payload: bytes, codec: int):
+        id_bytes = conversation_id.encode("utf-8")
+        body = id_bytes + meta + payload
+        record = RECORD_HEADER.pack(op, codec, len(id_bytes), len(meta), len(payload), zlib.crc32(body)) + body
+        offset = self._size
+        os.write(self._fd, record)
+        self._size += len(record)
+        self._apply(op, conversation_id, offset, len(record), codec, meta)
+        self._since_snapshot += 1
+        if self._since_snapshot >= SNAPSHOT_EVERY:
+            self._write_snapshot()
+
+    def write(self, conversation_id: str, title: str, messages: List[Dict], created_at: str,
+              expected_version: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Stores the document, keeping an existing created_at. With
+        `expected_version` the write only happens if the stored version
+        still matches. Returns the effective created_at and the new version.
+        """
+        # Encoding and compression happen outside the lock
+        payload = encode_messages(messages, self.codec)
+        with self._lock, self._file_lock:
+            self._sync()
+            existing = self._entries.get(conversation_id)
+            version = 0
+            if existing is not None:
+                created_at = existing[4]
+                version = existing[5]
+            check_version(conversation_id, version, expected_version)
+            meta = json.dumps([title, created_at, version + 1], separators=(",", ":")).encode("utf-8")
+            self._append(OP_PUT, conversation_id, meta, payload, self.codec)
+            self._maybe_compact()
+        return created_at, version + 1
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock, self._file_lock:
+            self._sync()
+            if conversation_id not in self._entries:
+                return False
+            self._append(OP_DELETE, conversation_id, b"", b"", 0)
+            self._maybe_compact()
+        return True
+
+    def needs_json_import(self) -> bool:
+        """True from creation until mark_json_imported(), so an interrupted import runs again."""
+        return os.path.exists(self.import_marker_path)
+
+    def mark_json_imported(self):
+        try:
+            os.remove(self.import_marker_path)
+        except FileNotFoundError:
+            pass
+
+    def import_document(self, stored_data: Dict):
+        """Inserts a document in the JSON file layout as-is (used by the migrator)."""
+        self.write(
+            stored_data["id"],
+            stored_data.get("title", "Untitled"),
+            stored_data.get("messages", []),
+            stored_data.get("created_at") or datetime.utcnow().isoformat(),
+        )
+
+    # Maintenance
+
+    def stats(self) -> Dict:
+        self._refresh()
+        return {
+            "conversations": len(self._entries),
+            "file_bytes": self._size,
+            "dead_bytes": self._dead_bytes,
+        }
+
+    def _maybe_compact(self):
+        if self._size >= COMPACT_MIN_BYTES and self._dead_bytes > self._size * COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self) -> int:
+        """Rewrites the live records into a new generation. Returns the bytes reclaimed."""
+        with self._lock, self._file_lock:
+            self._sync()
+            before = self._size
+            tmp_path = f"{self.path}.{os.getpid()}.compact"
+            generation = uuid.uuid4().bytes
+            entries = {}
+            with open(tmp_path, "wb") as f:
+                f.write(FILE_HEADER.pack(FILE_MAGIC, generation))
+                offset = FILE_HEADER.size
+                for conversation_id, (old_offset, record_len, *rest) in sorted(
+                    self._entries.items(), key=lambda item: item[1][0]
+                ):
+                    # Records are position independent, so they are copied byte for byte
+                    f.write(self._view(old_offset, record_len))
+                    entries[conversation_id] = (offset, record_len, *rest)
+                    offset += record_len
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            self._inode = os.fstat(self._fd).st_ino
+            self.generation = generation
+            self._entries = entries
+            self._size = offset
+            self._dead_bytes = 0
+            self._map = None
+            self._sorted = None
+            self._write_snapshot()
+            return before - offset
+
+    def close(self):
+        with self._lock, self._file_lock:
+            if self._since_snapshot:
+                self._write_snapshot()
+            os.close(self._fd)
+
+def convert(source, target) -> int:
+    """Copies every conversation from one backend into another. Returns the number copied."""
+    copied = 0
+    for meta in source.list_metadata():
+        try:
+            stored = source.load(meta["id"])
+            if stored is not None:
+                target.import_document(stored)
+                copied += 1
+        except Exception as e:
+            print(f"Skipping {meta['id']} during conversion: {e}")
+    return copied
+
+if __name__ == "__main__":
+    import argparse
+    import storage
+
+    parser = argparse.ArgumentParser(description="Convert conversations into the compact segment store, or compact it")
+    parser.add_argument("--from", dest="source", choices=["json", "sqlite"], help="backend to convert from")
+    parser.add_argument("--segment", default=get_settings().storage_segment_path)
+    parser.add_argument("--compact", action="store_true", help="drop superseded and deleted records")
+    args = parser.parse_args()
+
+    backend = SegmentBackend(args.segment)
+    if args.source:
+        count = convert(storage.create_backend(args.source), backend)
+        print(f"Converted {count} conversations into {args.segment}")
+    if args.compact:
+        print(f"Reclaimed {backend.compact()} bytes")
+    backend.close()
+    print(json.dumps(backend.stats()))
@@ -0,0 +1,505 @@
+import re
+import json
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from settings import get_settings
+from services.http_client import get_client
+from services.resilience import RetryPolicy, CircuitBreaker, LatencyTracker, parse_retry_after
+
+class UpstreamError(Exception):
+    """
+    Raised when the chairman endpoint cannot produce an answer. `status_code`
+    is the upstream HTTP status (None for transport errors), `http_status`
+    the status we answer our own client with.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: Optional[bool] = None,
+        http_status: Optional[int] = None,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status_code is None or status_code == 429 or status_code >= 500
+        self.retryable = retryable
+        if http_status is None:
+            http_status = 503 if status_code == 429 else 502
+        self.http_status = http_status
+
+def _response_error(response: httpx.Response, body: bytes) -> UpstreamError:
+    return UpstreamError(
+        f"Error {response.status_code}: {body.decode('utf-8', errors='replace')}",
+        status_code=response.status_code,
+        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+    )
+
+def _transport_error(e: Exception) -> UpstreamError:
+    if isinstance(e, httpx.TimeoutException):
+        return UpstreamError(f"Upstream timed out: {e!r}", http_status=504)
+    return UpstreamError(f"Error calling API: {str(e)}")
+
+def build_payload(prompt_text: str) -> Dict[str, Any]:
+    return {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [
+                    {
+                        "text": prompt_text
+                    }
+                ]
+            }
+        ],
+        "generationConfig": {
+            "temperature": 1,
+            "maxOutputTokens": 65535,
+            "topP": 0.95,
+            "thinkingConfig": {
+                "thinkingLevel": "HIGH"
+            }
+        },
+        "safetySettings": [
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "OFF"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "OFF"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "OFF"},
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "OFF"}
+        ],
+        "tools": [
+            {
+                "googleSearch": {}
+            }
+        ]
+    }
+
+# Characters that change the scanner's state outside and inside JSON strings
+_STRUCTURE_RE = re.compile(r'[{}\[\]"]')
+_STRING_RE = re.compile(r'["\\]')
+
+class JsonArrayStreamParser:
+    """
+    Incrementally decodes the top-level JSON array returned by
+    streamGenerateContent (`[{...},\r\n{...}]`), yielding each chunk object
+    as soon as it is complete instead of waiting for the closing bracket.
+    Each piece of text is scanned once, tracking nesting depth and string
+    state, and an object is only decoded after its closing brace, so a large
+    object split over many reads costs linear time.
+    """
+
+    def __init__(self):
+        self._pieces: List[str] = [] # text of the object still open
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[Any]:
+        items = []
+        start = 0 # where the open object's text begins in `text`
+        pos = 0
+        end = len(text)
+        while pos < end:
+            if self._depth == 0:
+                # Skip the array punctuation between chunk objects
+                while pos < end and text[pos] in " \t\r\n[],":
+                    pos += 1
+                if pos == end:
+                    break
+                if text[pos] != "{":
+                    raise json.JSONDecodeError("Expected a chunk object", text, pos)
+                start = pos
+                self._depth = 1
+                pos += 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    pos += 1
+                    continue
+                match = _STRING_RE.search(text, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    self._escaped = True
+                else:
+                    self._in_string = False
+            else:
+                match = _STRUCTURE_RE.search(text, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pieces.append(text[start:pos])
+                        items.append(json.loads("".join(self._pieces)))
+                        self._pieces = []
+        if self._depth:
+            self._pieces.append(text[start:])
+        return items
+
+def extract_chunk_text(chunk: Dict[str, Any]) -> str:
+    text = ""
+    for candidate in chunk.get("candidates", []):
+        for part in candidate.get("content", {}).get("parts", []):
+            if "text" in part:
+                text += part["text"]
+    return text
+
+class GeminiRestProvider:
+    """The custom streamGenerateContent REST endpoint (GEMINI_CUSTOM_ENDPOINT)."""
+
+    name = "gemini"
+
+    def __init__(self, endpoint: Optional[str], api_key: Optional[str]):
+        self.endpoint = endpoint
+        self.api_key = api_key
+
+    def cache_identity(self) -> Dict[str, Any]:
+        payload = build_payload("")
+        return {
+            "provider": self.name,
+            "endpoint": self.endpoint or "",
+            "generation_config": payload["generationConfig"],
+            "tools": payload["tools"],
+        }
+
+    async def stream(self, prompt_text: str) -> AsyncIterator[str]:
+        if not self.api_key or not self.endpoint:
+            raise UpstreamError("Error: Missing GEMINI_CUSTOM_KEY or GEMINI_CUSTOM_ENDPOINT", retryable=False, http_status=503)
+
+        url = f"{self.endpoint}?key={self.api_key}"
+        try:
+            # Shared keep-alive client; the 300s timeout for thinking models is set on it
+            async with get_client().stream("POST", url, json=build_payload(prompt_text)) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise _response_error(response, body)
+
+                parser = JsonArrayStreamParser()
+                async for text in response.aiter_text():
+                    for chunk in parser.feed(text):
+                        delta = extract_chunk_text(chunk)
+                        if delta:
+                            yield delta
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise _transport_error(e) from e
+
+class OpenAICompatibleChairman:
+    """
+    Streams the chairman answer from any OpenAI-compatible /chat/completions
+    API (`stream: true`, server-sent `data:` lines).
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url: str, api_key: Optional[str], model: str, temperature: float = 1.0):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+
+    def cache_identity(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "endpoint": self.base_url,
+            "model": self.model,
+            "temperature": self.temperature,
+        }
+
+    async def stream(self, prompt_text: str) -> AsyncIterator[str]:
+        headers = {}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt_text}],
+            "temperature": self.temperature,
+            "stream": True,
+        }
+        try:
+            async with get_client().stream("POST", f"{self.base_url}/chat/completions", json=payload, headers=headers) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise _response_error(response, body)
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    for choice in chunk.get("choices", []):
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            yield delta
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise _transport_error(e) from e
+
+async def _next_delta(deltas):
+    return await deltas.__anext__()
+
+async def _discard(deltas, task: asyncio.Task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await deltas.aclose()
+
+class ResilientChairman:
+    """
+    Wraps a provider with retries, hedging and a circuit breaker. All of it
+    applies before the first chunk only: once text has been streamed to the
+    client a failure is final, since a retry would produce a different answer.
+
+    - 429/5xx and transport errors are retried with jittered exponential
+      backoff, waiting at least the upstream's Retry-After. A Retry-After
+      beyond the retry policy's max_delay fails the call at once and is
+      passed on to the client.
+    - With hedging on, a duplicate request is started when the first chunk is
+      later than the observed p95 time-to-first-chunk (or `hedge_after` until
+      enough samples exist); the first one to produce text wins.
+    - Consecutive failures open the circuit, which then rejects calls with a
+      503 until the reset timeout allows a trial request.
+    """
+
+    def __init__(self, provider, retry: RetryPolicy, breaker: CircuitBreaker, hedge: bool = False, hedge_after: float = 10.0):
+        self.provider = provider
+        self.name = provider.name
+        self.retry = retry
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.first_chunk_latency = LatencyTracker()
+        self._stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+    def cache_identity(self) -> Dict[str, Any]:
+        return self.provider.cache_identity()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        p95 = self.first_chunk_latency.percentile(0.95)
+        return p95 if p95 is not None else self.hedge_after
+
+    async def _first_chunk(self, prompt_text: str):
+        """Returns (deltas, first_delta) from the first request to produce text; first_delta is None for an empty answer."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deltas = self.provider.stream(prompt_text).__aiter__()
+        running = {asyncio.create_task(_next_delta(deltas)): deltas}
+        hedge_delay = self._hedge_delay()
+        hedged_task = None
+        last_error = None
+        try:
+            while running:
+                wait_for = hedge_delay if hedge_delay is not None and len(running) == 1 else None
+                done, _ = await asyncio.wait(running, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._stats["hedges"] += 1
+                    hedge_delay = None
+                    hedged = self.provider.stream(prompt_text).__aiter__()
+                    hedged_task = asyncio.create_task(_next_delta(hedged))
+                    running[hedged_task] = hedged
+                    continue
+                for task in done:
+                    deltas = running.pop(task)
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        self.first_chunk_latency.add(loop.time() - started)
+                        if task is hedged_task:
+                            self._stats["hedge_wins"] += 1
+                        return deltas, None if error else task.result()
+                    await deltas.aclose()
+                    last_error = error
+            raise last_error
+        finally:
+            for task, other in running.items():
+                await _discard(other, task)
+
+    async def stream(self, prompt_text: str) -> AsyncIterator[str]:
+        self._stats["calls"] += 1
+        for attempt in range(self.retry.attempts):
+            if not self.breaker.allow():
+                self._stats["failures"] += 1
+                raise UpstreamError(
+                    f"{self.name}: circuit open, upstream marked unavailable",
+                    retryable=False,
+                    retry_after=self.breaker.retry_after(),
+                    http_status=503,
+                )
+            try:
+                deltas, first = await self._first_chunk(prompt_text)
+            except UpstreamError as e:
+                if e.retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                delay = self.retry.delay(attempt, e.retry_after) if e.retryable else None
+                if delay is None or attempt == self.retry.attempts - 1:
+                    # Also when the upstream asks us to wait longer than we would;
+                    # e.retry_after reaches the client in the Retry-After header
+                    self._stats["failures"] += 1
+                    raise
+                self._stats["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+
+            try:
+                if first is not None:
+                    yield first
+                    async for delta in deltas:
+                        yield delta
+            except UpstreamError:
+                self.breaker.record_failure()
+                self._stats["failures"] += 1
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            finally:
+                await deltas.aclose()
+            self.breaker.record_success()
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.first_chunk_latency.percentile(0.95)
+        return {
+            **self._stats,
+            "first_chunk_p95": round(p95, 3) if p95 is not None else None,
+            "circuit": self.breaker.stats(),
+        }
+
+class FallbackChairman:
+    """
+    Tries providers in order. A provider that fails, or sends nothing within
+    `first_chunk_timeout` seconds, is abandoned for the next one; once text
+    has been streamed the answer stays with that provider. The last provider
+    gets no first-chunk timeout.
+    """
+
+    def __init__(self, providers: List[Any], first_chunk_timeout: float):
+        self.providers = providers
+        self.first_chunk_timeout = first_chunk_timeout
+        self.name = ",".join(p.name for p in providers)
+
+    def cache_identity(self) -> Dict[str, Any]:
+        # Only the primary's identity: fallback answers are cached under the same
+        # council, like any other successful answer for it
+        return self.providers[0].cache_identity()
+
+    async def stream(self, prompt_text: str) -> AsyncIterator[str]:
+        errors = []
+        last_error = UpstreamError("No chairman provider produced an answer")
+        for index, provider in enumerate(self.providers):
+            last = index == len(self.providers) - 1
+            deltas = provider.stream(prompt_text).__aiter__()
+            try:
+                timeout = None if last or not self.first_chunk_timeout else self.first_chunk_timeout
+                first = await asyncio.wait_for(deltas.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                errors.append(f"{provider.name}: no output after {self.first_chunk_timeout:g}s")
+                last_error = UpstreamError(errors[-1], http_status=504)
+                await deltas.aclose()
+                continue
+            except UpstreamError as e:
+                errors.append(f"{provider.name}: {e}")
+                last_error = e
+                await deltas.aclose()
+                if last:
+                    break
+                continue
+            if index > 0:
+                print(f"Chairman fell back to {provider.name} ({'; '.join(errors)})")
+            try:
+                yield first
+                async for delta in deltas:
+                    yield delta
+            finally:
+                await deltas.aclose()
+            return
+        raise UpstreamError(
+            "; ".join(errors),
+            status_code=last_error.status_code,
+            retry_after=last_error.retry_after,
+            retryable=False,
+            http_status=last_error.http_status,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {p.name: p.stats() for p in self.providers}
+
+def _create_provider(kind: str, settings):
+    if kind == "gemini":
+        return GeminiRestProvider(
+            endpoint=settings.gemini_custom_endpoint,
+            api_key=settings.gemini_custom_key,
+        )
+    if kind == "openai":
+        return OpenAICompatibleChairman(
+            base_url=settings.chairman_openai_base,
+            api_key=settings.chairman_openai_key,
+            model=settings.chairman_openai_model,
+            temperature=settings.chairman_openai_temperature,
+        )
+    raise ValueError(f"Unknown chairman provider: {kind}")
+
+_chairman = None
+
+def get_chairman():
+    """
+    CHAIRMAN_PROVIDER is one provider (gemini, openai) or a comma-separated
+    fallback chain such as "gemini,openai"; CHAIRMAN_FALLBACK_AFTER is the
+    first-chunk timeout before moving down the chain. Every provider gets its
+    own retries and circuit breaker, so a provider that is down is skipped
+    immediately. Built once: breaker and latency state live on the instance.
+    """
+    global _chairman
+    if _chairman is None:
+        settings = get_settings()
+        providers = [
+            ResilientChairman(
+                _create_provider(kind, settings),
+                retry=RetryPolicy(
+                    attempts=settings.chairman_retry_attempts,
+                    base_delay=settings.chairman_retry_base_delay,
+                    max_delay=settings.chairman_retry_max_delay,
+                ),
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.chairman_breaker_failures,
+                    reset_timeout=settings.chairman_breaker_reset,
+                ),
+                hedge=settings.chairman_hedge,
+                hedge_after=settings.chairman_hedge_after,
+            )
+            for kind in settings.chairman_providers
+        ]
+        if len(providers) == 1:
+            _chairman = providers[0]
+        else:
+            _chairman = FallbackChairman(providers, settings.chairman_fallback_after)
+    return _chairman
+
+def chairman_stats() -> Dict[str, Any]:
+    chairman = get_chairman()
+    if isinstance(chairman, FallbackChairman):
+        return chairman.stats()
+    return {chairman.name: chairman.stats()}
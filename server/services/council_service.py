@@ -0,0 +1,251 @@
+import re
+import math
+import time
+import random
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from models import (
+    Stage1Response,
+    Stage2Review,
+    SynthesisRequest,
+    MemberFailure,
+    CouncilRunRequest,
+    CouncilRunResponse,
+)
+from settings import get_settings
+from ranking_parser import label_for_index, parse_ranked_labels
+from services.llm_providers import get_council_provider, ProviderError
+from services.gemini_service import synthesize_answer
+
+def build_review_prompt(question: str, responses: List[Stage1Response]) -> str:
+    """Same stage 2 prompt the Stage2Review component shows for manual councils."""
+    anonymized_responses = "\n".join(
+        f"{label_for_index(i)}:\n{r.response}\n" for i, r in enumerate(responses)
+    )
+    return f"""You are evaluating different responses to the following question:
+
+Question: {question}
+
+Here are the responses from different models (anonymized):
+
+{anonymized_responses}
+Your task:
+1. First, evaluate each response individually. For each response, explain what it does well and what it does poorly.
+2. Then, at the very end of your response, provide a final ranking.
+
+IMPORTANT: Your final ranking MUST be formatted EXACTLY as follows:
+- Start with the line "FINAL RANKING:" (all caps, with colon)
+- Then list the responses from best to worst as a numbered list
+- Each line should be: number, period, space, then ONLY the response label (e.g., "1. Response A")
+- Do not add any other text or explanations in the ranking section
+
+Example of the correct format for your ENTIRE response:
+
+Response A provides good detail on X but misses Y...
+Response B is accurate but lacks depth on Z...
+Response C offers the most comprehensive answer...
+
+FINAL RANKING:
+1. Response C
+2. Response A
+3. Response B
+
+Now provide your evaluation and ranking:"""
+
+async def call_member(provider, model: str, prompt: str, timeout: float, hedge_after: Optional[float]) -> str:
+    """
+    Calls one council member with an overall `timeout`. If no answer arrived
+    after `hedge_after` seconds, a duplicate request is started and whichever
+    finishes first wins; the loser is cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tasks = {asyncio.create_task(provider.complete(model, prompt))}
+    hedged = not hedge_after or hedge_after >= timeout
+    last_error: Optional[BaseException] = None
+    try:
+        while tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            wait_for = remaining if hedged else min(remaining, hedge_after)
+            done, _ = await asyncio.wait(tasks, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            if not done and not hedged:
+                hedged = True
+                tasks.add(asyncio.create_task(provider.complete(model, prompt)))
+                continue
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        if last_error is not None and not tasks:
+            raise ProviderError(str(last_error)) from last_error
+        raise ProviderError(f"{model}: timed out after {timeout:.0f}s")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _fan_out(provider, models: List[str], prompt: str, stage: int) -> Tuple[List[Tuple[str, str]], List[MemberFailure]]:
+    settings = get_settings()
+    results = await asyncio.gather(
+        *(call_member(provider, model, prompt, settings.council_member_timeout, settings.council_hedge_after) for model in models),
+        return_exceptions=True,
+    )
+    answers = []
+    failures = []
+    for model, result in zip(models, results):
+        if isinstance(result, BaseException):
+            failures.append(MemberFailure(model=model, stage=stage, error=str(result)))
+        else:
+            answers.append((model, result))
+    return answers, failures
+
+async def run_stage1(provider, question: str, models: List[str]) -> Tuple[List[Stage1Response], List[MemberFailure]]:
+    """Asks every member the question concurrently; failed members are reported, not fatal."""
+    answers, failures = await _fan_out(provider, models, question, stage=1)
+    return [Stage1Response(model=m, response=text) for m, text in answers], failures
+
+_LABEL_RE = re.compile(r"\bResponse[ \t]+([A-Z]{1,3})\b", re.IGNORECASE)
+
+def reviewer_permutation(reviewer: str, question: str, count: int) -> List[int]:
+    """
+    Order in which `reviewer` sees the stage 1 responses. Seeded by reviewer
+    and question so each reviewer gets its own order (no shared position
+    bias) while a re-run of the same council sends identical prompts.
+    """
+    digest = hashlib.sha256(f"{reviewer}\n{question}".encode("utf-8")).digest()
+    order = list(range(count))
+    random.Random(int.from_bytes(digest[:8], "big")).shuffle(order)
+    return order
+
+def relabel_review(review: str, local_to_canonical: Dict[str, str]) -> str:
+    """Rewrites the reviewer's local labels to the canonical Response A/B/C of stage1 order."""
+    def replace(match):
+        return local_to_canonical.get(f"Response {match.group(1).upper()}", match.group(0))
+    return _LABEL_RE.sub(replace, review)
+
+class ReviewQuorum:
+    """
+    Decides when stage 2 has heard enough. Done once `quorum` reviews are in,
+    or (with early_settle) once the leader's Borda margin over the runner-up
+    exceeds what the outstanding reviewers could still swing.
+    """
+
+    def __init__(self, candidates: int, reviewers: int, quorum: int, early_settle: bool):
+        self.candidates = candidates
+        self.reviewers = reviewers
+        self.quorum = quorum
+        self.early_settle = early_settle
+        self.received = 0
+        self.borda = [0] * candidates
+
+    def add(self, ranked: List[Tuple[int, int]]):
+        self.received += 1
+        for candidate, rank in ranked:
+            self.borda[candidate] += self.candidates - rank
+
+    def settled(self) -> bool:
+        if self.received >= self.quorum:
+            return True
+        if not self.early_settle or self.candidates < 2:
+            return False
+        leader, runner_up = sorted(self.borda, reverse=True)[:2]
+        outstanding = self.reviewers - self.received
+        return leader - runner_up > outstanding * (self.candidates - 1)
+
+async def run_stage2(provider, question: str, responses: List[Stage1Response], reviewers: List[str]) -> Tuple[List[Stage2Review], List[MemberFailure], List[str]]:
+    """
+    Every reviewer gets its own shuffled, anonymized prompt, all in parallel.
+    Rankings are parsed as reviews arrive and stage 2 ends as soon as the
+    quorum is met or the winner can no longer change; reviewers still running
+    then are cancelled and returned as skipped.
+    """
+    settings = get_settings()
+    timeout = settings.council_member_timeout
+    hedge_after = settings.council_hedge_after
+    quorum = ReviewQuorum(
+        candidates=len(responses),
+        reviewers=len(reviewers),
+        quorum=max(1, math.ceil(settings.council_review_quorum * len(reviewers))),
+        early_settle=settings.council_review_early_settle,
+    )
+    canonical_index = {label_for_index(i): i for i in range(len(responses))}
+
+    tasks = {}
+    for reviewer in reviewers:
+        order = reviewer_permutation(reviewer, question, len(responses))
+        local_to_canonical = {label_for_index(pos): label_for_index(i) for pos, i in enumerate(order)}
+        prompt = build_review_prompt(question, [responses[i] for i in order])
+        task = asyncio.create_task(call_member(provider, reviewer, prompt, timeout, hedge_after))
+        tasks[task] = (reviewer, local_to_canonical)
+
+    reviews = []
+    failures = []
+    pending = set(tasks)
+    try:
+        while pending and not quorum.settled():
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                reviewer, local_to_canonical = tasks[task]
+                if task.exception() is not None:
+                    failures.append(MemberFailure(model=reviewer, stage=2, error=str(task.exception())))
+                    quorum.reviewers -= 1
+                    continue
+                review = relabel_review(task.result(), local_to_canonical)
+                reviews.append(Stage2Review(model=reviewer, review=review))
+                quorum.add([
+                    (canonical_index[label], rank)
+                    for label, rank in parse_ranked_labels(review)
+                    if label in canonical_index
+                ])
+    finally:
+        for task in pending:
+            task.cancel()
+
+    skipped = [tasks[task][0] for task in pending]
+    return reviews, failures, skipped
+
+async def run_council(request: CouncilRunRequest, provider=None) -> CouncilRunResponse:
+    """
+    Full council round on the server: stage 1 fan-out, stage 2 peer review by
+    the members that answered, then the chairman synthesis. Wall time is the
+    slowest member per stage rather than the sum of all latencies.
+    """
+    provider = provider or get_council_provider()
+    timings = {}
+
+    started = time.perf_counter()
+    stage1_responses, failures = await run_stage1(provider, request.question, request.models)
+    timings["stage1"] = round(time.perf_counter() - started, 3)
+    if not stage1_responses:
+        raise ProviderError("No council member produced a stage 1 response")
+
+    started = time.perf_counter()
+    reviewers = [r.model for r in stage1_responses]
+    stage2_reviews, stage2_failures, skipped_reviewers = await run_stage2(provider, request.question, stage1_responses, reviewers)
+    failures.extend(stage2_failures)
+    timings["stage2"] = round(time.perf_counter() - started, 3)
+
+    synthesis_request = SynthesisRequest(
+        id=request.id,
+        question=request.question,
+        stage1_responses=stage1_responses,
+        stage2_reviews=stage2_reviews,
+    )
+    started = time.perf_counter()
+    result = await synthesize_answer(synthesis_request)
+    timings["stage3"] = round(time.perf_counter() - started, 3)
+
+    return CouncilRunResponse(
+        id=request.id,
+        question=request.question,
+        stage1_responses=stage1_responses,
+        stage2_reviews=stage2_reviews,
+        result=result,
+        failures=failures,
+        skipped_reviewers=skipped_reviewers,
+        timings=timings,
+    )
@@ -1,230 +1,117 @@
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-from models import SynthesisResponse, AggregateRanking
-import re
-from typing import List, Dict
-
-load_dotenv()
-
-API_KEY = os.getenv("GEMINI_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
-
-def get_model():
-    model_name = os.getenv("GEMINI_MODEL", "gemini-3-pro-preview")
-    return genai.GenerativeModel(model_name)
-
-def parse_rankings(reviews: List[Dict[str, str]]) -> List[AggregateRanking]:
+import time
+from models import SynthesisResponse, AggregateRanking, RankingStatistics
+from typing import List, AsyncIterator, Optional, Tuple
+
+from services.http_client import upstream_slot
+from services.prompt_builder import build_chairman_prompt, prompt_stats
+from services.chairman_providers import UpstreamError, get_chairman
+from settings import get_settings
+from tracing import span, observe_stage
+from metrics import PROMPT_TOKENS, UPSTREAM_IN_FLIGHT, UPSTREAM_RESULTS, ANSWER_BYTES
+from synthesis_cache import synthesis_cache, make_key
+from utils import calculate_ranking_report
+
+def build_prompt(request_data) -> str:
     """
-    Parses the 'FINAL RANKING:' section from each review and calculates aggregate scores.
-    Scoring: 1st place = 1 point, 2nd = 2 points, etc. Lower is better.
+    Chairman prompt, shrunk to CHAIRMAN_PROMPT_TOKEN_BUDGET (estimated tokens,
+    0 = unlimited) with CHAIRMAN_PROMPT_POLICY when it is too large. Only the
+    size is logged, never the prompt itself.
     """
-    model_scores = {} # model -> list of ranks
-    
-    for review_item in reviews:
-        review_text = review_item.review
-        # Look for the ranking section
-        match = re.search(r"FINAL RANKING:(.*)", review_text, re.DOTALL | re.IGNORECASE)
-        if match:
-            ranking_text = match.group(1)
-            # Parse lines like "1. Response A" or "1. ChatGPT"
-            # We need to map "Response A" back to the model name if anonymized.
-            # But wait, the Stage 2 prompt uses "Response A", "Response B".
-            # The backend receives the reviews. The reviews themselves will contain "Response A", etc.
-            # We need to know which model corresponds to "Response A".
-            # The frontend generates A, B, C based on the order of stage1_responses.
-            # We assume stage1_responses order is preserved.
-            
-            # This is tricky. The backend needs to know the mapping.
-            # The current API request `SynthesisRequest` has `stage1_responses` list.
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-from models import SynthesisResponse, AggregateRanking
-import re
-from typing import List, Dict
-
-import httpx
-import json
-
-load_dotenv()
-
-API_KEY = os.getenv("GEMINI_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
-
-def get_model():
-    model_name = os.getenv("GEMINI_MODEL", "gemini-3-pro-preview")
-    return genai.GenerativeModel(model_name)
-
-def parse_rankings(reviews: List[Dict[str, str]]) -> List[AggregateRanking]:
+    settings = get_settings()
+    with span("prompt_build"):
+        prompt = build_chairman_prompt(
+            request_data,
+            budget_tokens=settings.chairman_prompt_token_budget,
+            policy=settings.chairman_prompt_policy,
+        )
+    prompt_stats.record(prompt)
+    PROMPT_TOKENS.observe(prompt.estimated_tokens)
+    if prompt.policy:
+        print(f"Chairman prompt: {len(prompt.text)} chars, ~{prompt.estimated_tokens} tokens "
+              f"({prompt.policy} from ~{prompt.original_tokens}, budget {prompt.budget_tokens})")
+    else:
+        print(f"Chairman prompt: {len(prompt.text)} chars, ~{prompt.estimated_tokens} tokens")
+    return prompt.text
+
+def compute_ranking_report(request_data) -> Tuple[List[AggregateRanking], Optional[RankingStatistics]]:
     """
-    Parses the 'FINAL RANKING:' section from each review and calculates aggregate scores.
-    Scoring: 1st place = 1 point, 2nd = 2 points, etc. Lower is better.
+    Maps each review's FINAL RANKING back to model names (Response A -> first
+    stage 1 model, ...) and aggregates them (mean rank, Borda, Copeland,
+    Kemeny, bootstrap intervals, Kendall's W). Needs no model call, so it can
+    be sent to the client before the synthesis starts.
     """
-    model_scores = {} # model -> list of ranks
-    
-    for review_item in reviews:
-        review_text = review_item.review
-        # Look for the ranking section
-        match = re.search(r"FINAL RANKING:(.*)", review_text, re.DOTALL | re.IGNORECASE)
-        if match:
-            ranking_text = match.group(1)
-            # Parse lines like "1. Response A" or "1. ChatGPT"
-            # We need to map "Response A" back to the model name if anonymized.
-            # But wait, the Stage 2 prompt uses "Response A", "Response B".
-            # The backend receives the reviews. The reviews themselves will contain "Response A", etc.
-            # We need to know which model corresponds to "Response A".
-            # The frontend generates A, B, C based on the order of stage1_responses.
-            # We assume stage1_responses order is preserved.
-            
-            # This is tricky. The backend needs to know the mapping.
-            # The current API request `SynthesisRequest` has `stage1_responses` list.
-            # We can reconstruct the mapping: Index 0 -> A, Index 1 -> B...
-            pass
-
-    # Actually, let's do the parsing in the main synthesis logic where we have all data.
-    return []
-
-async def synthesize_answer(request_data) -> SynthesisResponse:
-    # 1. Construct the prompt (Same as before)
-    question = request_data.question
-    responses = request_data.stage1_responses
-    reviews = request_data.stage2_reviews
-
-    prompt_text = f"""You are the Chairman of an LLM Council. Multiple AI models have provided responses to a user's question, and then ranked each other's responses.
-
-Original Question: {question}
-
-STAGE 1 - Individual Responses:
-"""
-    
-    letter_to_model = {}
-    for i, r in enumerate(responses):
-        letter = chr(65 + i) # A, B, C...
-        letter_to_model[f"Response {letter}"] = r.model
-        prompt_text += f"\nModel: {r.model}\nResponse: {r.response}\n"
-
-    prompt_text += "\nSTAGE 2 - Peer Rankings:\n"
-    
-    for r in reviews:
-        prompt_text += f"\nModel: {r.model}\nRanking: {r.review}\n"
-
-    prompt_text += """
-Your task as Chairman is to synthesize all of this information into a single, comprehensive, accurate answer to the user's original question. Consider:
-- The individual responses and their insights
-- The peer rankings and what they reveal about response quality
-- Any patterns of agreement or disagreement
-
-Provide a clear, well-reasoned final answer that represents the council's collective wisdom:
-"""
-
-    print("Prompt:", prompt_text)
-    # 2. Call Custom REST API
-    custom_key = os.getenv("GEMINI_CUSTOM_KEY")
-    endpoint = os.getenv("GEMINI_CUSTOM_ENDPOINT")
-    
-    if not custom_key or not endpoint:
-        return SynthesisResponse(final_answer="Error: Missing GEMINI_CUSTOM_KEY or GEMINI_CUSTOM_ENDPOINT", aggregate_rankings=[])
-
-    url = f"{endpoint}?key={custom_key}"
-    
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [
-                    {
-                        "text": prompt_text
-                    }
-                ]
-            }
-        ],
-        "generationConfig": {
-            "temperature": 1,
-            "maxOutputTokens": 65535,
-            "topP": 0.95,
-            "thinkingConfig": {
-                "thinkingLevel": "HIGH"
-            }
-        },
-        "safetySettings": [
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "OFF"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "OFF"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "OFF"},
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "OFF"}
-        ],
-        "tools": [
-            {
-                "googleSearch": {}
-            }
-        ]
-    }
+    aggregates, stats = calculate_ranking_report(
+        [r.dict() for r in request_data.stage1_responses],
+        [r.dict() for r in request_data.stage2_reviews],
+    )
+    ranking_stats = RankingStatistics(**stats) if stats else None
+    return [AggregateRanking(**a) for a in aggregates], ranking_stats
 
-    final_answer = ""
+def synthesis_cache_key(request_data) -> str:
+    """
+    Content hash of everything that influences the chairman's answer: the
+    normalized council input plus the provider, model and generation config.
+    The conversation id is deliberately excluded.
+    """
+    settings = get_settings()
+    return make_key({
+        "question": request_data.question.strip(),
+        "stage1": [[r.model, r.response.strip()] for r in request_data.stage1_responses],
+        "stage2": [[r.model, r.review.strip()] for r in request_data.stage2_reviews],
+        "chairman": get_chairman().cache_identity(),
+        "prompt_budget": settings.chairman_prompt_token_budget,
+        "prompt_policy": settings.chairman_prompt_policy,
+    })
+
+async def stream_final_answer(prompt_text: str) -> AsyncIterator[str]:
+    """
+    Streams the chairman's answer from the configured provider (or fallback
+    chain), yielding each text delta as soon as it arrives. Raises
+    UpstreamError on configuration problems, non-200 responses or transport
+    failures.
+    """
+    started = time.perf_counter()
+    first_chunk = True
+    answer_bytes = 0
+    outcome = "error"
+    UPSTREAM_IN_FLIGHT.inc()
     try:
-        async with httpx.AsyncClient() as client:
-            # Increased timeout for thinking models
-            response = await client.post(url, json=payload, timeout=300.0)
-            
-            if response.status_code != 200:
-                final_answer = f"Error {response.status_code}: {response.text}"
-            else:
-                # Parse streaming response
-                # The response is a JSON array of chunks if streamGenerateContent is used, 
-                # but httpx.post returns the full body if we don't use stream=True.
-                # However, the endpoint returns a list of JSON objects (like `[{...}, {...}]`).
-                data = response.json()
-                
-                # Aggregate text from all chunks
-                for chunk in data:
-                    if "candidates" in chunk:
-                        for candidate in chunk["candidates"]:
-                            if "content" in candidate and "parts" in candidate["content"]:
-                                for part in candidate["content"]["parts"]:
-                                    if "text" in part:
-                                        final_answer += part["text"]
+        # Timed by hand: a span context can't stay current across the yields
+        async for delta in get_chairman().stream(prompt_text):
+            if first_chunk:
+                first_chunk = False
+                observe_stage("upstream_first_chunk", time.perf_counter() - started)
+            answer_bytes += len(delta.encode("utf-8"))
+            yield delta
+        outcome = "ok"
+        observe_stage("upstream_total", time.perf_counter() - started)
+    except GeneratorExit:
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+        UPSTREAM_RESULTS.labels(outcome).inc()
+        if outcome == "ok":
+            ANSWER_BYTES.observe(answer_bytes)
 
-    except Exception as e:
-        final_answer = f"Error calling API: {str(e)}"
+async def synthesize_answer(request_data) -> SynthesisResponse:
+    prompt_text = build_prompt(request_data)
+    aggregate_rankings, ranking_stats = compute_ranking_report(request_data)
 
-    # 3. Calculate Rankings (Same as before)
-    model_ranks = {} 
-    
-    for review in reviews:
-        text = review.review
-        match = re.search(r"FINAL RANKING:(.*)", text, re.DOTALL | re.IGNORECASE)
-        if match:
-            ranking_lines = match.group(1).strip().split('\n')
-            for line in ranking_lines:
-                line = line.strip()
-                rank_match = re.match(r"(\d+)\.\s*(Response [A-Z])", line, re.IGNORECASE)
-                if rank_match:
-                    rank = int(rank_match.group(1))
-                    label = rank_match.group(2)
-                    label_key = label.title() 
-                    
-                    if label_key in letter_to_model:
-                        target_model = letter_to_model[label_key]
-                        if target_model not in model_ranks:
-                            model_ranks[target_model] = []
-                        model_ranks[target_model].append(rank)
+    async def generate() -> str:
+        answer = ""
+        # Raises UpstreamBusyError when the concurrency budget is used up
+        async with upstream_slot():
+            async for delta in stream_final_answer(prompt_text):
+                answer += delta
+        return answer
 
-    # Compute aggregates
-    aggregate_rankings = []
-    for m_name, ranks in model_ranks.items():
-        avg = sum(ranks) / len(ranks)
-        aggregate_rankings.append(AggregateRanking(
-            model=m_name,
-            avg_rank=round(avg, 2),
-            votes=len(ranks)
-        ))
-    
-    # Sort by avg_rank (ascending)
-    aggregate_rankings.sort(key=lambda x: x.avg_rank)
+    # Identical councils reuse a cached answer or join the in-flight call.
+    # UpstreamError propagates: a failure is never returned (or cached) as an answer
+    final_answer = await synthesis_cache.get_or_compute(synthesis_cache_key(request_data), generate)
 
     return SynthesisResponse(
         final_answer=final_answer,
-        aggregate_rankings=aggregate_rankings
+        aggregate_rankings=aggregate_rankings,
+        ranking_stats=ranking_stats
     )
@@ -0,0 +1,108 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from settings import get_settings
+
+class UpstreamBusyError(Exception):
+    """Raised when the upstream concurrency budget is used up."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Upstream model capacity exhausted, please retry shortly")
+        self.retry_after = retry_after
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+def _http2_enabled() -> bool:
+    if not get_settings().upstream_http2:
+        return False
+    try:
+        import h2  # noqa: F401 - httpx needs it for HTTP/2
+    except ImportError:
+        print("UPSTREAM_HTTP2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+def _create_client() -> httpx.AsyncClient:
+    settings = get_settings()
+    limits = httpx.Limits(
+        max_connections=settings.upstream_max_connections,
+        max_keepalive_connections=settings.upstream_max_keepalive,
+        keepalive_expiry=settings.upstream_keepalive_expiry,
+    )
+    # Thinking models can take minutes; only the connect phase should fail fast
+    timeout = httpx.Timeout(300.0, connect=10.0)
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=_http2_enabled())
+
+def _create_semaphore() -> asyncio.Semaphore:
+    return asyncio.Semaphore(get_settings().upstream_max_concurrency)
+
+async def start_client():
+    global _client, _semaphore
+    if _client is None:
+        _client = _create_client()
+    _semaphore = _create_semaphore()
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the app-lifetime client. Outside the FastAPI lifespan (scripts,
+    CLI tools) a client is created on first use.
+    """
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+class UpstreamSlot:
+    """A held unit of upstream concurrency. release() is idempotent."""
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self._semaphore = semaphore
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._semaphore.release()
+
+async def acquire_slot() -> UpstreamSlot:
+    """
+    Waits at most UPSTREAM_QUEUE_TIMEOUT seconds for a free upstream slot and
+    raises UpstreamBusyError otherwise, so callers can answer 503 quickly
+    instead of piling up more long-running requests.
+    """
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = _create_semaphore()
+    settings = get_settings()
+    slot = None
+    try:
+        # Runs acquire() in this task, unlike wait_for(), so a timeout can't
+        # land after the permit was taken by a task nobody waits for
+        async with asyncio.timeout(settings.upstream_queue_timeout):
+            await _semaphore.acquire()
+            slot = UpstreamSlot(_semaphore)
+    except (TimeoutError, asyncio.CancelledError) as e:
+        # A permit taken just as the timeout or a cancel arrived goes straight back
+        if slot is not None:
+            slot.release()
+        if isinstance(e, TimeoutError):
+            raise UpstreamBusyError(retry_after=settings.upstream_retry_after) from None
+        raise
+    return slot
+
+@asynccontextmanager
+async def upstream_slot():
+    slot = await acquire_slot()
+    try:
+        yield slot
+    finally:
+        slot.release()
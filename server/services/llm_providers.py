@@ -0,0 +1,100 @@
+import re
+import random
+import asyncio
+import hashlib
+from typing import Dict, Optional
+
+from settings import get_settings
+from services.http_client import get_client
+
+class ProviderError(Exception):
+    """Raised when a council member's model call fails."""
+    pass
+
+class OpenAICompatibleProvider:
+    """
+    Council member calls through any OpenAI-compatible /chat/completions API
+    (OpenRouter, vLLM, LiteLLM, ...). Display names such as "ChatGPT" are
+    mapped to provider model ids with COUNCIL_MODEL_MAP.
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str], model_map: Dict[str, str]):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model_map = model_map
+
+    async def complete(self, model: str, prompt: str) -> str:
+        headers = {}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {
+            "model": self.model_map.get(model, model),
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        try:
+            response = await get_client().post(f"{self.base_url}/chat/completions", json=payload, headers=headers)
+        except Exception as e:
+            raise ProviderError(f"{model}: {e}") from e
+        if response.status_code != 200:
+            raise ProviderError(f"{model}: Error {response.status_code}: {response.text}")
+        try:
+            return response.json()["choices"][0]["message"]["content"] or ""
+        except (KeyError, IndexError, ValueError) as e:
+            raise ProviderError(f"{model}: unexpected response format") from e
+
+class MockProvider:
+    """
+    Deterministic in-process stand-in for council members, for local runs and
+    load tests. Output and latency depend only on (model, prompt, seed).
+    Review prompts get a well-formed FINAL RANKING over the labels they contain.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.5,
+        failure_rate: float = 0.0,
+        slow_models: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.slow_models = slow_models or {}
+        self.seed = seed
+
+    def _rng(self, model: str, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{model}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    async def complete(self, model: str, prompt: str) -> str:
+        rng = self._rng(model, prompt)
+        delay = self.latency * (1 + self.jitter * rng.random()) + self.slow_models.get(model, 0.0)
+        await asyncio.sleep(delay)
+        if rng.random() < self.failure_rate:
+            raise ProviderError(f"{model}: simulated failure")
+
+        labels = re.findall(r"^(Response [A-Z]+):", prompt, re.MULTILINE)
+        if labels:
+            rng.shuffle(labels)
+            ranking = "\n".join(f"{i + 1}. {label}" for i, label in enumerate(labels))
+            return f"{model} reviewed {len(labels)} responses.\n\nFINAL RANKING:\n{ranking}"
+        return f"{model} answer #{rng.randint(0, 9999)}: this is a simulated response."
+
+def get_council_provider():
+    """COUNCIL_PROVIDER=openai (default) or mock."""
+    settings = get_settings()
+    kind = settings.council_provider
+    if kind == "mock":
+        return MockProvider(
+            latency=settings.council_mock_latency,
+            failure_rate=settings.council_mock_failure_rate,
+            slow_models=settings.council_mock_slow_models,
+        )
+    if kind == "openai":
+        return OpenAICompatibleProvider(
+            base_url=settings.council_api_base,
+            api_key=settings.council_api_key,
+            model_map=settings.council_model_map,
+        )
+    raise ValueError(f"Unknown COUNCIL_PROVIDER: {kind}")
@@ -0,0 +1,232 @@
+import re
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Rough heuristic for English text with Gemini/GPT style tokenizers
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = "\n[... truncated to fit the prompt budget ...]"
+OMISSION_MARKER = "\n[... passages omitted ...]"
+POLICIES = ("truncate", "extract", "dedupe")
+
+HEADER = """You are the Chairman of an LLM Council. Multiple AI models have provided responses to a user's question, and then ranked each other's responses.
+
+Original Question: {question}
+
+STAGE 1 - Individual Responses:
+"""
+
+STAGE2_HEADER = "\nSTAGE 2 - Peer Rankings:\n"
+
+FOOTER = """
+Your task as Chairman is to synthesize all of this information into a single, comprehensive, accurate answer to the user's original question. Consider:
+- The individual responses and their insights
+- The peer rankings and what they reveal about response quality
+- Any patterns of agreement or disagreement
+
+Provide a clear, well-reasoned final answer that represents the council's collective wisdom:
+"""
+
+_WORD_RE = re.compile(r"\w+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+@dataclass
+class ChairmanPrompt:
+    text: str
+    estimated_tokens: int
+    budget_tokens: Optional[int]
+    policy: Optional[str] = None # policy applied, None when the prompt fit as-is
+    original_tokens: int = 0
+    notes: List[str] = field(default_factory=list)
+
+def _fair_shares(lengths: List[int], available: int) -> List[int]:
+    """
+    Water-filling split of `available` characters: entries shorter than an
+    equal share keep their full length and the rest is shared by the others.
+    """
+    shares = [0] * len(lengths)
+    remaining = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    budget = max(0, available)
+    while remaining:
+        share = budget // len(remaining)
+        i = remaining[0]
+        if lengths[i] <= share:
+            shares[i] = lengths[i]
+            budget -= lengths[i]
+            remaining.pop(0)
+        else:
+            for j in remaining:
+                shares[j] = share
+            break
+    return shares
+
+def _truncate(text: str, limit: int) -> str:
+    """Cuts `text` to at most `limit` characters, marker included."""
+    if len(text) <= limit:
+        return text
+    if limit <= len(TRUNCATION_MARKER):
+        return text[:max(0, limit)]
+    return text[:limit - len(TRUNCATION_MARKER)] + TRUNCATION_MARKER
+
+def _split_ranking(review: str):
+    """Splits a review into (body, FINAL RANKING section); the ranking is never cut."""
+    index = review.upper().rfind("FINAL RANKING:")
+    if index < 0:
+        return review, ""
+    return review[:index], review[index:]
+
+def _extract_key_passages(text: str, question_words: set, limit: int) -> str:
+    """
+    Keeps the paragraphs that overlap most with the question (the first
+    paragraph gets a bonus, it usually holds the direct answer), in their
+    original order, until `limit` characters (marker included) are used.
+    """
+    if len(text) <= limit:
+        return text
+    room = limit - len(OMISSION_MARKER)
+    paragraphs = [p for p in _PARAGRAPH_RE.split(text) if p.strip()]
+    scored = []
+    for position, paragraph in enumerate(paragraphs):
+        words = {w.lower() for w in _WORD_RE.findall(paragraph)}
+        overlap = len(words & question_words) / (1 + math.log1p(len(words)))
+        scored.append((overlap + (1.0 if position == 0 else 0.0), position))
+    chosen = set()
+    used = 0
+    for _, position in sorted(scored, reverse=True):
+        size = len(paragraphs[position]) + 2
+        if used + size > room:
+            continue
+        chosen.add(position)
+        used += size
+    if not chosen:
+        return _truncate(text, limit)
+    kept = "\n\n".join(paragraphs[i] for i in sorted(chosen))
+    return kept + (OMISSION_MARKER if len(chosen) < len(paragraphs) else "")
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def _dedupe(responses: List[Dict[str, str]], threshold: float, notes: List[str]) -> List[Dict[str, str]]:
+    """Replaces responses that are near-copies (shingle Jaccard >= threshold) of an earlier one."""
+    kept = []
+    signatures = []
+    for r in responses:
+        signature = _shingles(r["response"])
+        duplicate_of = None
+        for other, other_signature in zip(kept, signatures):
+            union = signature | other_signature
+            if union and len(signature & other_signature) / len(union) >= threshold:
+                duplicate_of = other["model"]
+                break
+        if duplicate_of:
+            notes.append(f"{r['model']} deduplicated against {duplicate_of}")
+            r = {**r, "response": f"(Near-identical to the response from {duplicate_of}.)"}
+        else:
+            signatures.append(signature)
+        kept.append(r)
+    return kept
+
+def _assemble(question: str, responses: List[Dict[str, str]], reviews: List[Dict[str, str]]) -> str:
+    parts = [HEADER.format(question=question)]
+    for r in responses:
+        parts.append(f"\nModel: {r['model']}\nResponse: {r['response']}\n")
+    parts.append(STAGE2_HEADER)
+    for r in reviews:
+        parts.append(f"\nModel: {r['model']}\nRanking: {r['review']}\n")
+    parts.append(FOOTER)
+    return "".join(parts)
+
+def _fit(question: str, responses, reviews, budget_chars: int, policy: str) -> tuple:
+    """Shrinks responses and review bodies so the assembled prompt fits `budget_chars`."""
+    fixed = len(_assemble(question, [{**r, "response": ""} for r in responses], [{**r, "review": ""} for r in reviews]))
+    review_parts = [_split_ranking(r["review"]) for r in reviews]
+    # FINAL RANKING sections are always kept in full
+    fixed += sum(len(ranking) for _, ranking in review_parts)
+
+    bodies = [r["response"] for r in responses] + [body for body, _ in review_parts]
+    shares = _fair_shares([len(b) for b in bodies], budget_chars - fixed)
+    question_words = {w.lower() for w in _WORD_RE.findall(question)}
+    if policy == "extract":
+        fitted = [_extract_key_passages(b, question_words, s) for b, s in zip(bodies, shares)]
+    else:
+        fitted = [_truncate(b, s) for b, s in zip(bodies, shares)]
+
+    n = len(responses)
+    responses = [{**r, "response": fitted[i]} for i, r in enumerate(responses)]
+    reviews = [{**r, "review": fitted[n + i] + review_parts[i][1]} for i, r in enumerate(reviews)]
+    return responses, reviews
+
+def build_chairman_prompt(
+    request_data,
+    budget_tokens: Optional[int] = None,
+    policy: Optional[str] = None,
+    dedupe_threshold: float = 0.9,
+) -> ChairmanPrompt:
+    """
+    Assembles the chairman prompt in one join and, when it exceeds
+    `budget_tokens`, applies `policy`:
+      truncate - cut every response/review body to a fair share of the budget
+      extract  - keep the paragraphs most relevant to the question instead
+      dedupe   - collapse near-identical responses, then truncate if still too big
+    Rankings in reviews are always kept.
+    """
+    policy = policy or "truncate"
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown prompt policy: {policy}")
+    question = request_data.question
+    responses = [{"model": r.model, "response": r.response} for r in request_data.stage1_responses]
+    reviews = [{"model": r.model, "review": r.review} for r in request_data.stage2_reviews]
+
+    text = _assemble(question, responses, reviews)
+    original_tokens = estimate_tokens(text)
+    if not budget_tokens or original_tokens <= budget_tokens:
+        return ChairmanPrompt(text, original_tokens, budget_tokens, None, original_tokens)
+
+    notes = []
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    if policy == "dedupe":
+        responses = _dedupe(responses, dedupe_threshold, notes)
+        text = _assemble(question, responses, reviews)
+    if len(text) > budget_chars:
+        responses, reviews = _fit(question, responses, reviews, budget_chars, "extract" if policy == "extract" else "truncate")
+        text = _assemble(question, responses, reviews)
+    return ChairmanPrompt(text, estimate_tokens(text), budget_tokens, policy, original_tokens, notes)
+
+class PromptStats:
+    """Running size metrics of the prompts sent to the chairman."""
+
+    def __init__(self):
+        self.prompts = 0
+        self.over_budget = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last_tokens = 0
+        self.last_chars = 0
+        self.tokens_saved = 0
+
+    def record(self, prompt: ChairmanPrompt):
+        self.prompts += 1
+        self.total_tokens += prompt.estimated_tokens
+        self.max_tokens = max(self.max_tokens, prompt.estimated_tokens)
+        self.last_tokens = prompt.estimated_tokens
+        self.last_chars = len(prompt.text)
+        if prompt.policy:
+            self.over_budget += 1
+            self.tokens_saved += prompt.original_tokens - prompt.estimated_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prompts": self.prompts,
+            "over_budget": self.over_budget,
+            "avg_tokens": round(self.total_tokens / self.prompts, 1) if self.prompts else 0,
+            "max_tokens": self.max_tokens,
+            "last_tokens": self.last_tokens,
+            "last_chars": self.last_chars,
+            "tokens_saved": self.tokens_saved,
+        }
+
+prompt_stats = PromptStats()
@@ -0,0 +1,159 @@
+import time
+import random
+import asyncio
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds; accepts both delta-seconds and an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter. A server's Retry-After is a lower
+    bound; when it asks for more than max_delay we give up instead of
+    retrying early.
+    """
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0, rng: Optional[random.Random] = None):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Seconds to wait after failed attempt number `attempt` (0-based), or
+        None when the server's Retry-After is longer than max_delay.
+        """
+        if retry_after is not None and retry_after > self.max_delay:
+            return None
+        backoff = self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            backoff = max(backoff, retry_after)
+        return backoff
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds. Then a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_running = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._trial_running:
+                self.rejected += 1
+                return False
+            self._trial_running = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self._trial_running = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+
+    def release(self):
+        """Ends a call that neither succeeded nor failed (e.g. cancelled by the client)."""
+        self._trial_running = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+class LatencyTracker:
+    """Rolling window of latencies for percentile-based hedging thresholds."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class TokenBucket:
+    """
+    Async rate limiter: `rate` acquisitions per second on average, bursts of
+    up to `burst`. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = max(1.0, burst if burst is not None else rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        # Waiters queue on the lock, so tokens are handed out first come, first served
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
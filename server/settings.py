@@ -0,0 +1,199 @@
+import os
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+def _json(name: str, default: str):
+    return json.loads(os.getenv(name, default))
+
+def _path(name: str, default: str) -> str:
+    # Relative paths are relative to the server directory, wherever uvicorn is started from
+    return os.path.join(SERVER_DIR, os.path.expanduser(os.getenv(name, default)))
+
+@dataclass(frozen=True)
+class Settings:
+    """Server configuration; see .env.example for the variables behind each field."""
+
+    # Chairman
+    gemini_custom_key: Optional[str] = None
+    gemini_custom_endpoint: Optional[str] = None
+    gemini_model: str = "google/gemini-2.0-flash-exp:free"
+    chairman_providers: Tuple[str, ...] = ("gemini",)
+    chairman_fallback_after: float = 20.0
+    chairman_openai_base: str = "https://openrouter.ai/api/v1"
+    chairman_openai_key: Optional[str] = None
+    chairman_openai_model: str = "google/gemini-2.5-flash"
+    chairman_openai_temperature: float = 1.0
+    chairman_prompt_token_budget: int = 0
+    chairman_prompt_policy: str = "truncate"
+    chairman_retry_attempts: int = 3
+    chairman_retry_base_delay: float = 0.5
+    chairman_retry_max_delay: float = 8.0
+    chairman_hedge: bool = False
+    chairman_hedge_after: float = 10.0
+    chairman_breaker_failures: int = 5
+    chairman_breaker_reset: float = 30.0
+
+    # Upstream connection pool and admission control
+    upstream_max_connections: int = 100
+    upstream_max_keepalive: int = 20
+    upstream_keepalive_expiry: float = 60.0
+    upstream_http2: bool = True
+    upstream_max_concurrency: int = 16
+    upstream_queue_timeout: float = 2.0
+    upstream_retry_after: int = 5
+
+    # Synthesis cache
+    synthesis_cache_enabled: bool = True
+    synthesis_cache_ttl: float = 7 * 24 * 3600
+    synthesis_cache_max_entries: int = 256
+    synthesis_cache_max_bytes: int = 64 * 1024 * 1024
+    synthesis_cache_disk_max_entries: int = 4096
+    synthesis_cache_disk_max_bytes: int = 512 * 1024 * 1024
+
+    # HTTP responses
+    response_compression: bool = True
+    response_compression_min_size: int = 1024
+    response_gzip_level: int = 6
+    response_brotli_quality: int = 4
+
+    # Storage
+    storage_backend: str = "sqlite"
+    storage_db_path: str = os.path.join(SERVER_DIR, "data", "conversations.db")
+    storage_segment_path: str = os.path.join(SERVER_DIR, "data", "conversations.seg")
+    storage_segment_compression: str = "auto"
+    persistence_queue_size: int = 1000
+    search_index_path: str = os.path.join(SERVER_DIR, "data", "search_index.db")
+    search_rank_window: int = 1000
+    analytics_db_path: str = os.path.join(SERVER_DIR, "data", "analytics.db")
+    conversation_cache_max_entries: int = 512
+    conversation_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # Batch runs (batch.py, /api/batches)
+    batch_dir: str = os.path.join(SERVER_DIR, "data", "batches")
+    batch_concurrency: int = 4
+    batch_rate: float = 0.0
+
+    # Background synthesis jobs (/api/synthesize/jobs)
+    synthesis_job_workers: int = 4
+    synthesis_job_queue_size: int = 100
+    synthesis_job_ttl: float = 3600.0
+
+    # Server-side councils
+    council_provider: str = "openai"
+    council_api_base: str = "https://openrouter.ai/api/v1"
+    council_api_key: Optional[str] = None
+    council_model_map: Dict[str, str] = field(default_factory=dict)
+    council_member_timeout: float = 120.0
+    council_hedge_after: float = 30.0
+    council_review_quorum: float = 1.0
+    council_review_early_settle: bool = True
+    council_mock_latency: float = 0.05
+    council_mock_failure_rate: float = 0.0
+    council_mock_slow_models: Dict[str, float] = field(default_factory=dict)
+
+    # Observability
+    tracing_enabled: bool = False
+
+    # Rank aggregation
+    ranking_bootstrap_samples: int = 1000
+    ranking_bootstrap_seed: int = 0
+
+def load_settings() -> Settings:
+    """Reads .env and the environment into a Settings object."""
+    load_dotenv()
+    defaults = Settings()
+    council_api_base = os.getenv("COUNCIL_API_BASE", defaults.council_api_base)
+    council_api_key = os.getenv("COUNCIL_API_KEY")
+    providers = tuple(k.strip().lower() for k in os.getenv("CHAIRMAN_PROVIDER", "gemini").split(",") if k.strip())
+    return Settings(
+        gemini_custom_key=os.getenv("GEMINI_CUSTOM_KEY"),
+        gemini_custom_endpoint=os.getenv("GEMINI_CUSTOM_ENDPOINT"),
+        gemini_model=os.getenv("GEMINI_MODEL", defaults.gemini_model),
+        chairman_providers=providers or defaults.chairman_providers,
+        chairman_fallback_after=_float("CHAIRMAN_FALLBACK_AFTER", defaults.chairman_fallback_after),
+        # The chairman can share the council's OpenAI-compatible account
+        chairman_openai_base=os.getenv("CHAIRMAN_OPENAI_BASE", council_api_base),
+        chairman_openai_key=os.getenv("CHAIRMAN_OPENAI_KEY", council_api_key),
+        chairman_openai_model=os.getenv("CHAIRMAN_OPENAI_MODEL", defaults.chairman_openai_model),
+        chairman_openai_temperature=_float("CHAIRMAN_OPENAI_TEMPERATURE", defaults.chairman_openai_temperature),
+        chairman_prompt_token_budget=_int("CHAIRMAN_PROMPT_TOKEN_BUDGET", defaults.chairman_prompt_token_budget),
+        chairman_prompt_policy=os.getenv("CHAIRMAN_PROMPT_POLICY", defaults.chairman_prompt_policy),
+        chairman_retry_attempts=_int("CHAIRMAN_RETRY_ATTEMPTS", defaults.chairman_retry_attempts),
+        chairman_retry_base_delay=_float("CHAIRMAN_RETRY_BASE_DELAY", defaults.chairman_retry_base_delay),
+        chairman_retry_max_delay=_float("CHAIRMAN_RETRY_MAX_DELAY", defaults.chairman_retry_max_delay),
+        chairman_hedge=_bool("CHAIRMAN_HEDGE", "false"),
+        chairman_hedge_after=_float("CHAIRMAN_HEDGE_AFTER", defaults.chairman_hedge_after),
+        chairman_breaker_failures=_int("CHAIRMAN_BREAKER_FAILURES", defaults.chairman_breaker_failures),
+        chairman_breaker_reset=_float("CHAIRMAN_BREAKER_RESET", defaults.chairman_breaker_reset),
+        upstream_max_connections=_int("UPSTREAM_MAX_CONNECTIONS", defaults.upstream_max_connections),
+        upstream_max_keepalive=_int("UPSTREAM_MAX_KEEPALIVE", defaults.upstream_max_keepalive),
+        upstream_keepalive_expiry=_float("UPSTREAM_KEEPALIVE_EXPIRY", defaults.upstream_keepalive_expiry),
+        upstream_http2=_bool("UPSTREAM_HTTP2", "true"),
+        upstream_max_concurrency=_int("UPSTREAM_MAX_CONCURRENCY", defaults.upstream_max_concurrency),
+        upstream_queue_timeout=_float("UPSTREAM_QUEUE_TIMEOUT", defaults.upstream_queue_timeout),
+        upstream_retry_after=_int("UPSTREAM_RETRY_AFTER", defaults.upstream_retry_after),
+        synthesis_cache_enabled=_bool("SYNTHESIS_CACHE_ENABLED", "true"),
+        synthesis_cache_ttl=_float("SYNTHESIS_CACHE_TTL", defaults.synthesis_cache_ttl),
+        synthesis_cache_max_entries=_int("SYNTHESIS_CACHE_MAX_ENTRIES", defaults.synthesis_cache_max_entries),
+        synthesis_cache_max_bytes=_int("SYNTHESIS_CACHE_MAX_BYTES", defaults.synthesis_cache_max_bytes),
+        synthesis_cache_disk_max_entries=_int("SYNTHESIS_CACHE_DISK_MAX_ENTRIES", defaults.synthesis_cache_disk_max_entries),
+        synthesis_cache_disk_max_bytes=_int("SYNTHESIS_CACHE_DISK_MAX_BYTES", defaults.synthesis_cache_disk_max_bytes),
+        response_compression=_bool("RESPONSE_COMPRESSION", "true"),
+        response_compression_min_size=_int("RESPONSE_COMPRESSION_MIN_SIZE", defaults.response_compression_min_size),
+        response_gzip_level=_int("RESPONSE_GZIP_LEVEL", defaults.response_gzip_level),
+        response_brotli_quality=_int("RESPONSE_BROTLI_QUALITY", defaults.response_brotli_quality),
+        storage_backend=os.getenv("STORAGE_BACKEND", defaults.storage_backend).lower(),
+        storage_db_path=_path("STORAGE_DB_PATH", defaults.storage_db_path),
+        storage_segment_path=_path("STORAGE_SEGMENT_PATH", defaults.storage_segment_path),
+        storage_segment_compression=os.getenv("STORAGE_SEGMENT_COMPRESSION", defaults.storage_segment_compression).lower(),
+        persistence_queue_size=_int("PERSISTENCE_QUEUE_SIZE", defaults.persistence_queue_size),
+        search_index_path=_path("SEARCH_INDEX_PATH", defaults.search_index_path),
+        search_rank_window=_int("SEARCH_RANK_WINDOW", defaults.search_rank_window),
+        analytics_db_path=_path("ANALYTICS_DB_PATH", defaults.analytics_db_path),
+        conversation_cache_max_entries=_int("CONVERSATION_CACHE_MAX_ENTRIES", defaults.conversation_cache_max_entries),
+        conversation_cache_max_bytes=_int("CONVERSATION_CACHE_MAX_BYTES", defaults.conversation_cache_max_bytes),
+        batch_dir=_path("BATCH_DIR", defaults.batch_dir),
+        batch_concurrency=_int("BATCH_CONCURRENCY", defaults.batch_concurrency),
+        batch_rate=_float("BATCH_RATE", defaults.batch_rate),
+        synthesis_job_workers=_int("SYNTHESIS_JOB_WORKERS", defaults.synthesis_job_workers),
+        synthesis_job_queue_size=_int("SYNTHESIS_JOB_QUEUE_SIZE", defaults.synthesis_job_queue_size),
+        synthesis_job_ttl=_float("SYNTHESIS_JOB_TTL", defaults.synthesis_job_ttl),
+        council_provider=os.getenv("COUNCIL_PROVIDER", defaults.council_provider).lower(),
+        council_api_base=council_api_base,
+        council_api_key=council_api_key,
+        council_model_map=_json("COUNCIL_MODEL_MAP", "{}"),
+        council_member_timeout=_float("COUNCIL_MEMBER_TIMEOUT", defaults.council_member_timeout),
+        council_hedge_after=_float("COUNCIL_HEDGE_AFTER", defaults.council_hedge_after),
+        council_review_quorum=_float("COUNCIL_REVIEW_QUORUM", defaults.council_review_quorum),
+        council_review_early_settle=_bool("COUNCIL_REVIEW_EARLY_SETTLE", "true"),
+        council_mock_latency=_float("COUNCIL_MOCK_LATENCY", defaults.council_mock_latency),
+        council_mock_failure_rate=_float("COUNCIL_MOCK_FAILURE_RATE", defaults.council_mock_failure_rate),
+        council_mock_slow_models=_json("COUNCIL_MOCK_SLOW_MODELS", "{}"),
+        tracing_enabled=_bool("TRACING_ENABLED", "false"),
+        ranking_bootstrap_samples=_int("RANKING_BOOTSTRAP_SAMPLES", defaults.ranking_bootstrap_samples),
+        ranking_bootstrap_seed=_int("RANKING_BOOTSTRAP_SEED", defaults.ranking_bootstrap_seed),
+    )
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Settings are read once per process; scripts that change the environment call reload_settings()."""
+    return load_settings()
+
+def reload_settings() -> Settings:
+    get_settings.cache_clear()
+    return get_settings()
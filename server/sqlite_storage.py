@@ -0,0 +1,224 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+
+from storage_concurrency import check_version
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_created_at
+    ON conversations (created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS conversation_payloads (
+    id TEXT PRIMARY KEY REFERENCES conversations (id) ON DELETE CASCADE,
+    messages TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS storage_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+# Written together with the schema of a new database, so a crash can't leave one without it
+IMPORT_PENDING = "INSERT OR IGNORE INTO storage_meta (key, value) VALUES ('json_import', 'pending');"
+
+class SqliteBackend:
+    """
+    SQLite store in WAL mode. Listing metadata is an index scan over the
+    small `conversations` table; the stage payloads live in
+    `conversation_payloads` and are only read by load().
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self.created = not os.path.exists(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            # Autocommit mode; write transactions are opened explicitly
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    if self.created:
+                        conn.executescript(f"BEGIN IMMEDIATE;\n{SCHEMA}\n{IMPORT_PENDING}\nCOMMIT;")
+                    else:
+                        conn.executescript(SCHEMA)
+                    columns = {row["name"] for row in conn.execute("PRAGMA table_info(conversations)")}
+                    if "version" not in columns:
+                        # Databases created before conversations were versioned
+                        try:
+                            conn.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+                        except sqlite3.OperationalError as e:
+                            # Another worker process added it first
+                            if "duplicate column" not in str(e):
+                                raise
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def list_metadata(self) -> List[Dict]:
+        rows = self._connect().execute(
+            "SELECT id, title, created_at FROM conversations ORDER BY created_at DESC, id DESC"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_page(self, limit: Optional[int], after: Optional[Tuple[str, str]], title_prefix: Optional[str]) -> List[Dict]:
+        """Keyset page in (created_at DESC, id DESC) order, strictly after the `after` key."""
+        clauses = []
+        params: list = []
+        if after is not None:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+        if title_prefix:
+            escaped = title_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("title LIKE ? ESCAPE '\\'")
+            params.append(escaped + "%")
+        query = "SELECT id, title, created_at FROM conversations"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._connect().execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def load(self, conversation_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            """
+            SELECT c.id, c.title, c.created_at, c.version, p.messages
+            FROM conversations c JOIN conversation_payloads p ON p.id = c.id
+            WHERE c.id = ?
+            """,
+            (conversation_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "title": row["title"],
+            "version": row["version"],
+            "messages": json.loads(row["messages"]),
+        }
+
+    def revision(self, conversation_id: str) -> Optional[int]:
+        """Cheap change token: the stored version, bumped by every write from any process."""
+        row = self._connect().execute(
+            "SELECT version FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return row["version"] if row is not None else None
+
+    def write(self, conversation_id: str, title: str, messages: List[Dict], created_at: str,
+              expected_version: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Stores the document, keeping an existing created_at. With
+        `expected_version` the write only happens if the stored version
+        still matches. Returns the effective created_at and the new version.
+        """
+        conn = self._connect()
+        payload = json.dumps(messages, separators=(",", ":"))
+        updated_at = datetime.utcnow().isoformat()
+        # BEGIN IMMEDIATE takes the write lock up front, so the version check
+        # and the update are atomic across processes sharing the database
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute(
+                "SELECT created_at, version FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            version = 0
+            if existing is not None:
+                created_at = existing["created_at"]
+                version = existing["version"]
+            check_version(conversation_id, version, expected_version)
+            conn.execute(
+                """
+                INSERT INTO conversations (id, title, created_at, updated_at, version) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    title = excluded.title, updated_at = excluded.updated_at, version = excluded.version
+                """,
+                (conversation_id, title, created_at, updated_at, version + 1),
+            )
+            conn.execute(
+                """
+                INSERT INTO conversation_payloads (id, messages) VALUES (?, ?)
+                ON CONFLICT (id) DO UPDATE SET messages = excluded.messages
+                """,
+                (conversation_id, payload),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return created_at, version + 1
+
+    def delete(self, conversation_id: str) -> bool:
+        cursor = self._connect().execute(
+            "DELETE FROM conversations WHERE id = ?", (conversation_id,)
+        )
+        return cursor.rowcount > 0
+
+    def needs_json_import(self) -> bool:
+        """True from creation until mark_json_imported(), so an interrupted import runs again."""
+        row = self._connect().execute("SELECT value FROM storage_meta WHERE key = 'json_import'").fetchone()
+        return row is not None and row["value"] == "pending"
+
+    def mark_json_imported(self):
+        self._connect().execute("UPDATE storage_meta SET value = 'done' WHERE key = 'json_import'")
+
+    def import_document(self, stored_data: Dict):
+        """Inserts a document in the JSON file layout as-is (used by the migrator)."""
+        self.write(
+            stored_data["id"],
+            stored_data.get("title", "Untitled"),
+            stored_data.get("messages", []),
+            stored_data.get("created_at") or datetime.utcnow().isoformat(),
+        )
+
+def migrate_json_files(json_dir: str, backend: SqliteBackend) -> int:
+    """
+    One-shot import of `json_dir/*.json` conversation files into `backend`.
+    Existing rows with the same id are overwritten, so it is safe to re-run.
+    Returns the number of conversations imported.
+    """
+    if not os.path.isdir(json_dir):
+        return 0
+    imported = 0
+    for filename in sorted(os.listdir(json_dir)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(json_dir, filename), 'r', encoding='utf-8') as f:
+                backend.import_document(json.load(f))
+            imported += 1
+        except Exception as e:
+            print(f"Skipping {filename} during migration: {e}")
+    return imported
+
+if __name__ == "__main__":
+    import argparse
+    import storage
+
+    parser = argparse.ArgumentParser(description="Import JSON conversation files into the SQLite store")
+    parser.add_argument("--json-dir", default=storage.DATA_DIR)
+    parser.add_argument("--db", default=storage.DB_PATH)
+    args = parser.parse_args()
+
+    count = migrate_json_files(args.json_dir, SqliteBackend(args.db))
+    print(f"Imported {count} conversations into {args.db}")
@@ -1,139 +1,216 @@
 import os
 import json
 import uuid
+import base64
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from utils import parse_ranking_from_text, calculate_aggregate_rankings
+from typing import List, Dict, Any, Optional, Tuple
+from settings import get_settings
+from tracing import traced
+from utils import calculate_ranking_report
+from ranking_parser import parse_ranked_labels
+from json_storage import JsonFileBackend
+from sqlite_storage import SqliteBackend, migrate_json_files
+from segment_storage import SegmentBackend
+from storage_concurrency import FileLock, VersionConflictError
+from conversation_cache import conversation_cache
+import search_index
+import analytics
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data", "conversations")
+DB_PATH = get_settings().storage_db_path
 
-def ensure_data_dir():
-    os.makedirs(DATA_DIR, exist_ok=True)
+_backend = None
 
+def create_backend(kind: Optional[str] = None):
+    """
+    Builds the configured storage backend (STORAGE_BACKEND=sqlite|json|segment).
+    A freshly created SQLite database or segment imports existing JSON files,
+    again on every start until one import has run to the end.
+    """
+    kind = (kind or get_settings().storage_backend).lower()
+    if kind == "json":
+        return JsonFileBackend(DATA_DIR)
+    if kind == "sqlite":
+        backend = SqliteBackend(DB_PATH)
+        if backend.needs_json_import():
+            count = migrate_json_files(DATA_DIR, backend)
+            backend.mark_json_imported()
+            if count:
+                print(f"Migrated {count} JSON conversations into {DB_PATH}")
+        return backend
+    if kind == "segment":
+        path = get_settings().storage_segment_path
+        backend = SegmentBackend(path)
+        if backend.needs_json_import():
+            count = migrate_json_files(DATA_DIR, backend)
+            backend.mark_json_imported()
+            if count:
+                print(f"Migrated {count} JSON conversations into {path}")
+        return backend
+    raise ValueError(f"Unknown STORAGE_BACKEND: {kind}")
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+def set_backend(backend):
+    """Swaps the active backend (benchmarks, migrations, scripts)."""
+    global _backend
+    _backend = backend
+    # Cached responses belong to the previous backend's conversations
+    conversation_cache.clear()
+
+@traced("storage_read")
 def list_conversations() -> List[Dict]:
-    ensure_data_dir()
-    conversations = []
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith(".json"):
-            try:
-                with open(os.path.join(DATA_DIR, filename), 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Return minimal metadata
-                    conversations.append({
-                        "id": data.get("id"),
-                        "title": data.get("title", "Untitled"),
-                        "created_at": data.get("created_at"),
-                        # We don't load the full data here to save memory
-                        "data": None 
-                    })
-            except Exception as e:
-                print(f"Error loading {filename}: {e}")
-    
-    # Sort by created_at desc
-    conversations.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    conversations = get_backend().list_metadata()
+    for conversation in conversations:
+        # We don't load the full data here to save memory
+        conversation["data"] = None
     return conversations
 
+def encode_cursor(created_at: str, conversation_id: str) -> str:
+    raw = json.dumps([created_at, conversation_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError for cursors we did not issue."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, conversation_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return str(created_at), str(conversation_id)
+
+@traced("storage_read")
+def list_conversations_page(limit: int, after: Optional[str] = None, title_prefix: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Keyset pagination over (created_at, id), newest first. `after` is the
+    opaque cursor from a previous page's `next_cursor`.
+    """
+    after_key = decode_cursor(after) if after else None
+    # Fetch one extra row to know whether another page exists
+    items = get_backend().list_page(limit + 1, after_key, title_prefix)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    for item in items:
+        item["data"] = None
+    return {"items": items, "next_cursor": next_cursor}
+
+@traced("storage_read")
 def get_conversation(conversation_id: str) -> Optional[Dict]:
-    ensure_data_dir()
-    filepath = os.path.join(DATA_DIR, f"{conversation_id}.json")
-    if not os.path.exists(filepath):
-        return None
-    
+    """
+    The conversation in the frontend shape, or None. Served from the
+    conversation cache while the backend revision is unchanged; the result
+    may be shared between callers and must not be mutated.
+    """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            stored_data = json.load(f)
-            
-        # Transform stored JSON back to frontend ConversationState
-        # Stored format:
-        # {
-        #   "id": "...", "title": "...", "messages": [
-        #     { "role": "user", "content": "..." },
-        #     { "role": "assistant", "stage1": [...], "stage2": [...], "stage3": {...} }
-        #   ]
-        # }
-        
-        messages = stored_data.get("messages", [])
-        user_msg = next((m for m in messages if m["role"] == "user"), None)
-        assistant_msg = next((m for m in messages if m["role"] == "assistant"), None)
-        
-        question = user_msg["content"] if user_msg else ""
-        
-        stage1_responses = []
-        stage2_reviews = []
-        stage3_result = None
-        selected_models = []
-        
-        if assistant_msg:
-            # Stage 1
-            for item in assistant_msg.get("stage1", []):
-                stage1_responses.append({
-                    "model": item["model"],
-                    "response": item["response"]
-                })
-                selected_models.append(item["model"])
-            
-            # Stage 2
-            for item in assistant_msg.get("stage2", []):
-                stage2_reviews.append({
-                    "model": item["model"],
-                    "review": item["ranking"] # Map 'ranking' back to 'review'
-                })
-                
-            # Stage 3
-            s3_data = assistant_msg.get("stage3")
-            if s3_data:
-                # Re-calculate aggregates
-                aggregates = calculate_aggregate_rankings(stage1_responses, stage2_reviews)
-                stage3_result = {
-                    "final_answer": s3_data["response"],
-                    "aggregate_rankings": aggregates
-                }
-        
-        # Determine current stage
-        current_stage = 1
-        if stage3_result:
-            current_stage = 3
-        elif stage2_reviews:
-            current_stage = 3 # If we have reviews, we are likely at stage 3 or done with 2
-        elif stage1_responses:
-            current_stage = 2
-            
-        return {
-            "id": stored_data["id"],
-            "title": stored_data["title"],
-            "created_at": stored_data["created_at"],
-            "data": { # Frontend expects 'data' wrapper for state
-                "id": stored_data["id"],
-                "question": question,
-                "selectedModels": selected_models,
-                "stage1Responses": stage1_responses,
-                "stage2Reviews": stage2_reviews,
-                "stage3Result": stage3_result,
-                "currentStage": current_stage
-            }
-        }
+        backend = get_backend()
+        revision = None
+        if conversation_cache.enabled:
+            revision = backend.revision(conversation_id)
+            if revision is None:
+                conversation_cache.invalidate(conversation_id)
+                return None
+            cached = conversation_cache.get(conversation_id, revision)
+            if cached is not None:
+                return cached
+
+        stored_data = backend.load(conversation_id)
+        if stored_data is None:
+            return None
+        conversation = materialize_conversation(stored_data)
+        # Tagged with the revision read before load(): a write in between
+        # makes the entry stale on the next read, never wrongly fresh
+        if revision is not None:
+            conversation_cache.put(conversation_id, revision, conversation)
+        return conversation
 
     except Exception as e:
         print(f"Error reading conversation {conversation_id}: {e}")
         return None
 
-def save_conversation(frontend_state: Dict) -> Dict:
-    ensure_data_dir()
+def materialize_conversation(stored_data: Dict) -> Dict:
+    """Stored document -> get_conversation() response, with rankings recomputed."""
+    # Transform stored JSON back to frontend ConversationState
+    # Stored format:
+    # {
+    #   "id": "...", "title": "...", "messages": [
+    #     { "role": "user", "content": "..." },
+    #     { "role": "assistant", "stage1": [...], "stage2": [...], "stage3": {...} }
+    #   ]
+    # }
     
-    # Generate ID if not present
-    conv_id = frontend_state.get("id") or str(uuid.uuid4())
+    messages = stored_data.get("messages", [])
+    user_msg = next((m for m in messages if m["role"] == "user"), None)
+    assistant_msg = next((m for m in messages if m["role"] == "assistant"), None)
     
-    # Check if file exists to preserve created_at
-    filepath = os.path.join(DATA_DIR, f"{conv_id}.json")
-    created_at = datetime.utcnow().isoformat()
+    question = user_msg["content"] if user_msg else ""
     
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-                created_at = existing_data.get("created_at", created_at)
-        except:
-            pass # Use new timestamp if read fails
+    stage1_responses = []
+    stage2_reviews = []
+    stage3_result = None
+    selected_models = []
+    
+    if assistant_msg:
+        # Stage 1
+        for item in assistant_msg.get("stage1", []):
+            stage1_responses.append({
+                "model": item["model"],
+                "response": item["response"]
+            })
+            selected_models.append(item["model"])
+        
+        # Stage 2
+        stored_reviews = assistant_msg.get("stage2", [])
+        for item in stored_reviews:
+            stage2_reviews.append({
+                "model": item["model"],
+                "review": item["ranking"] # Map 'ranking' back to 'review'
+            })
+            
+        # Stage 3
+        s3_data = assistant_msg.get("stage3")
+        if s3_data:
+            # Re-calculate aggregates from the persisted parsed_ranking (no re-parse)
+            aggregates, ranking_stats = calculate_ranking_report(stage1_responses, stored_reviews)
+            stage3_result = {
+                "final_answer": s3_data["response"],
+                "aggregate_rankings": aggregates,
+                "ranking_stats": ranking_stats
+            }
+    
+    # Determine current stage
+    current_stage = 1
+    if stage3_result:
+        current_stage = 3
+    elif stage2_reviews:
+        current_stage = 3 # If we have reviews, we are likely at stage 3 or done with 2
+    elif stage1_responses:
+        current_stage = 2
+        
+    return {
+        "id": stored_data["id"],
+        "title": stored_data["title"],
+        "created_at": stored_data["created_at"],
+        "version": stored_data.get("version", 1),
+        "data": { # Frontend expects 'data' wrapper for state
+            "id": stored_data["id"],
+            "question": question,
+            "selectedModels": selected_models,
+            "stage1Responses": stage1_responses,
+            "stage2Reviews": stage2_reviews,
+            "stage3Result": stage3_result,
+            "currentStage": current_stage
+        }
+    }
+
+def to_stored_messages(frontend_state: Dict) -> Tuple[str, List[Dict]]:
+    """Title and stored `messages` for a frontend ConversationState."""
     title = frontend_state.get("question", "Untitled")[:50]
     
     # Transform frontend state to User JSON format
@@ -162,54 +239,89 @@ def save_conversation(frontend_state: Dict) -> Dict:
         
     # Stage 2
     for r in frontend_state.get("stage2Reviews", []):
-        # Parse ranking for storage
-        parsed = parse_ranking_from_text(r["review"])
+        # Parse ranking for storage; ranks are kept separately so ties survive
+        ranked = parse_ranked_labels(r["review"])
         assistant_msg["stage2"].append({
             "model": r["model"],
             "ranking": r["review"],
-            "parsed_ranking": parsed
+            "parsed_ranking": [label for label, _ in ranked],
+            "parsed_ranks": [rank for _, rank in ranked]
         })
         
     # Stage 3
     s3_res = frontend_state.get("stage3Result")
     if s3_res:
         # We need the chairman model name. 
-        # Since it's not in frontend state explicitly, we'll use env or default.
-        chairman_model = os.getenv("GEMINI_MODEL", "google/gemini-2.0-flash-exp:free")
+        # Since it's not in frontend state explicitly, we'll use settings.
+        chairman_model = get_settings().gemini_model
         assistant_msg["stage3"] = {
             "model": chairman_model,
             "response": s3_res["final_answer"]
         }
         
     messages.append(assistant_msg)
-    
-    stored_data = {
-        "id": conv_id,
-        "created_at": created_at,
-        "title": title,
-        "messages": messages
-    }
-    
-    filepath = os.path.join(DATA_DIR, f"{conv_id}.json")
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(stored_data, f, indent=4)
-        
+    return title, messages
+
+def conversation_lock(conversation_id: str) -> FileLock:
+    """
+    Held across a conversation's storage write and its search index and
+    leaderboard updates, so concurrent saves from several workers apply
+    them in the same order and the derived stores end at the stored version.
+    """
+    directory = os.path.dirname(search_index.get_index().db_path) or "."
+    return FileLock(os.path.join(directory, ".locks", f"{conversation_id}.lock"))
+
+@traced("storage_write")
+def save_conversation(frontend_state: Dict, expected_version: Optional[int] = None) -> Dict:
+    """
+    Creates or replaces a conversation. With `expected_version` (the version
+    the caller last read, 0 for "must not exist yet") a concurrent update in
+    between raises VersionConflictError instead of being overwritten.
+    """
+    # Generate ID if not present
+    conv_id = frontend_state.get("id") or str(uuid.uuid4())
+    title, messages = to_stored_messages(frontend_state)
+
+    with conversation_lock(conv_id):
+        # The backend keeps the original created_at when the conversation exists
+        created_at, version = get_backend().write(
+            conv_id, title, messages, datetime.utcnow().isoformat(), expected_version=expected_version
+        )
+        conversation_cache.invalidate(conv_id)
+        try:
+            search_index.get_index().index(conv_id, title, created_at, messages)
+        except Exception as e:
+            # The index can be rebuilt from storage; a failed update must not fail the save
+            print(f"Search index update failed for {conv_id}: {e}")
+        try:
+            analytics.get_leaderboard().record(conv_id, messages)
+        except Exception as e:
+            print(f"Leaderboard update failed for {conv_id}: {e}")
+
     # Return in the format expected by the frontend (wrapper)
     return {
         "id": conv_id,
         "title": title,
         "created_at": created_at,
+        "version": version,
         "data": frontend_state
     }
 
+@traced("storage_write")
 def delete_conversation(conversation_id: str) -> bool:
-    ensure_data_dir()
-    filepath = os.path.join(DATA_DIR, f"{conversation_id}.json")
-    if os.path.exists(filepath):
+    with conversation_lock(conversation_id):
+        deleted = get_backend().delete(conversation_id)
+        conversation_cache.invalidate(conversation_id)
         try:
-            os.remove(filepath)
-            return True
+            search_index.get_index().remove(conversation_id)
         except Exception as e:
-            print(f"Error deleting conversation {conversation_id}: {e}")
-            return False
-    return False
+            print(f"Search index removal failed for {conversation_id}: {e}")
+        try:
+            analytics.get_leaderboard().remove(conversation_id)
+        except Exception as e:
+            print(f"Leaderboard update failed for {conversation_id}: {e}")
+    return deleted
+
+@traced("search")
+def search_conversations(q: str, model: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+    return search_index.get_index().search(q, model=model, limit=limit, offset=offset)
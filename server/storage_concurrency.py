@@ -0,0 +1,132 @@
+import os
+import uuid
+import threading
+from typing import Dict, Optional
+
+# Advisory locks across worker processes; without fcntl (Windows) the locks
+# only serialize threads of one process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class VersionConflictError(Exception):
+    """A conditional write found a different version than the caller last read."""
+
+    def __init__(self, conversation_id: str, expected: int, current: int):
+        super().__init__(
+            f"Conversation {conversation_id} is at version {current}, not {expected}"
+        )
+        self.conversation_id = conversation_id
+        self.expected = expected
+        self.current = current
+
+def check_version(conversation_id: str, current: int, expected: Optional[int]):
+    """`current` is 0 for a conversation that does not exist; `expected=None` skips the check."""
+    if expected is not None and expected != current:
+        raise VersionConflictError(conversation_id, expected, current)
+
+# path -> [lock, threads holding or waiting for it]; dropped when nobody uses it,
+# since there is one path per conversation
+_thread_locks: Dict[str, list] = {}
+_thread_locks_guard = threading.Lock()
+
+def _checkout_thread_lock(path: str) -> threading.Lock:
+    with _thread_locks_guard:
+        entry = _thread_locks.get(path)
+        if entry is None:
+            entry = _thread_locks[path] = [threading.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+def _return_thread_lock(path: str):
+    with _thread_locks_guard:
+        entry = _thread_locks[path]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _thread_locks[path]
+
+class FileLock:
+    """
+    Exclusive lock on `path` held by one thread of one process at a time.
+    The lock file is created on first use and never removed: unlinking it
+    while another process waits would hand out two locks.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._fd: Optional[int] = None
+
+    def acquire(self):
+        thread_lock = _checkout_thread_lock(self.path)
+        try:
+            thread_lock.acquire()
+        except BaseException:
+            _return_thread_lock(self.path)
+            raise
+        try:
+            if fcntl is not None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+        except BaseException:
+            thread_lock.release()
+            _return_thread_lock(self.path)
+            raise
+
+    def release(self):
+        if self._fd is not None:
+            # Closing the descriptor drops the flock
+            os.close(self._fd)
+            self._fd = None
+        with _thread_locks_guard:
+            thread_lock = _thread_locks[self.path][0]
+        thread_lock.release()
+        _return_thread_lock(self.path)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def fsync_dir(path: str):
+    """Makes a rename in `path` durable; a no-op where directories cannot be opened."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write(path: str, data: bytes):
+    """
+    Replaces `path` with `data` so readers see either the old or the new
+    file, and a crash leaves one of the two on disk, never a torn mix.
+    """
+    directory = os.path.dirname(path) or "."
+    # Unique per call: concurrent writers of the same file must not share a temp file
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_dir(directory)
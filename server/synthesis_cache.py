@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from settings import get_settings
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "synthesis_cache")
+
+# Bump when the cached value format or the key recipe changes
+CACHE_FORMAT_VERSION = 1
+
+# Disk writes between sweeps of the cache directory
+DISK_SWEEP_EVERY = 32
+# Temp files older than this were left by a crashed write
+STALE_TMP_SECONDS = 3600
+
+def make_key(parts: Dict[str, Any]) -> str:
+    """
+    Stable content hash of the canonical council input. `parts` must be JSON
+    serialisable; keys are sorted so dict ordering never changes the hash.
+    """
+    canonical = json.dumps(
+        {"v": CACHE_FORMAT_VERSION, **parts},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class SynthesisCache:
+    """
+    Two-layer cache of chairman answers keyed by make_key():
+    an in-memory LRU bounded by entry count and bytes, with TTL, in front of
+    a JSON-file layer under data/synthesis_cache that survives restarts and
+    is swept every DISK_SWEEP_EVERY writes to its own entry and byte bounds.
+    Concurrent misses for the same key share one upstream call.
+    """
+
+    def __init__(self, cache_dir: str, ttl_seconds: float, max_entries: int, max_bytes: int,
+                 disk_max_entries: int = 4096, disk_max_bytes: int = 512 * 1024 * 1024, enabled: bool = True):
+        self.enabled = enabled
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_writes = 0
+        self._sweeping = False
+        self._entries: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict() # key -> (stored_at, size, value)
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "shared_inflight": 0,
+            "evictions": 0,
+            "expired": 0,
+            "disk_evictions": 0,
+            "disk_expired": 0,
+        }
+
+    # Memory layer
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, size, value = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            self._drop(key)
+            self._stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: str, stored_at: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return # Never let one huge answer flush the whole cache
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (stored_at, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    # Disk layer
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        filepath = self._path(key)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading synthesis cache entry {key}: {e}")
+            return None
+        if time.time() - data["stored_at"] > self.ttl_seconds:
+            _remove(filepath)
+            return None
+        return data["stored_at"], data["final_answer"]
+
+    def _disk_put(self, key: str, value: str, stored_at: float):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        filepath = self._path(key)
+        tmp_path = f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"stored_at": stored_at, "final_answer": value}, f)
+        os.replace(tmp_path, filepath)
+
+    def _disk_sweep(self) -> Tuple[int, int]:
+        """
+        Deletes expired files, then the oldest by mtime until the directory is
+        within disk_max_entries and disk_max_bytes. The directory may be shared
+        by several workers, so it is rescanned rather than tracked in memory.
+        Returns (expired, evicted).
+        """
+        now = time.time()
+        entries = []
+        expired = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue # Removed by another worker
+                    if entry.name.endswith(".tmp"):
+                        if now - stat.st_mtime > STALE_TMP_SECONDS:
+                            _remove(entry.path)
+                    elif entry.name.endswith(".json"):
+                        if now - stat.st_mtime > self.ttl_seconds:
+                            _remove(entry.path)
+                            expired += 1
+                        else:
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return 0, 0
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        evicted = 0
+        while evicted < len(entries) and (
+            len(entries) - evicted > self.disk_max_entries or total_bytes > self.disk_max_bytes
+        ):
+            _, size, path = entries[evicted]
+            _remove(path)
+            total_bytes -= size
+            evicted += 1
+        return expired, evicted
+
+    async def sweep(self):
+        if self._sweeping:
+            return
+        self._sweeping = True
+        try:
+            expired, evicted = await asyncio.to_thread(self._disk_sweep)
+            self._stats["disk_expired"] += expired
+            self._stats["disk_evictions"] += evicted
+        except Exception as e:
+            print(f"Failed to sweep synthesis cache: {e}")
+        finally:
+            self._sweeping = False
+
+    # Public API
+
+    async def lookup(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self._memory_get(key)
+        if value is not None:
+            self._stats["memory_hits"] += 1
+            return value
+        disk_entry = await asyncio.to_thread(self._disk_get, key)
+        if disk_entry is not None:
+            stored_at, value = disk_entry
+            self._memory_put(key, value, stored_at)
+            self._stats["disk_hits"] += 1
+            return value
+        return None
+
+    async def store(self, key: str, value: str):
+        if not self.enabled:
+            return
+        stored_at = time.time()
+        self._memory_put(key, value, stored_at)
+        try:
+            await asyncio.to_thread(self._disk_put, key, value, stored_at)
+        except Exception as e:
+            print(f"Failed to persist synthesis cache entry {key}: {e}")
+            return
+        # The first write also clears out whatever earlier runs left behind
+        if self._disk_writes % DISK_SWEEP_EVERY == 0:
+            await self.sweep()
+        self._disk_writes += 1
+
+    def begin(self, key: str) -> Tuple[asyncio.Future, bool]:
+        """
+        Joins or starts the computation of `key` in one synchronous step, so
+        no await can slip between the check and the registration. Returns
+        the in-flight future and whether the caller is its producer; a
+        producer must settle it with complete() or abort().
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats["shared_inflight"] += 1
+            return future, False
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        # Waiters may all be gone; don't warn about an unretrieved exception
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return future, True
+
+    def _release(self, key: str, future: asyncio.Future):
+        # Only the producer's own registration, never a later one for the same key
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    async def complete(self, key: str, future: asyncio.Future, value: str):
+        self._release(key, future)
+        # Settled before the disk write, which the producer can be cancelled in
+        if not future.done():
+            future.set_result(value)
+        await self.store(key, value)
+
+    def abort(self, key: str, future: asyncio.Future, exc: BaseException):
+        """Fails the producer's future. A no-op once it is settled, so it is safe in cleanup paths."""
+        self._release(key, future)
+        if future.done():
+            return
+        if isinstance(exc, Exception):
+            future.set_exception(exc)
+        else:
+            # Producer was cancelled or disconnected; waiters must not inherit that
+            future.cancel()
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        Returns the cached value for `key`, joins an identical in-flight call,
+        or runs `compute` once. Exceptions are propagated and never cached.
+        """
+        value = await self.lookup(key)
+        if value is not None:
+            return value
+        while True:
+            future, producer = self.begin(key)
+            if producer:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The producer went away; join a newer one or compute it ourselves
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self.abort(key, future, e)
+            raise
+        await self.complete(key, future, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "inflight": len(self._inflight),
+        }
+
+_settings = get_settings()
+synthesis_cache = SynthesisCache(
+    enabled=_settings.synthesis_cache_enabled,
+    cache_dir=CACHE_DIR,
+    ttl_seconds=_settings.synthesis_cache_ttl,
+    max_entries=_settings.synthesis_cache_max_entries,
+    max_bytes=_settings.synthesis_cache_max_bytes,
+    disk_max_entries=_settings.synthesis_cache_disk_max_entries,
+    disk_max_bytes=_settings.synthesis_cache_disk_max_bytes,
+)
@@ -0,0 +1,26 @@
+"""
+Every path the server writes to is pointed at a throwaway directory before
+any server module is imported, since several modules read their settings
+at import time.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="llm-council-tests-")
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "STORAGE_DB_PATH": os.path.join(TEST_DATA_DIR, "conversations.db"),
+    "STORAGE_SEGMENT_PATH": os.path.join(TEST_DATA_DIR, "conversations.seg"),
+    "SEARCH_INDEX_PATH": os.path.join(TEST_DATA_DIR, "search_index.db"),
+    "ANALYTICS_DB_PATH": os.path.join(TEST_DATA_DIR, "analytics.db"),
+    "BATCH_DIR": os.path.join(TEST_DATA_DIR, "batches"),
+    "SYNTHESIS_CACHE_ENABLED": "false",
+})
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DATA_DIR, ignore_errors=True)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from aggregation import aggregate, bootstrap_mean_rank_ci, build_rank_matrix, kendalls_w
+from utils import calculate_ranking_report
+
+MODELS = ["model-a", "model-b", "model-c"]
+
+def ballots(*orders):
+    """Each order lists candidate indexes best first."""
+    return [[(candidate, rank) for rank, candidate in enumerate(order, start=1)] for order in orders]
+
+def test_identical_ballots_agree_completely():
+    assert kendalls_w(build_rank_matrix(3, ballots([0, 1, 2], [0, 1, 2], [0, 1, 2]))) == 1.0
+
+def test_opposite_ballots_do_not_agree_at_all():
+    assert kendalls_w(build_rank_matrix(3, ballots([0, 1, 2], [2, 1, 0]))) == 0.0
+
+def test_kendalls_w_matches_the_textbook_formula():
+    # Rank sums 4, 6, 8 around a mean of 6: W = 12 * 8 / (3^2 * (3^3 - 3))
+    assert kendalls_w(build_rank_matrix(3, ballots([0, 1, 2], [0, 2, 1], [1, 0, 2]))) == pytest.approx(0.4444)
+
+def test_kendalls_w_corrects_for_ties():
+    tied = [[(0, 1), (1, 1), (2, 3)]] * 2
+    assert kendalls_w(build_rank_matrix(3, tied)) == 1.0
+
+def test_kendalls_w_needs_two_ballots():
+    assert kendalls_w(build_rank_matrix(3, ballots([0, 1, 2]))) is None
+
+def test_scores_and_the_consensus_follow_the_pairwise_majority():
+    # Borda prefers model-b, but a majority ranks model-a above model-b
+    rankings, stats = aggregate(MODELS, ballots(*[[0, 1, 2]] * 3, *[[1, 2, 0]] * 2))
+    by_model = {r["model"]: r for r in rankings}
+    assert by_model["model-b"]["borda_score"] > by_model["model-a"]["borda_score"]
+    assert stats["kemeny_order"] == MODELS
+    assert stats["pairwise_wins"]["model-a"] == {"model-b": 3, "model-c": 3}
+    assert [by_model[m]["copeland_score"] for m in MODELS] == [2.0, 0.0, -2.0]
+    assert stats["reviewers"] == 5
+    assert all(r["votes"] == 5 for r in rankings)
+
+def test_confidence_intervals_are_reproducible_and_contain_the_mean():
+    reviews = ballots([0, 1, 2], [1, 0, 2], [0, 2, 1], [0, 1, 2], [2, 0, 1])
+    matrix = build_rank_matrix(3, reviews)
+    low, high = bootstrap_mean_rank_ci(matrix, samples=500, seed=1)
+    again_low, again_high = bootstrap_mean_rank_ci(matrix, samples=500, seed=1)
+    assert np.array_equal(low, again_low) and np.array_equal(high, again_high)
+    means = np.nanmean(matrix, axis=0)
+    assert np.all(low <= means) and np.all(means <= high)
+
+def test_unranked_models_and_empty_reviews_are_left_out():
+    rankings, stats = aggregate(MODELS, [[(0, 1), (1, 2)], [], [(1, 1), (0, 2)]])
+    assert sorted(r["model"] for r in rankings) == ["model-a", "model-b"]
+    assert stats["reviewers"] == 2
+    assert aggregate(MODELS, [[], []]) == ([], None)
+
+def test_the_report_maps_review_labels_to_models_with_ties():
+    stage1 = [{"model": m, "response": "..."} for m in MODELS]
+    stage2 = [
+        {"model": "model-a", "review": "FINAL RANKING:\n1. Response C\n2. Response A = Response B"},
+        {"model": "model-b", "review": "FINAL RANKING:\n1. Response C\n2. Response B\n3. Response A"},
+    ]
+    rankings, stats = calculate_ranking_report(stage1, stage2)
+    assert [r["model"] for r in rankings] == ["model-c", "model-b", "model-a"]
+    assert [r["avg_rank"] for r in rankings] == [1.0, 2.0, 2.5]
+    assert stats["kemeny_order"][0] == "model-c"
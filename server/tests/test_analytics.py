@@ -0,0 +1,76 @@
+import threading
+import sqlite3
+
+import pytest
+
+import storage
+import analytics
+from analytics import Leaderboard
+from sqlite_storage import SqliteBackend
+
+def council(winner: str, loser: str):
+    return [
+        {"role": "user", "content": "Which is better?"},
+        {
+            "role": "assistant",
+            "stage1": [{"model": winner, "response": "A"}, {"model": loser, "response": "B"}],
+            "stage2": [{"model": "judge", "ranking": "", "parsed_ranking": ["Response A", "Response B"]}],
+            "stage3": None,
+        },
+    ]
+
+@pytest.fixture
+def board(tmp_path, monkeypatch):
+    backend = SqliteBackend(str(tmp_path / "conversations.db"))
+    backend.write("c1", "First", council("model-a", "model-b"), "2024-01-01T00:00:00")
+    backend.write("c2", "Second", council("model-a", "model-b"), "2024-01-02T00:00:00")
+    monkeypatch.setattr(storage, "_backend", backend)
+    board = Leaderboard(str(tmp_path / "analytics.db"))
+    monkeypatch.setattr(analytics, "_leaderboard", board)
+    return board
+
+def test_backfill_runs_when_the_db_exists_but_was_never_filled(board):
+    sqlite3.connect(board.db_path).close()
+    assert analytics.backfill_if_needed() == 2
+    result = board.leaderboard(min_ballots=0)
+    assert result["conversations"] == 2
+    models = {entry["model"]: entry for entry in result["models"]}
+    assert models["model-a"]["wins"] == 2
+    assert analytics.backfill_if_needed() is None
+
+def test_interrupted_backfill_is_retried(board, monkeypatch):
+    record = board.record
+    calls = 0
+
+    def crash_on_second(conversation_id, messages):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("killed mid-backfill")
+        record(conversation_id, messages)
+
+    monkeypatch.setattr(board, "record", crash_on_second)
+    with pytest.raises(RuntimeError):
+        analytics.backfill_if_needed()
+    assert not board.is_complete()
+
+    monkeypatch.setattr(board, "record", record)
+    assert analytics.backfill_if_needed() == 2
+    assert board.is_complete()
+
+def test_a_stopped_backfill_is_not_marked_complete(board, monkeypatch):
+    stop = threading.Event()
+    record = board.record
+
+    def record_then_stop(*args):
+        record(*args)
+        stop.set()
+
+    monkeypatch.setattr(board, "record", record_then_stop)
+    assert analytics.backfill_if_needed(stop) == 1
+    assert not board.is_complete()
+
+    monkeypatch.setattr(board, "record", record)
+    stop.clear()
+    assert analytics.backfill_if_needed(stop) == 2
+    assert board.is_complete()
@@ -0,0 +1,74 @@
+import json
+import asyncio
+
+import pytest
+
+import batch
+from batch import BatchRunner, BatchError
+from models import SynthesisResponse
+
+def request_line(question: str) -> str:
+    return json.dumps({"question": question, "stage1_responses": [], "stage2_reviews": []}) + "\n"
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture
+def answered(monkeypatch):
+    questions = []
+
+    async def synthesize_answer(request):
+        questions.append(request.question)
+        return SynthesisResponse(final_answer=f"answer to {request.question}", aggregate_rankings=[])
+
+    monkeypatch.setattr(batch, "synthesize_answer", synthesize_answer)
+    return questions
+
+def run(input_path, output_path):
+    return asyncio.run(BatchRunner(str(input_path), str(output_path), concurrency=2, rate=0, save=False).run())
+
+def test_lines_appended_to_a_small_input_resume_the_batch(tmp_path, answered):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    input_path.write_text(request_line("first") + request_line("second"))
+    assert run(input_path, output_path)["succeeded"] == 2
+
+    with open(input_path, "a") as f:
+        f.write(request_line("third"))
+    stats = run(input_path, output_path)
+
+    assert (stats["skipped"], stats["succeeded"]) == (2, 1)
+    assert answered == ["first", "second", "third"]
+    assert sorted(record["line"] for record in read_records(output_path)) == [1, 2, 3]
+
+def test_an_edited_input_is_not_resumed(tmp_path, answered):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    input_path.write_text(request_line("first") + request_line("second"))
+    run(input_path, output_path)
+
+    input_path.write_text(request_line("other") + request_line("second"))
+    with pytest.raises(BatchError):
+        run(input_path, output_path)
+
+def test_an_interrupted_batch_resumes_where_its_output_stops(tmp_path, answered):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    input_path.write_text("".join(request_line(f"q{i}") for i in range(3 * batch.CHECKPOINT_EVERY)))
+
+    async def interrupted():
+        task = asyncio.create_task(BatchRunner(str(input_path), str(output_path), concurrency=4, rate=0, save=False).run())
+        while len(answered) < batch.CHECKPOINT_EVERY + 10:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(interrupted())
+    with open(f"{output_path}.checkpoint") as f:
+        assert json.load(f)["status"] == "interrupted"
+    written = len(read_records(output_path))
+
+    stats = run(input_path, output_path)
+    assert stats["status"] == "completed"
+    assert stats["skipped"] == written
+    lines = [record["line"] for record in read_records(output_path)]
+    assert sorted(lines) == list(range(1, 3 * batch.CHECKPOINT_EVERY + 1))
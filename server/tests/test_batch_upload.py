@@ -0,0 +1,33 @@
+import os
+import asyncio
+
+import httpx
+
+import main
+from batch import batch_manager
+
+def post_batch(content: bytes) -> httpx.Response:
+    async def request():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/batches", content=content)
+
+    return asyncio.run(request())
+
+def test_upload_is_spooled_to_the_batch_input(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(batch_manager, "submit", lambda batch_id, *args: submitted.append(batch_id) or {"id": batch_id})
+    line = b'{"question": "q", "stage1_responses": [], "stage2_reviews": []}\n'
+    body = line * (3 * main.UPLOAD_FLUSH_BYTES // len(line) + 7)
+
+    response = post_batch(body)
+    assert response.status_code == 202
+    with open(batch_manager.input_path(submitted[0]), "rb") as f:
+        assert f.read() == body
+
+def test_an_empty_upload_leaves_nothing_behind(monkeypatch):
+    monkeypatch.setattr(batch_manager, "submit", lambda *args: None)
+    before = set(os.listdir(batch_manager.batch_dir)) if os.path.isdir(batch_manager.batch_dir) else set()
+    response = post_batch(b"")
+    assert response.status_code == 400
+    assert set(os.listdir(batch_manager.batch_dir)) == before
@@ -0,0 +1,77 @@
+import random
+import asyncio
+
+import pytest
+
+from services.chairman_providers import FallbackChairman, ResilientChairman, UpstreamError
+from services.resilience import CircuitBreaker, RetryPolicy
+
+class ScriptedChairman:
+    """Waits `delay` seconds, then raises `error` or streams `deltas`."""
+
+    def __init__(self, name, deltas=("ok",), delay=0.0, error=None):
+        self.name = name
+        self.deltas = deltas
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.closed = 0
+
+    async def stream(self, prompt_text: str):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+            for delta in self.deltas:
+                yield delta
+        finally:
+            self.closed += 1
+
+    def stats(self):
+        return {"calls": self.calls}
+
+async def collect(chairman):
+    return [delta async for delta in chairman.stream("prompt")]
+
+def test_the_primary_answers_when_it_is_healthy():
+    primary, backup = ScriptedChairman("primary", deltas=("a", "b")), ScriptedChairman("backup")
+    assert asyncio.run(collect(FallbackChairman([primary, backup], first_chunk_timeout=1.0))) == ["a", "b"]
+    assert backup.calls == 0
+
+def test_a_failing_primary_falls_back_to_the_next_provider():
+    primary = ScriptedChairman("primary", error=UpstreamError("Error 500: boom", status_code=500))
+    backup = ScriptedChairman("backup", deltas=("from", " backup"))
+    assert asyncio.run(collect(FallbackChairman([primary, backup], first_chunk_timeout=1.0))) == ["from", " backup"]
+    assert primary.closed == 1
+
+def test_a_silent_primary_is_abandoned_after_the_first_chunk_timeout():
+    primary = ScriptedChairman("primary", delay=5.0)
+    backup = ScriptedChairman("backup")
+    assert asyncio.run(collect(FallbackChairman([primary, backup], first_chunk_timeout=0.05))) == ["ok"]
+    assert primary.closed == 1
+
+def test_the_last_provider_gets_no_first_chunk_timeout():
+    primary = ScriptedChairman("primary", error=UpstreamError("Error 500: boom", status_code=500))
+    backup = ScriptedChairman("backup", delay=0.1)
+    assert asyncio.run(collect(FallbackChairman([primary, backup], first_chunk_timeout=0.01))) == ["ok"]
+
+def test_when_every_provider_fails_the_errors_are_combined():
+    primary = ScriptedChairman("primary", error=UpstreamError("Error 500: boom", status_code=500))
+    backup = ScriptedChairman("backup", error=UpstreamError("Error 429: slow down", status_code=429, retry_after=7.0))
+    with pytest.raises(UpstreamError) as raised:
+        asyncio.run(collect(FallbackChairman([primary, backup], first_chunk_timeout=1.0)))
+    assert "primary: Error 500: boom" in str(raised.value)
+    assert "backup: Error 429: slow down" in str(raised.value)
+    assert (raised.value.http_status, raised.value.retry_after) == (503, 7.0)
+
+def test_a_provider_whose_circuit_is_open_is_skipped_without_a_call():
+    primary = ScriptedChairman("primary", error=UpstreamError("Error 503: down", status_code=503))
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    resilient = ResilientChairman(primary, retry=RetryPolicy(attempts=1, rng=random.Random(0)), breaker=breaker)
+    chairman = FallbackChairman([resilient, ScriptedChairman("backup")], first_chunk_timeout=1.0)
+
+    for _ in range(3):
+        assert asyncio.run(collect(chairman)) == ["ok"]
+    assert breaker.state == CircuitBreaker.OPEN
+    assert primary.calls == 2
@@ -0,0 +1,53 @@
+import json
+import random
+
+import pytest
+
+from services import chairman_providers
+from services.chairman_providers import JsonArrayStreamParser, extract_chunk_text
+
+def gemini_chunk(text: str):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+CHUNKS = [gemini_chunk(text) for text in ("Hello", ' "quoted" {braces} [brackets]', " back\\slash \\\"", " é ✓ \\u00e9", "")]
+BODY = "[" + ",\r\n".join(json.dumps(chunk) for chunk in CHUNKS) + "]"
+
+def feed_in_pieces(parser, text: str, sizes):
+    items = []
+    pos = 0
+    for size in sizes:
+        items += parser.feed(text[pos:pos + size])
+        pos += size
+    items += parser.feed(text[pos:])
+    return items
+
+def test_every_split_point_yields_the_same_chunks():
+    for split in range(len(BODY) + 1):
+        assert feed_in_pieces(JsonArrayStreamParser(), BODY, [split]) == CHUNKS
+
+def test_random_reads_yield_the_same_chunks():
+    rng = random.Random(0)
+    for _ in range(200):
+        sizes = [rng.randint(1, 12) for _ in range(len(BODY))]
+        assert feed_in_pieces(JsonArrayStreamParser(), BODY, sizes) == CHUNKS
+
+def test_a_chunk_is_yielded_as_soon_as_it_closes():
+    parser = JsonArrayStreamParser()
+    first = json.dumps(CHUNKS[0])
+    assert parser.feed("[" + first[:-1]) == []
+    assert parser.feed(first[-1] + ",\r\n{") == [CHUNKS[0]]
+    assert [extract_chunk_text(c) for c in parser.feed('"candidates": []}]')] == [""]
+
+def test_a_large_chunk_is_decoded_once(monkeypatch):
+    decoded = []
+    loads = json.loads
+    monkeypatch.setattr(chairman_providers.json, "loads", lambda text: decoded.append(len(text)) or loads(text))
+    body = json.dumps([gemini_chunk("word " * 200000)])
+    parser = JsonArrayStreamParser()
+    items = feed_in_pieces(parser, body, [512] * (len(body) // 512))
+    assert [extract_chunk_text(c) for c in items] == ["word " * 200000]
+    assert len(decoded) == 1
+
+def test_anything_but_an_object_in_the_array_is_an_error():
+    with pytest.raises(ValueError):
+        JsonArrayStreamParser().feed('["text"]')
@@ -0,0 +1,101 @@
+import gzip
+import asyncio
+
+import brotli
+import numpy as np
+import pytest
+from starlette.datastructures import Headers
+from starlette.responses import Response, StreamingResponse
+
+import responses
+from middleware import CompressionMiddleware, negotiate_encoding
+
+BODY = b'{"answer": "' + b"the council agrees " * 200 + b'"}'
+
+def call(app, accept_encoding: str, minimum_size: int = 1024):
+    """Runs one GET through the middleware; returns the response headers and the body messages."""
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    sent = []
+    requested = []
+
+    async def receive():
+        if requested:
+            # The client stays connected until the response is done
+            await asyncio.Event().wait()
+        requested.append(True)
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(app, minimum_size=minimum_size)(scope, receive, send))
+    assert sent[0]["type"] == "http.response.start"
+    return Headers(raw=sent[0]["headers"]), [m.get("body", b"") for m in sent[1:]]
+
+def streamed(chunks, media_type):
+    async def body():
+        for chunk in chunks:
+            yield chunk
+    return StreamingResponse(body(), media_type=media_type)
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("*", "br"),
+    ("gzip;q=0, br;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_the_encoding_follows_the_clients_preference(header, expected):
+    assert negotiate_encoding(header) == expected
+
+def test_large_bodies_are_compressed_with_the_negotiated_encoding():
+    headers, [body] = call(Response(BODY, media_type="application/json"), "gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(body) < len(BODY)
+    assert gzip.decompress(body) == BODY
+
+    headers, [body] = call(Response(BODY, media_type="application/json"), "br, gzip")
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(body) == BODY
+
+def test_small_bodies_and_identity_clients_get_the_body_as_is():
+    headers, [body] = call(Response(b'{"ok": true}', media_type="application/json"), "gzip")
+    assert "content-encoding" not in headers
+    assert body == b'{"ok": true}'
+
+    headers, [body] = call(Response(BODY, media_type="application/json"), "identity")
+    assert "content-encoding" not in headers
+    assert body == BODY
+
+def test_event_streams_pass_through_chunk_by_chunk():
+    events = [b"data: one\n\n", b"data: two\n\n", b"data: " + b"x" * 4096 + b"\n\n"]
+    headers, bodies = call(streamed(events, "text/event-stream"), "gzip, br", minimum_size=1)
+    assert "content-encoding" not in headers
+    assert [body for body in bodies if body] == events
+
+def test_other_streamed_bodies_are_compressed_as_they_go():
+    chunks = [BODY[:1000], BODY[1000:2000], BODY[2000:]]
+    headers, bodies = call(streamed(chunks, "application/x-ndjson"), "gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    assert gzip.decompress(b"".join(bodies)) == BODY
+
+def test_already_encoded_responses_are_not_compressed_twice():
+    encoded = gzip.compress(BODY)
+    response = Response(encoded, media_type="application/json", headers={"Content-Encoding": "gzip"})
+    headers, [body] = call(response, "br, gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert body == encoded
+
+def test_dumps_matches_the_standard_library_without_orjson(monkeypatch):
+    content = {"title": "Zürich", "ranks": [1, 2], "score": 0.5, 3: "non-string key"}
+    fast = responses.dumps(content)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert fast == responses.dumps(content)
+    assert responses.FastJSONResponse({"n": 1}).body == b'{"n":1}'
+
+def test_dumps_serializes_numpy_values_with_orjson():
+    assert responses.dumps({"mean": np.array([1.5, 2.0])}) == b'{"mean":[1.5,2.0]}'
@@ -0,0 +1,100 @@
+import os
+import json
+
+import pytest
+
+import storage
+from conversation_cache import ConversationCache
+from json_storage import JsonFileBackend
+from sqlite_storage import SqliteBackend
+
+def council_state(conversation_id: str, question: str):
+    return {
+        "id": conversation_id,
+        "question": question,
+        "stage1Responses": [{"model": "a", "response": "one"}],
+        "stage2Reviews": [],
+        "stage3Result": {"final_answer": "done"},
+    }
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ConversationCache(max_entries=10, max_bytes=1_000_000)
+    monkeypatch.setattr(storage, "conversation_cache", cache)
+    return cache
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch, cache):
+    backend = SqliteBackend(str(tmp_path / "conversations.db"))
+    monkeypatch.setattr(storage, "_backend", backend)
+    return backend
+
+def test_an_entry_is_only_served_for_the_revision_it_was_built_from():
+    cache = ConversationCache(max_entries=10, max_bytes=1_000_000)
+    cache.put("c", 1, {"title": "old"})
+    assert cache.get("c", 1) == {"title": "old"}
+    assert cache.get("c", 2) is None
+    assert cache.get("c", 1) is None # the stale entry was dropped
+    assert {k: cache.stats()[k] for k in ("hits", "stale", "misses", "entries")} == {"hits": 1, "stale": 1, "misses": 1, "entries": 0}
+
+def test_the_least_recently_used_entry_is_evicted_first():
+    cache = ConversationCache(max_entries=2, max_bytes=1_000_000)
+    cache.put("a", 1, {})
+    cache.put("b", 1, {})
+    cache.get("a", 1)
+    cache.put("c", 1, {})
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == {} and cache.get("c", 1) == {}
+
+def test_the_byte_budget_evicts_and_oversized_responses_are_not_cached():
+    cache = ConversationCache(max_entries=10, max_bytes=500)
+    cache.put("a", 1, {"text": "x" * 200})
+    cache.put("b", 1, {"text": "x" * 200})
+    assert cache.get("a", 1) is None
+    assert cache.stats()["bytes"] <= 500
+    cache.put("huge", 1, {"text": "x" * 1000})
+    assert cache.get("huge", 1) is None
+    assert cache.get("b", 1) is not None
+
+def test_reads_are_cached_until_the_conversation_is_saved_again(backend, cache):
+    storage.save_conversation(council_state("c", "first"))
+    assert storage.get_conversation("c")["title"] == "first"
+    assert storage.get_conversation("c")["title"] == "first"
+    assert cache.stats()["hits"] == 1
+
+    storage.save_conversation(council_state("c", "second"))
+    assert storage.get_conversation("c")["title"] == "second"
+
+def test_a_write_from_another_process_bumps_the_revision(backend, cache, tmp_path):
+    storage.save_conversation(council_state("c", "first"))
+    storage.get_conversation("c")
+    # A second connection stands in for another worker; it never touches our cache
+    other = SqliteBackend(str(tmp_path / "conversations.db"))
+    title, messages = storage.to_stored_messages(council_state("c", "edited elsewhere"))
+    other.write("c", title, messages, "2024-01-01T00:00:00")
+
+    assert storage.get_conversation("c")["title"] == "edited elsewhere"
+    assert cache.stats()["stale"] == 1
+
+def test_deleted_conversations_are_not_served_from_the_cache(backend, cache, tmp_path):
+    storage.save_conversation(council_state("c", "first"))
+    storage.get_conversation("c")
+    SqliteBackend(str(tmp_path / "conversations.db")).delete("c")
+    assert storage.get_conversation("c") is None
+    assert cache.stats()["entries"] == 0
+
+def test_json_files_edited_outside_the_app_are_picked_up(tmp_path, monkeypatch, cache):
+    backend = JsonFileBackend(str(tmp_path / "json"))
+    monkeypatch.setattr(storage, "_backend", backend)
+    storage.save_conversation(council_state("c", "first"))
+    storage.get_conversation("c")
+
+    path = backend._path("c")
+    document = json.loads(open(path).read())
+    document["title"] = "edited by hand, a bit longer"
+    with open(path, "w") as f:
+        json.dump(document, f)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert storage.get_conversation("c")["title"] == "edited by hand, a bit longer"
@@ -0,0 +1,112 @@
+import re
+import time
+import asyncio
+import dataclasses
+
+import pytest
+
+from services import council_service
+from models import Stage1Response
+from ranking_parser import parse_ranking
+from services.council_service import ReviewQuorum, call_member, reviewer_permutation, run_stage1, run_stage2
+from services.llm_providers import ProviderError
+from settings import get_settings
+
+class ScriptedProvider:
+    """Answers each model after `delays[model]` seconds; models in `failing` raise instead."""
+
+    def __init__(self, delays=None, failing=(), answer=lambda model, prompt: f"{model} says hi"):
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.answer = answer
+        self.calls = []
+
+    async def complete(self, model: str, prompt: str) -> str:
+        self.calls.append(model)
+        delay = self.delays.get(model, 0.0)
+        if callable(delay):
+            delay = delay(self.calls.count(model))
+        await asyncio.sleep(delay)
+        if model in self.failing:
+            raise ProviderError(f"{model} is down")
+        return self.answer(model, prompt)
+
+@pytest.fixture
+def council_settings(monkeypatch):
+    def configure(**overrides):
+        settings = dataclasses.replace(get_settings(), **overrides)
+        monkeypatch.setattr(council_service, "get_settings", lambda: settings)
+    configure(council_member_timeout=2.0, council_hedge_after=0)
+    return configure
+
+def test_stage1_asks_every_member_at_once(council_settings):
+    provider = ScriptedProvider(delays={"a": 0.2, "b": 0.2, "c": 0.2})
+    started = time.perf_counter()
+    responses, failures = asyncio.run(run_stage1(provider, "Why?", ["a", "b", "c"]))
+    assert time.perf_counter() - started < 0.35
+    assert [r.model for r in responses] == ["a", "b", "c"]
+    assert failures == []
+
+def test_a_failing_member_is_reported_not_fatal(council_settings):
+    provider = ScriptedProvider(failing={"b"})
+    responses, failures = asyncio.run(run_stage1(provider, "Why?", ["a", "b", "c"]))
+    assert [r.model for r in responses] == ["a", "c"]
+    assert [(f.model, f.stage) for f in failures] == [("b", 1)]
+    assert "b is down" in failures[0].error
+
+def test_a_slow_call_is_hedged_and_the_first_answer_wins():
+    # The first call hangs, the hedged duplicate answers at once
+    provider = ScriptedProvider(delays={"a": lambda call: 5.0 if call == 1 else 0.0})
+    started = time.perf_counter()
+    answer = asyncio.run(call_member(provider, "a", "prompt", timeout=2.0, hedge_after=0.05))
+    assert answer == "a says hi"
+    assert provider.calls == ["a", "a"]
+    assert time.perf_counter() - started < 1.0
+
+def test_a_member_that_never_answers_times_out():
+    provider = ScriptedProvider(delays={"a": 5.0})
+    with pytest.raises(ProviderError, match="timed out"):
+        asyncio.run(call_member(provider, "a", "prompt", timeout=0.1, hedge_after=None))
+
+def ranking_by_preference(preferred):
+    """A reviewer that ranks stage 1 answers in `preferred` model order, whatever labels it was shown."""
+    def answer(model, prompt):
+        shown = re.findall(r"(Response [A-Z]+):\n(\S+) says hi", prompt)
+        by_model = {author: label for label, author in shown}
+        lines = [f"{rank}. {by_model[author]}" for rank, author in enumerate(preferred, start=1)]
+        return "Looks good.\n\nFINAL RANKING:\n" + "\n".join(lines)
+    return answer
+
+STAGE1 = [Stage1Response(model=m, response=f"{m} says hi") for m in ("a", "b", "c", "d")]
+
+def test_each_reviewer_sees_its_own_order_and_rankings_come_back_canonical(council_settings):
+    council_settings(council_member_timeout=2.0, council_hedge_after=0, council_review_quorum=1.0)
+    provider = ScriptedProvider(answer=ranking_by_preference(["c", "a", "d", "b"]))
+    reviews, failures, skipped = asyncio.run(run_stage2(provider, "Why?", STAGE1, ["a", "b", "c", "d"]))
+
+    orders = {tuple(reviewer_permutation(r, "Why?", 4)) for r in ("a", "b", "c", "d")}
+    assert len(orders) > 1
+    assert reviewer_permutation("a", "Why?", 4) == reviewer_permutation("a", "Why?", 4)
+    assert (failures, skipped) == ([], [])
+    for review in reviews:
+        assert parse_ranking(review.review) == ["Response C", "Response A", "Response D", "Response B"]
+
+def test_stage2_stops_at_quorum_and_skips_the_stragglers(council_settings):
+    council_settings(council_member_timeout=5.0, council_hedge_after=0, council_review_quorum=0.5, council_review_early_settle=False)
+    provider = ScriptedProvider(delays={"c": 3.0, "d": 3.0}, answer=ranking_by_preference(["a", "b", "c", "d"]))
+    started = time.perf_counter()
+    reviews, failures, skipped = asyncio.run(run_stage2(provider, "Why?", STAGE1, ["a", "b", "c", "d"]))
+    assert time.perf_counter() - started < 1.0
+    assert sorted(r.model for r in reviews) == ["a", "b"]
+    assert sorted(skipped) == ["c", "d"]
+
+def test_early_settle_waits_until_the_outstanding_reviews_cannot_change_the_winner():
+    quorum = ReviewQuorum(candidates=3, reviewers=5, quorum=5, early_settle=True)
+    unanimous = [(0, 1), (1, 2), (2, 3)]
+    for _ in range(3):
+        quorum.add(unanimous)
+        assert not quorum.settled()
+    # The leader is 4 ahead of the runner-up and the last review can swing at most 2
+    quorum.add(unanimous)
+    assert quorum.settled()
+    assert not ReviewQuorum(candidates=3, reviewers=5, quorum=5, early_settle=False).settled()
@@ -0,0 +1,54 @@
+import random
+import asyncio
+import dataclasses
+
+import pytest
+
+from services import http_client
+from services.http_client import UpstreamBusyError
+from settings import get_settings
+
+@pytest.fixture
+def queue_timeout(monkeypatch):
+    settings = dataclasses.replace(get_settings(), upstream_queue_timeout=0.02, upstream_retry_after=3)
+    monkeypatch.setattr(http_client, "get_settings", lambda: settings)
+
+def test_a_full_upstream_answers_busy(queue_timeout, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(http_client, "_semaphore", asyncio.Semaphore(1))
+        held = await http_client.acquire_slot()
+        with pytest.raises(UpstreamBusyError) as busy:
+            await http_client.acquire_slot()
+        assert busy.value.retry_after == 3
+        held.release()
+        held.release() # idempotent
+        (await http_client.acquire_slot()).release()
+
+    asyncio.run(scenario())
+
+def test_timeouts_and_cancels_never_leak_a_permit(queue_timeout, monkeypatch):
+    rng = random.Random(0)
+
+    async def use_slot():
+        async with http_client.upstream_slot():
+            await asyncio.sleep(rng.random() * 0.01)
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(2)
+        monkeypatch.setattr(http_client, "_semaphore", semaphore)
+        tasks = []
+        for _ in range(300):
+            tasks.append(asyncio.create_task(use_slot()))
+            if rng.random() < 0.3:
+                rng.choice(tasks).cancel()
+            await asyncio.sleep(rng.random() * 0.002)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert any(isinstance(r, UpstreamBusyError) for r in results)
+        assert any(isinstance(r, asyncio.CancelledError) for r in results)
+        # Every permit is back: both slots can be taken at once
+        slots = [await http_client.acquire_slot() for _ in range(2)]
+        assert semaphore.locked()
+        for slot in slots:
+            slot.release()
+
+    asyncio.run(scenario())
@@ -0,0 +1,114 @@
+import asyncio
+
+import jobs
+import main
+from jobs import JobManager, SUCCEEDED, CANCELLED
+from models import SynthesisRequest
+
+def make_request(question: str = "Why is the sky blue?") -> SynthesisRequest:
+    return SynthesisRequest(
+        question=question,
+        stage1_responses=[{"model": "model-a", "response": "Rayleigh scattering."}],
+        stage2_reviews=[],
+    )
+
+class GatedChairman:
+    """Streams "Hello " at once and "world" only after release()."""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = asyncio.Event()
+
+    async def __call__(self, prompt_text: str):
+        self.calls += 1
+        yield "Hello "
+        await self.gate.wait()
+        yield "world"
+
+async def read_events(path: str, headers=(), until=None) -> str:
+    """GETs an event stream straight through the ASGI app, disconnecting once `until(body)` holds."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(k.encode(), v.encode()) for k, v in headers], "client": ("127.0.0.1", 50000),
+        "server": ("test", 80), "state": {},
+    }
+    body = ""
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal body
+        if message["type"] == "http.response.body":
+            body += message.get("body", b"").decode("utf-8")
+            if until is not None and until(body):
+                disconnected.set()
+
+    await asyncio.wait_for(main.app(scope, receive, send), timeout=10)
+    return body
+
+def events(body: str):
+    """(id, event, data) of every event in an SSE body."""
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            parsed.append((fields.get("id"), fields["event"], fields.get("data")))
+    return parsed
+
+def test_a_client_reattaches_after_disconnecting_and_misses_nothing(monkeypatch):
+    chairman = GatedChairman()
+    monkeypatch.setattr(jobs, "stream_final_answer", chairman)
+    manager = JobManager(workers=1, queue_size=4, ttl=60)
+    monkeypatch.setattr(main, "job_manager", manager)
+
+    async def scenario():
+        await manager.start()
+        try:
+            job = manager.submit(make_request())
+            path = f"/api/synthesize/jobs/{job.id}/events"
+
+            first = events(await read_events(path, until=lambda body: "Hello" in body))
+            assert [event for _, event, _ in first] == ["rankings", "delta"]
+            last_event_id = first[-1][0]
+            assert last_event_id == "6"
+
+            # The job keeps going while nobody is attached
+            chairman.gate.set()
+            while not job.finished:
+                await asyncio.sleep(0.01)
+
+            second = events(await read_events(path, headers=[("last-event-id", last_event_id)]))
+            assert [event for _, event, _ in second] == ["rankings", "delta", "done"]
+            assert second[1][:2] == ("11", "delta") and '"world"' in second[1][2]
+            assert job.status == SUCCEEDED and job.text == "Hello world"
+            assert chairman.calls == 1
+        finally:
+            await manager.stop()
+
+    asyncio.run(scenario())
+
+def test_identical_submissions_share_a_job_and_stop_cancels_it(monkeypatch):
+    chairman = GatedChairman()
+    monkeypatch.setattr(jobs, "stream_final_answer", chairman)
+    manager = JobManager(workers=1, queue_size=4, ttl=60)
+
+    async def scenario():
+        await manager.start()
+        job = manager.submit(make_request("shared"))
+        assert manager.submit(make_request("shared")) is job
+        while not job.text:
+            await asyncio.sleep(0.01)
+        # A long poll from the current offset wakes up when the job ends
+        waiter = asyncio.create_task(job.wait(len(job.text), timeout=5))
+        await manager.stop()
+        assert await waiter
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == CANCELLED
+    assert job.error == {"detail": "Server shut down"}
+    assert chairman.calls == 1
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+import storage
+from json_storage import JsonFileBackend
+from segment_storage import SegmentBackend
+from sqlite_storage import SqliteBackend
+
+MESSAGES = [{"role": "user", "content": "?"}]
+
+@pytest.fixture(params=["sqlite", "segment", "json"])
+def backend(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        backend = SqliteBackend(str(tmp_path / "conversations.db"))
+    elif request.param == "segment":
+        backend = SegmentBackend(str(tmp_path / "conversations.seg"))
+    else:
+        backend = JsonFileBackend(str(tmp_path / "json"))
+    monkeypatch.setattr(storage, "_backend", backend)
+    # Two conversations share each timestamp, so the id has to break the tie
+    for i in range(7):
+        backend.write(f"c{i}", f"Question {i}", MESSAGES, f"2024-01-0{i // 2 + 1}T00:00:00")
+    return backend
+
+def get(path, headers=None):
+    async def request():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(request())
+
+def test_pages_walk_every_conversation_once_newest_first(backend):
+    seen = []
+    cursor = None
+    while True:
+        page = storage.list_conversations_page(3, cursor)
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["c6", "c5", "c4", "c3", "c2", "c1", "c0"]
+
+def test_a_page_stays_put_when_newer_conversations_arrive(backend):
+    first = storage.list_conversations_page(3)
+    backend.write("new", "Newest", MESSAGES, "2024-02-01T00:00:00")
+    second = storage.list_conversations_page(3, first["next_cursor"])
+    assert [item["id"] for item in second["items"]] == ["c3", "c2", "c1"]
+
+def test_the_title_prefix_is_matched_literally(backend):
+    backend.write("pct", "100% sure", MESSAGES, "2024-01-05T00:00:00")
+    backend.write("other", "1000 reasons", MESSAGES, "2024-01-05T00:00:00")
+    assert [item["id"] for item in storage.list_conversations_page(10, title_prefix="100%")["items"]] == ["pct"]
+
+def test_cursors_round_trip_and_foreign_ones_are_rejected():
+    cursor = storage.encode_cursor("2024-01-01T00:00:00", "c1")
+    assert storage.decode_cursor(cursor) == ("2024-01-01T00:00:00", "c1")
+    with pytest.raises(ValueError):
+        storage.decode_cursor("not-a-cursor")
+
+def test_the_api_pages_through_the_next_cursor_header(backend):
+    first = get("/api/conversations?limit=4")
+    assert [item["id"] for item in first.json()] == ["c6", "c5", "c4", "c3"]
+    last = get(f"/api/conversations?limit=4&after={first.headers['x-next-cursor']}")
+    assert [item["id"] for item in last.json()] == ["c2", "c1", "c0"]
+    assert "x-next-cursor" not in last.headers
+    assert get("/api/conversations?after=bogus").status_code == 400
+
+def test_an_unchanged_page_answers_304_until_a_conversation_changes(backend):
+    first = get("/api/conversations?limit=4")
+    etag = first.headers["etag"]
+    unchanged = get("/api/conversations?limit=4", {"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["x-next-cursor"] == first.headers["x-next-cursor"]
+
+    backend.write("c6", "Renamed", MESSAGES, "2024-01-04T00:00:00")
+    changed = get("/api/conversations?limit=4", {"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()[0]["title"] == "Renamed"
@@ -0,0 +1,108 @@
+import time
+import asyncio
+
+import httpx
+
+import main
+import storage
+import analytics
+import search_index
+from persistence import PersistenceQueue
+from sqlite_storage import SqliteBackend
+
+class SlowStore:
+    def __init__(self, delay: float = 0.01, fail_ids=()):
+        self.delay = delay
+        self.fail_ids = set(fail_ids)
+        self.saved = []
+
+    def __call__(self, state):
+        time.sleep(self.delay)
+        if state["id"] in self.fail_ids:
+            raise OSError("disk full")
+        self.saved.append((state["id"], state["question"]))
+
+def test_stop_flushes_every_queued_save():
+    store = SlowStore()
+
+    async def scenario():
+        queue = PersistenceQueue(maxsize=100, save_fn=store)
+        await queue.start()
+        for i in range(20):
+            await queue.submit({"id": f"c{i}", "question": "q"})
+        assert queue.stats()["depth"] > 0
+        await queue.stop()
+        assert not queue.running
+
+    asyncio.run(scenario())
+    assert sorted(conversation_id for conversation_id, _ in store.saved) == sorted(f"c{i}" for i in range(20))
+
+def test_waiting_updates_to_one_conversation_are_coalesced():
+    store = SlowStore(delay=0.05)
+
+    async def scenario():
+        queue = PersistenceQueue(maxsize=100, save_fn=store)
+        await queue.start()
+        await queue.submit({"id": "busy", "question": "first"})
+        await asyncio.sleep(0.01) # "busy" is now being written
+        for version in ("second", "third", "fourth"):
+            await queue.submit({"id": "c", "question": version})
+        assert queue.is_pending("c")
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert store.saved == [("busy", "first"), ("c", "fourth")]
+    assert stats["coalesced"] == 2
+
+def test_a_failed_save_does_not_stop_the_worker():
+    store = SlowStore(delay=0, fail_ids={"bad"})
+
+    async def scenario():
+        queue = PersistenceQueue(maxsize=10, save_fn=store)
+        await queue.start()
+        await queue.submit({"id": "bad", "question": "q"})
+        await queue.submit({"id": "good", "question": "q"})
+        await queue.drain()
+        stats = queue.stats()
+        await queue.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert store.saved == [("good", "q")]
+    assert stats["failed"] == 1 and stats["written"] == 1
+    assert stats["last_error"].startswith("bad:")
+
+def test_saves_write_through_outside_the_app_lifespan():
+    store = SlowStore(delay=0)
+    queue = PersistenceQueue(maxsize=10, save_fn=store)
+    conversation_id = asyncio.run(queue.submit({"question": "q"}))
+    assert store.saved == [(conversation_id, "q")]
+
+def test_a_replace_lands_after_the_queued_auto_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_backend", SqliteBackend(str(tmp_path / "conversations.db")))
+    monkeypatch.setattr(search_index, "_index", search_index.SearchIndex(str(tmp_path / "search_index.db")))
+    monkeypatch.setattr(analytics, "_leaderboard", analytics.Leaderboard(str(tmp_path / "analytics.db")))
+
+    def slow_save(state):
+        time.sleep(0.1)
+        return storage.save_conversation(state)
+
+    queue = PersistenceQueue(maxsize=10, save_fn=slow_save)
+    monkeypatch.setattr(main, "persistence_queue", queue)
+
+    async def scenario():
+        await queue.start()
+        await queue.submit({"id": "c", "question": "auto-saved"})
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"title": "edited", "question": "edited", "data": {"id": "c", "question": "edited"}}
+            response = await client.post("/api/conversations", json=body)
+        await queue.stop()
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"v2"'
+    stored = storage.get_backend().load("c")
+    assert (stored["title"], stored["version"]) == ("edited", 2)
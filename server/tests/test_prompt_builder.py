@@ -0,0 +1,76 @@
+import pytest
+
+from models import SynthesisRequest
+from services.prompt_builder import TRUNCATION_MARKER, build_chairman_prompt, estimate_tokens
+
+RANKING = "FINAL RANKING:\n1. Response B\n2. Response A\n3. Response C"
+
+def paragraphs(topic: str, count: int) -> str:
+    return "\n\n".join(f"Paragraph {i} about {topic}. " + "filler words " * 40 for i in range(count))
+
+def make_request(responses, reviews=()) -> SynthesisRequest:
+    return SynthesisRequest(
+        question="Why do tides follow the moon?",
+        stage1_responses=[{"model": f"model-{i}", "response": text} for i, text in enumerate(responses)],
+        stage2_reviews=[{"model": f"model-{i}", "review": text} for i, text in enumerate(reviews)],
+    )
+
+LONG = make_request(
+    [paragraphs("tides and the moon", 30), "Short answer.", paragraphs("ocean currents", 40), "x" * 9000],
+    [paragraphs("the reviewed answers", 10) + "\n" + RANKING, "Brief review.\n" + RANKING],
+)
+
+@pytest.mark.parametrize("policy", ["truncate", "extract", "dedupe"])
+@pytest.mark.parametrize("budget", [450, 500, 700, 1500, 4000])
+def test_an_over_budget_prompt_is_cut_to_the_budget(policy, budget):
+    prompt = build_chairman_prompt(LONG, budget_tokens=budget, policy=policy)
+    assert prompt.policy == policy
+    assert prompt.estimated_tokens == estimate_tokens(prompt.text)
+    assert estimate_tokens(prompt.text) <= budget
+    # Rankings and short entries survive any cut
+    assert prompt.text.count(RANKING) == 2
+    assert "Short answer." in prompt.text and "Brief review." in prompt.text
+
+@pytest.mark.parametrize("policy", ["truncate", "extract"])
+@pytest.mark.parametrize("spare_tokens", [5, 40, 90, 200])
+def test_markers_count_against_a_tight_budget(policy, spare_tokens):
+    request = make_request([paragraphs(f"topic {i}", 6) for i in range(12)])
+    empty = make_request([""] * 12)
+    budget = estimate_tokens(build_chairman_prompt(empty).text) + spare_tokens
+    prompt = build_chairman_prompt(request, budget_tokens=budget, policy=policy)
+    assert estimate_tokens(prompt.text) <= budget
+
+def test_a_prompt_within_budget_is_left_alone():
+    request = make_request(["An answer."], ["A review.\n" + RANKING])
+    prompt = build_chairman_prompt(request, budget_tokens=10000)
+    assert prompt.policy is None
+    assert prompt.text == build_chairman_prompt(request).text
+
+def test_truncate_marks_the_cut():
+    prompt = build_chairman_prompt(LONG, budget_tokens=1500, policy="truncate")
+    assert TRUNCATION_MARKER in prompt.text
+
+def test_extract_keeps_the_paragraphs_about_the_question():
+    answer = "\n\n".join([
+        "Intro paragraph with a direct answer.",
+        "Unrelated notes on the history of sailing ships. " * 20,
+        "Tides follow the moon because of its gravity pulling the oceans.",
+        "More unrelated notes about harbour architecture. " * 20,
+    ])
+    request = make_request([answer, "y" * 4000])
+    prompt = build_chairman_prompt(request, budget_tokens=estimate_tokens(request.stage1_responses[1].response), policy="extract")
+    assert "Tides follow the moon because of its gravity" in prompt.text
+    assert "harbour architecture" not in prompt.text
+    assert "[... passages omitted ...]" in prompt.text
+
+def test_dedupe_collapses_near_identical_responses():
+    text = paragraphs("tides and the moon", 12)
+    request = make_request([text, text + " Indeed.", "A different, short answer."])
+    prompt = build_chairman_prompt(request, budget_tokens=estimate_tokens(text) + 600, policy="dedupe")
+    assert prompt.notes == ["model-1 deduplicated against model-0"]
+    assert "(Near-identical to the response from model-0.)" in prompt.text
+    assert TRUNCATION_MARKER not in prompt.text
+
+def test_unknown_policies_are_rejected():
+    with pytest.raises(ValueError):
+        build_chairman_prompt(LONG, budget_tokens=100, policy="summarize")
@@ -0,0 +1,31 @@
+import pytest
+
+from ranking_parser import label_for_index, parse_ranked_labels, parse_ranking, parse_ranking_groups
+
+@pytest.mark.parametrize("index, label", [(0, "Response A"), (25, "Response Z"), (26, "Response AA"), (27, "Response AB"), (701, "Response ZZ"), (702, "Response AAA")])
+def test_labels_continue_past_z_like_spreadsheet_columns(index, label):
+    assert label_for_index(index) == label
+
+def test_labels_past_z_are_parsed():
+    review = "Thoughts...\n\nFINAL RANKING:\n1. Response AB\n2. **Response Z**\n3. Response AA"
+    assert parse_ranking(review) == ["Response AB", "Response Z", "Response AA"]
+
+def test_only_the_final_ranking_section_counts():
+    review = "1. Response B is wordy.\n2. Response A is fine.\n\nFINAL RANKING:\n1. Response A\n2. Response B"
+    assert parse_ranking(review) == ["Response A", "Response B"]
+
+def test_the_header_is_matched_in_any_case():
+    assert parse_ranking("final ranking:\n1. response c\n2. Response a") == ["Response C", "Response A"]
+
+@pytest.mark.parametrize("tie", ["=", ",", "/", "&", "and", "tied with"])
+def test_ties_share_a_competition_rank(tie):
+    review = f"FINAL RANKING:\n1. Response B\n2. Response A {tie} Response C\n3. Response D"
+    assert parse_ranking_groups(review) == [["Response B"], ["Response A", "Response C"], ["Response D"]]
+    assert parse_ranked_labels(review) == [("Response B", 1), ("Response A", 2), ("Response C", 2), ("Response D", 4)]
+
+def test_repeated_labels_keep_their_first_rank():
+    review = "FINAL RANKING:\n1. Response A\n2. Response B = Response A\n3. Response B"
+    assert parse_ranked_labels(review) == [("Response A", 1), ("Response B", 2)]
+
+def test_a_review_without_a_ranking_parses_to_nothing():
+    assert parse_ranked_labels("I liked Response A best.") == []
@@ -0,0 +1,111 @@
+import random
+import asyncio
+
+import pytest
+
+from services.chairman_providers import ResilientChairman, UpstreamError
+from services.resilience import CircuitBreaker, RetryPolicy
+
+class RateLimitedProvider:
+    """Answers 429 with the given Retry-After `failures` times, then streams "ok"."""
+
+    name = "fake"
+
+    def __init__(self, retry_after: float, failures: int = 1):
+        self.retry_after = retry_after
+        self.failures = failures
+        self.calls = 0
+
+    async def stream(self, prompt_text: str):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise UpstreamError("Error 429: slow down", status_code=429, retry_after=self.retry_after)
+        yield "ok"
+
+def make_chairman(provider, max_delay: float = 8.0):
+    retry = RetryPolicy(attempts=3, base_delay=0.01, max_delay=max_delay, rng=random.Random(0))
+    return ResilientChairman(provider, retry=retry, breaker=CircuitBreaker(failure_threshold=10))
+
+async def collect(chairman):
+    return [delta async for delta in chairman.stream("prompt")]
+
+def test_delay_honours_retry_after_within_max_delay():
+    policy = RetryPolicy(base_delay=0.5, max_delay=8.0, rng=random.Random(0))
+    assert policy.delay(0, retry_after=3.0) == 3.0
+    assert 0 <= policy.delay(10) <= 8.0
+
+def test_delay_refuses_retry_after_beyond_max_delay():
+    policy = RetryPolicy(max_delay=8.0)
+    assert policy.delay(0, retry_after=30.0) is None
+
+def test_short_retry_after_is_waited_out_and_retried():
+    provider = RateLimitedProvider(retry_after=0.05)
+    assert asyncio.run(collect(make_chairman(provider))) == ["ok"]
+    assert provider.calls == 2
+
+def test_long_retry_after_fails_at_once_and_reaches_the_client():
+    provider = RateLimitedProvider(retry_after=30.0)
+    with pytest.raises(UpstreamError) as raised:
+        asyncio.run(collect(make_chairman(provider)))
+    assert provider.calls == 1
+    assert raised.value.retry_after == 30.0
+    assert raised.value.http_status == 503
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_the_circuit_opens_after_consecutive_failures_and_a_success_resets_the_count():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=FakeClock())
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+def test_after_the_reset_timeout_a_single_trial_call_decides():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 4.0
+    assert breaker.retry_after() == 6.0
+    clock.now = 10.0
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow() # only one trial at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+    clock.now = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_a_cancelled_trial_lets_the_next_call_try():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 10.0
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+def test_an_open_circuit_answers_503_with_its_retry_after():
+    provider = RateLimitedProvider(retry_after=0.0, failures=0)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0, clock=FakeClock())
+    breaker.record_failure()
+    chairman = ResilientChairman(provider, retry=RetryPolicy(attempts=1), breaker=breaker)
+    with pytest.raises(UpstreamError) as raised:
+        asyncio.run(collect(chairman))
+    assert provider.calls == 0
+    assert (raised.value.http_status, raised.value.retry_after) == (503, 30.0)
@@ -0,0 +1,89 @@
+import threading
+import sqlite3
+
+import pytest
+
+import storage
+import search_index
+from search_index import SearchIndex
+from sqlite_storage import SqliteBackend
+
+MESSAGES = [
+    {"role": "user", "content": "Why do tides happen twice a day?"},
+    {
+        "role": "assistant",
+        "stage1": [{"model": "model-a", "response": "The moon's gravity stretches the oceans."}],
+        "stage2": [],
+        "stage3": {"model": "chairman", "response": "Tidal bulges on both sides of the Earth."},
+    },
+]
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    backend = SqliteBackend(str(tmp_path / "conversations.db"))
+    backend.write("c1", "Tides", MESSAGES, "2024-01-01T00:00:00")
+    monkeypatch.setattr(storage, "_backend", backend)
+    index = SearchIndex(str(tmp_path / "search_index.db"))
+    monkeypatch.setattr(search_index, "_index", index)
+    return index
+
+def test_backfill_runs_when_the_db_exists_but_was_never_filled(index):
+    # Someone else created the file first (another worker, a benchmark probe)
+    sqlite3.connect(index.db_path).close()
+    assert search_index.backfill_if_needed() == 1
+    assert [hit["id"] for hit in index.search("tides")] == ["c1"]
+    assert search_index.backfill_if_needed() is None
+
+def test_interrupted_backfill_is_retried(index, monkeypatch):
+    optimize = index.optimize
+
+    def crash():
+        raise RuntimeError("killed mid-backfill")
+
+    monkeypatch.setattr(index, "optimize", crash)
+    with pytest.raises(RuntimeError):
+        search_index.backfill_if_needed()
+    assert not index.is_complete()
+
+    monkeypatch.setattr(index, "optimize", optimize)
+    assert search_index.backfill_if_needed() == 1
+    assert index.is_complete()
+
+def test_a_stopped_backfill_is_not_marked_complete(index, monkeypatch):
+    storage.get_backend().write("c2", "Waves", MESSAGES, "2024-01-02T00:00:00")
+    stop = threading.Event()
+    index_one = index.index
+
+    def index_then_stop(*args):
+        index_one(*args)
+        stop.set()
+
+    monkeypatch.setattr(index, "index", index_then_stop)
+    assert search_index.backfill_if_needed(stop) == 1
+    assert not index.is_complete()
+
+    monkeypatch.setattr(index, "index", index_one)
+    stop.clear()
+    assert search_index.backfill_if_needed(stop) == 2
+    assert index.is_complete()
+
+def conversation(question: str, model: str):
+    return [
+        {"role": "user", "content": question},
+        {"role": "assistant", "stage1": [{"model": model, "response": "An answer."}], "stage2": []},
+    ]
+
+def test_search_ranks_within_the_newest_matches_and_filters_by_model(tmp_path):
+    index = SearchIndex(str(tmp_path / "search_index.db"), rank_window=2)
+    # The oldest conversation is the best match but falls outside the window
+    index.index("old", "Tides", "2024-01-01", conversation("tides tides tides", "model-a"))
+    index.index("mid", "Sea", "2024-01-02", conversation("tides and the sea", "model-b"))
+    index.index("new", "Moon", "2024-01-03", conversation("the moon pulls tides", "model-a"))
+
+    assert {hit["id"] for hit in index.search("tides")} == {"mid", "new"}
+    # The window counts matches of the filtered model only
+    assert [hit["id"] for hit in index.search("tides", model="model-a")] == ["old", "new"]
+    assert "<mark>" in index.search("moon")[0]["snippet"]
+
+    index.rank_window = 0
+    assert index.search("tides")[0]["id"] == "old"
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+import segment_storage
+from segment_storage import CODEC_ZLIB, FILE_HEADER, SegmentBackend
+from storage_concurrency import VersionConflictError
+
+def messages(text: str):
+    return [{"role": "user", "content": text}, {"role": "assistant", "stage1": [], "stage2": [], "stage3": None}]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "conversations.seg")
+
+def open_backend(path):
+    return SegmentBackend(path, codec=CODEC_ZLIB)
+
+def test_reopening_after_a_crash_replays_records_past_the_snapshot(path, monkeypatch):
+    monkeypatch.setattr(segment_storage, "SNAPSHOT_EVERY", 3)
+    backend = open_backend(path)
+    for i in range(7):
+        backend.write(f"c{i}", f"title {i}", messages(f"question {i}"), f"2024-01-0{i + 1}")
+    backend.write("c0", "renamed", messages("question 0, edited"), "ignored")
+    backend.delete("c6")
+    # No close(): the last snapshot is behind the records written after it
+
+    reopened = open_backend(path)
+    assert [m["id"] for m in reopened.list_metadata()] == ["c5", "c4", "c3", "c2", "c1", "c0"]
+    first = reopened.load("c0")
+    assert first["title"] == "renamed" and first["version"] == 2 and first["created_at"] == "2024-01-01"
+    assert first["messages"][0]["content"] == "question 0, edited"
+    assert reopened.load("c6") is None
+
+def test_a_torn_tail_is_cut_off_and_writes_continue(path):
+    backend = open_backend(path)
+    backend.write("a", "A", messages("kept"), "2024-01-01")
+    backend.close()
+    intact_size = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x04\x05\x00") # half a record header, as left by a crash mid-append
+
+    reopened = open_backend(path)
+    assert os.path.getsize(path) == intact_size
+    assert reopened.load("a")["messages"][0]["content"] == "kept"
+    reopened.write("b", "B", messages("after recovery"), "2024-01-02")
+    reopened.close()
+    assert open_backend(path).load("b")["messages"][0]["content"] == "after recovery"
+
+def test_a_record_with_a_bad_checksum_ends_the_replay(path):
+    backend = open_backend(path)
+    backend.write("a", "A", messages("good"), "2024-01-01")
+    offset = os.path.getsize(path)
+    backend.write("b", "B", messages("flipped"), "2024-01-02")
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)[0]
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last ^ 0xFF]))
+
+    reopened = open_backend(path)
+    assert reopened.load("a") is not None
+    assert reopened.load("b") is None
+    assert os.path.getsize(path) == offset
+
+def test_compaction_keeps_live_records_and_other_instances_follow(path):
+    writer = open_backend(path)
+    reader = open_backend(path)
+    for i in range(5):
+        writer.write("hot", "Hot", messages(f"revision {i}"), "2024-01-01")
+    writer.write("gone", "Gone", messages("deleted"), "2024-01-02")
+    writer.delete("gone")
+    writer.write("cold", "Cold", messages("untouched"), "2024-01-03")
+    assert reader.load("hot")["messages"][0]["content"] == "revision 4"
+
+    before = writer.stats()
+    reclaimed = writer.compact()
+    after = writer.stats()
+    assert reclaimed > 0 and after["dead_bytes"] == 0
+    assert after["file_bytes"] == before["file_bytes"] - reclaimed
+
+    # The reader still has the old file mapped and must notice the new generation
+    assert reader.load("hot")["messages"][0]["content"] == "revision 4"
+    assert reader.load("gone") is None
+    assert {m["id"] for m in reader.list_metadata()} == {"hot", "cold"}
+    reader.write("cold", "Cold", messages("written after compaction"), "ignored")
+    assert writer.load("cold")["messages"][0]["content"] == "written after compaction"
+    assert open_backend(path).load("hot")["version"] == 5
+
+def test_stale_expected_version_is_rejected(path):
+    backend = open_backend(path)
+    _, version = backend.write("c", "C", messages("one"), "2024-01-01")
+    backend.write("c", "C", messages("two"), "2024-01-01", expected_version=version)
+    with pytest.raises(VersionConflictError):
+        backend.write("c", "C", messages("three"), "2024-01-01", expected_version=version)
+    assert backend.load("c")["messages"][0]["content"] == "two"
+
+def test_files_that_are_not_segments_are_refused(path):
+    with open(path, "wb") as f:
+        f.write(b"not a segment".ljust(FILE_HEADER.size, b"\0"))
+    with pytest.raises(segment_storage.SegmentCorruptError):
+        open_backend(path)
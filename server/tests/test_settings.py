@@ -0,0 +1,11 @@
+import os
+
+from settings import SERVER_DIR, load_settings
+
+def test_relative_data_paths_resolve_against_the_server_dir(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STORAGE_DB_PATH", "data/conversations.db")
+    monkeypatch.setenv("BATCH_DIR", str(tmp_path / "batches"))
+    settings = load_settings()
+    assert settings.storage_db_path == os.path.join(SERVER_DIR, "data", "conversations.db")
+    assert settings.batch_dir == str(tmp_path / "batches")
@@ -0,0 +1,15 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import bench_startup
+
+# Several times the ~0.7s measured on a laptop, so slow CI machines don't flake
+FIRST_REQUEST_BUDGET_MS = 3000
+RUNS = 3
+
+def test_startup_stays_lazy_and_within_budget():
+    result = bench_startup.measure(RUNS)
+    assert result["eager_modules"] == [], f"imported at startup: {result['eager_modules']}"
+    assert bench_startup.failures(result, max_first_request_ms=FIRST_REQUEST_BUDGET_MS) == []
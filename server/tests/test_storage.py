@@ -0,0 +1,67 @@
+import json
+import dataclasses
+
+import pytest
+
+import storage
+from sqlite_storage import SqliteBackend
+from segment_storage import SegmentBackend
+from settings import get_settings
+
+def write_json_conversations(directory, count: int):
+    directory.mkdir()
+    for i in range(count):
+        document = {
+            "id": f"c{i}",
+            "title": f"Question {i}",
+            "created_at": f"2024-01-0{i + 1}T00:00:00",
+            "messages": [{"role": "user", "content": f"Question {i}"}],
+        }
+        (directory / f"c{i}.json").write_text(json.dumps(document))
+
+@pytest.fixture(params=["sqlite", "segment"])
+def kind(request, tmp_path, monkeypatch):
+    write_json_conversations(tmp_path / "json", 3)
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path / "json"))
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "conversations.db"))
+    settings = dataclasses.replace(get_settings(), storage_segment_path=str(tmp_path / "conversations.seg"))
+    monkeypatch.setattr(storage, "get_settings", lambda: settings)
+    return request.param
+
+def test_an_interrupted_json_import_runs_again_on_the_next_start(kind, monkeypatch):
+    backend_class = SqliteBackend if kind == "sqlite" else SegmentBackend
+    import_document = backend_class.import_document
+    imported = []
+
+    def killed_after_one(self, stored_data):
+        if imported:
+            raise KeyboardInterrupt
+        imported.append(stored_data["id"])
+        import_document(self, stored_data)
+
+    monkeypatch.setattr(backend_class, "import_document", killed_after_one)
+    with pytest.raises(KeyboardInterrupt):
+        storage.create_backend(kind)
+    monkeypatch.setattr(backend_class, "import_document", import_document)
+
+    backend = storage.create_backend(kind)
+    assert sorted(m["id"] for m in backend.list_metadata()) == ["c0", "c1", "c2"]
+    assert not backend.needs_json_import()
+
+def test_a_finished_import_is_not_repeated(kind):
+    backend = storage.create_backend(kind)
+    backend.delete("c1")
+
+    reopened = storage.create_backend(kind)
+    assert sorted(m["id"] for m in reopened.list_metadata()) == ["c0", "c2"]
+
+def test_databases_from_before_the_marker_are_not_reimported(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path / "json"))
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "conversations.db"))
+    write_json_conversations(tmp_path / "json", 2)
+    legacy = SqliteBackend(storage.DB_PATH)
+    legacy.write("kept", "Already migrated", [], "2024-02-01T00:00:00")
+    legacy._connect().execute("DELETE FROM storage_meta")
+
+    backend = storage.create_backend("sqlite")
+    assert [m["id"] for m in backend.list_metadata()] == ["kept"]
@@ -0,0 +1,111 @@
+import time
+import random
+import threading
+import asyncio
+import multiprocessing
+
+import httpx
+import pytest
+
+import main
+import storage
+import storage_concurrency
+import analytics
+import search_index
+from analytics import Leaderboard
+from search_index import SearchIndex
+from sqlite_storage import SqliteBackend
+from storage_concurrency import FileLock
+
+SAVES_PER_WRITER = 15
+
+def council_state(conversation_id: str, writer: str, n: int):
+    return {
+        "id": conversation_id,
+        "question": f"{writer} draft {n}",
+        "stage1Responses": [
+            {"model": f"{writer}/first", "response": "one"},
+            {"model": f"{writer}/second", "response": "two"},
+        ],
+        "stage2Reviews": [{"model": "judge", "review": "FINAL RANKING:\n1. Response A\n2. Response B"}],
+        "stage3Result": {"final_answer": "done"},
+    }
+
+def jittered(update):
+    # Widens the gap between the storage write and the derived update
+    def wrapper(self, *args):
+        time.sleep(random.random() * 0.01)
+        return update(self, *args)
+    return wrapper
+
+def keep_saving(writer: str):
+    random.seed(writer)
+    for n in range(SAVES_PER_WRITER):
+        storage.save_conversation(council_state("shared", writer, n))
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    # Created but never connected here, so forked writers open their own connections
+    monkeypatch.setattr(storage, "_backend", SqliteBackend(str(tmp_path / "conversations.db")))
+    monkeypatch.setattr(search_index, "_index", SearchIndex(str(tmp_path / "search_index.db")))
+    monkeypatch.setattr(analytics, "_leaderboard", Leaderboard(str(tmp_path / "analytics.db")))
+
+def test_concurrent_saves_leave_index_and_leaderboard_at_the_stored_version(stores, monkeypatch):
+    monkeypatch.setattr(SearchIndex, "index", jittered(SearchIndex.index))
+    monkeypatch.setattr(Leaderboard, "record", jittered(Leaderboard.record))
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=keep_saving, args=(writer,)) for writer in ("left", "right")]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    stored = storage.get_backend().load("shared")
+    assert stored["version"] == 2 * SAVES_PER_WRITER
+    writer = stored["title"].split()[0]
+    hits = storage.search_conversations("draft")
+    assert [(hit["id"], hit["title"]) for hit in hits] == [("shared", stored["title"])]
+    models = {entry["model"] for entry in analytics.get_leaderboard().leaderboard()["models"]}
+    assert models == {f"{writer}/first", f"{writer}/second"}
+
+def save_via_api(state, headers):
+    async def request():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"title": state["question"], "question": state["question"], "data": state}
+            return await client.post("/api/conversations", json=body, headers=headers)
+
+    return asyncio.run(request())
+
+def test_a_save_with_a_stale_if_match_is_rejected(stores):
+    created = save_via_api(council_state("edited", "left", 0), {"If-None-Match": "*"})
+    assert created.status_code == 200
+    stale_etag = created.headers["etag"]
+    assert save_via_api(council_state("edited", "left", 1), {"If-Match": stale_etag}).status_code == 200
+
+    rejected = save_via_api(council_state("edited", "right", 0), {"If-Match": stale_etag})
+    assert rejected.status_code == 412
+    stored = storage.get_backend().load("edited")
+    assert (stored["title"], stored["version"]) == ("left draft 1", 2)
+    assert [hit["title"] for hit in storage.search_conversations("draft")] == ["left draft 1"]
+
+def test_thread_locks_are_dropped_once_released(tmp_path):
+    counts = {}
+
+    def bump(conversation_id: str):
+        for _ in range(50):
+            with FileLock(str(tmp_path / f"{conversation_id}.lock")):
+                value = counts.get(conversation_id, 0)
+                time.sleep(0)
+                counts[conversation_id] = value + 1
+
+    ids = ["shared"] * 4 + [f"own-{i}" for i in range(4)]
+    threads = [threading.Thread(target=bump, args=(conversation_id,)) for conversation_id in ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counts == {"shared": 200, **{f"own-{i}": 50 for i in range(4)}}
+    assert storage_concurrency._thread_locks == {}
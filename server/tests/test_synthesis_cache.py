@@ -0,0 +1,136 @@
+import os
+import time
+import asyncio
+
+from synthesis_cache import SynthesisCache
+
+def make_cache(tmp_path, **overrides):
+    options = dict(cache_dir=str(tmp_path), ttl_seconds=60, max_entries=16, max_bytes=1 << 20)
+    options.update(overrides)
+    return SynthesisCache(**options)
+
+def test_begin_joins_the_registered_producer(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path)
+        first, producer = cache.begin("k")
+        second, joined_as_producer = cache.begin("k")
+        assert producer and not joined_as_producer
+        assert second is first
+        await cache.complete("k", first, "answer")
+        assert await second == "answer"
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(scenario())
+
+def test_late_settle_leaves_a_newer_producer_alone(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path)
+        old, _ = cache.begin("k")
+        cache.abort("k", old, asyncio.CancelledError())
+        new, producer = cache.begin("k")
+        assert producer and new is not old
+
+        # The old producer's cleanup runs again after the new one registered
+        cache.abort("k", old, RuntimeError("late"))
+        await cache.complete("k", old, "stale")
+        assert cache._inflight["k"] is new
+        assert not new.done()
+
+        await cache.complete("k", new, "fresh")
+        assert await new == "fresh"
+        assert await cache.lookup("k") == "fresh"
+
+    asyncio.run(scenario())
+
+def test_concurrent_misses_compute_once(tmp_path):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        cache = make_cache(tmp_path)
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(8)))
+        assert results == ["answer"] * 8
+        assert calls == 1
+        assert cache.stats()["shared_inflight"] == 7
+
+    asyncio.run(scenario())
+
+def test_waiters_recompute_when_the_producer_is_cancelled(tmp_path):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05 if calls == 1 else 0)
+        return f"answer {calls}"
+
+    async def scenario():
+        cache = make_cache(tmp_path)
+        producer = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        producer.cancel()
+        assert await waiter == "answer 2"
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(scenario())
+
+def test_waiters_get_the_value_when_the_producer_is_cancelled_while_storing(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path)
+        storing = asyncio.Event()
+
+        async def slow_store(key, value):
+            storing.set()
+            await asyncio.sleep(10)
+
+        cache.store = slow_store
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        producer = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await storing.wait()
+        producer.cancel()
+        assert await asyncio.wait_for(waiter, 1) == "answer"
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(scenario())
+
+def test_disk_sweep_keeps_the_newest_entries_within_bounds(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path, disk_max_entries=3)
+        for i in range(5):
+            await cache.store(f"k{i}", f"answer {i}")
+            written_at = time.time() - 50 + i
+            os.utime(cache._path(f"k{i}"), (written_at, written_at))
+        await cache.sweep()
+        assert sorted(os.listdir(tmp_path)) == ["k2.json", "k3.json", "k4.json"]
+        assert cache.stats()["disk_evictions"] == 2
+
+    asyncio.run(scenario())
+
+def test_disk_sweep_drops_expired_and_abandoned_files(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path, ttl_seconds=60)
+        await cache.store("old", "answer")
+        await cache.store("new", "answer")
+        abandoned = tmp_path / "crashed.json.123.tmp"
+        abandoned.write_text("{")
+        long_ago = time.time() - 2 * 3600
+        os.utime(cache._path("old"), (long_ago, long_ago))
+        os.utime(abandoned, (long_ago, long_ago))
+        await cache.sweep()
+        assert os.listdir(tmp_path) == ["new.json"]
+        assert cache.stats()["disk_expired"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+"""
+Pipeline spans. `span("stage")` times a block into the
+llm_council_stage_duration_seconds histogram and, when opentelemetry-api is
+installed (optional, configure an SDK/exporter to ship spans), also opens an
+OpenTelemetry span so stages nest under the request trace.
+"""
+import time
+import functools
+from contextlib import contextmanager
+from typing import Any
+
+from metrics import STAGE_LATENCY
+from settings import get_settings
+
+_tracer = None
+_tracer_loaded = False
+
+def _get_tracer():
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        _tracer_loaded = True
+        if get_settings().tracing_enabled:
+            try:
+                from opentelemetry import trace
+                _tracer = trace.get_tracer("llm-council")
+            except ImportError:
+                _tracer = None
+    return _tracer
+
+def observe_stage(stage: str, seconds: float):
+    """For stages that cannot be wrapped in a block, e.g. time to first chunk of a stream."""
+    STAGE_LATENCY.labels(stage).observe(seconds)
+
+@contextmanager
+def span(stage: str, **attributes: Any):
+    tracer = _get_tracer()
+    started = time.perf_counter()
+    if tracer is None:
+        try:
+            yield None
+        finally:
+            observe_stage(stage, time.perf_counter() - started)
+        return
+    with tracer.start_as_current_span(stage, attributes=attributes) as current:
+        try:
+            yield current
+        finally:
+            observe_stage(stage, time.perf_counter() - started)
+
+def traced(stage: str):
+    """Decorator form of span() for plain functions."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def request_span(method: str, route: str):
+    """Server span for one HTTP request (OpenTelemetry only, the latency histogram lives in metrics)."""
+    tracer = _get_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(f"{method} {route}", attributes={"http.method": method, "http.route": route}) as current:
+        yield current
@@ -1,63 +1,58 @@
-import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Optional
+from tracing import span
+from ranking_parser import parse_ranking, parse_ranked_labels, label_for_index
 
 def parse_ranking_from_text(text: str) -> List[str]:
     """
     Extracts the ranked list of models/responses from the review text.
     Returns a list of labels (e.g., ["Response C", "Response A", "Response B"]).
     """
-    match = re.search(r"FINAL RANKING:(.*)", text, re.DOTALL | re.IGNORECASE)
-    parsed_ranking = []
-    if match:
-        ranking_lines = match.group(1).strip().split('\n')
-        for line in ranking_lines:
-            line = line.strip()
-            # Match "1. Response A" or "1. Response A..."
-            rank_match = re.match(r"(\d+)\.\s*(Response [A-Z])", line, re.IGNORECASE)
-            if rank_match:
-                parsed_ranking.append(rank_match.group(2).title()) # "Response A"
-    return parsed_ranking
+    return parse_ranking(text)
 
-def calculate_aggregate_rankings(stage1_responses: List[Dict], stage2_reviews: List[Dict]) -> List[Dict]:
+def review_ranked_labels(review: Dict) -> List[Tuple[str, int]]:
     """
-    Re-calculates aggregate rankings based on Stage 1 responses (for mapping A/B/C to models)
-    and Stage 2 reviews (containing the rankings).
+    (label, rank) pairs for one review. Uses the `parsed_ranking` persisted by
+    storage when present and only falls back to parsing the review text.
+    """
+    parsed = review.get('parsed_ranking')
+    if parsed is not None:
+        ranks = review.get('parsed_ranks') or list(range(1, len(parsed) + 1))
+        return list(zip(parsed, ranks))
+
+    # If review is a dict from frontend state, it has 'review' key
+    # If it's from storage JSON, the text is under 'ranking'
+    text = review.get('review', '') or review.get('ranking', '')
+    return parse_ranked_labels(text)
+
+def calculate_ranking_report(stage1_responses: List[Dict], stage2_reviews: List[Dict]) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    Aggregates Stage 2 rankings with the NumPy engine in aggregation.py.
+    Returns (aggregate_rankings, ranking_stats); see aggregation.aggregate.
     """
-    # 1. Map "Response A" -> Model Name
-    letter_to_model = {}
+    # 1. Map "Response A" -> index of the Stage 1 model
+    label_to_index = {}
     for i, r in enumerate(stage1_responses):
-        letter = chr(65 + i) # A, B, C...
-        letter_to_model[f"Response {letter}"] = r['model']
+        label_to_index[label_for_index(i)] = i
 
-    # 2. Collect Ranks
-    model_ranks = {} # model -> list of ranks
-    
-    for review in stage2_reviews:
-        # If review is a dict from frontend state, it has 'review' key
-        # If it's from storage JSON, it might be different, but let's assume standard dict
-        text = review.get('review', '') or review.get('ranking', '')
-        
-        parsed = parse_ranking_from_text(text)
-        
-        for i, label in enumerate(parsed):
-            rank = i + 1
-            if label in letter_to_model:
-                target_model = letter_to_model[label]
-                if target_model not in model_ranks:
-                    model_ranks[target_model] = []
-                model_ranks[target_model].append(rank)
+    # 2. Collect (candidate, rank) pairs per reviewer
+    ballots = []
+    with span("ranking_parse", reviews=len(stage2_reviews)):
+        for review in stage2_reviews:
+            ballots.append([
+                (label_to_index[label], rank)
+                for label, rank in review_ranked_labels(review)
+                if label in label_to_index
+            ])
 
-    # 3. Compute Aggregates
-    aggregate_rankings = []
-    for m_name, ranks in model_ranks.items():
-        avg = sum(ranks) / len(ranks)
-        aggregate_rankings.append({
-            "model": m_name,
-            "avg_rank": round(avg, 2),
-            "votes": len(ranks)
-        })
-    
-    # Sort by avg_rank
-    aggregate_rankings.sort(key=lambda x: x['avg_rank'])
-    
+    # 3. Compute Aggregates. NumPy is imported on first use, not at app startup
+    from aggregation import aggregate
+    with span("ranking_aggregation", models=len(stage1_responses)):
+        return aggregate([r['model'] for r in stage1_responses], ballots)
+
+def calculate_aggregate_rankings(stage1_responses: List[Dict], stage2_reviews: List[Dict]) -> List[Dict]:
+    """
+    Re-calculates aggregate rankings based on Stage 1 responses (for mapping A/B/C to models)
+    and Stage 2 reviews (containing the rankings). Sorted by average rank.
+    """
+    aggregate_rankings, _ = calculate_ranking_report(stage1_responses, stage2_reviews)
     return aggregate_rankings